@@ -0,0 +1,9 @@
+"""
+Benchmarks and regression checks for the pipeline stages.
+
+Run modules from the repository root:
+
+    python -m bench.run --rows 1M                   # synthetic data → every stage → JSON
+    python -m bench.compare old.json new.json       # stage-by-stage ratios
+    python -m bench.bench_round_trip                # legacy-vs-current regression checks
+"""
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Accuracy vs speed: exact distinct counts vs HyperLogLog sketches (src/hll.py).
+
+- cp_diversity: groupby("origId")["destId"].nunique() vs GroupedHLL at several
+  precisions, over the customer-originated rows of data/paysim.db
+- counterparties_total: np.unique(destId).size vs a dense HLL built per chunk
+  and merged (the streaming path)
+
+    python -m bench.bench_distinct
+    python -m bench.bench_distinct --p 10 12 14 16 --chunk 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench.common import DB_PATH, add_src_path, timed
+
+SQL = """
+SELECT t.origId, t.destId
+FROM transactions t
+JOIN accounts a ON a.account_id = t.origId
+WHERE a.is_merchant = 0
+"""
+
+
+def merged_chunks(hll, values: np.ndarray, p: int, chunk: int) -> float:
+    sketch = hll.HLL(p)
+    for i in range(0, len(values), chunk):
+        sketch.merge(hll.HLL(p).add(values[i:i + chunk]))
+    return sketch.estimate()
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    p.add_argument("--db", type=Path, default=DB_PATH)
+    p.add_argument("--p", type=int, nargs="+", default=[10, 12, 14], help="precisions to compare")
+    p.add_argument("--chunk", type=int, default=1_000_000, help="rows per merged sketch")
+    args = p.parse_args()
+
+    if not args.db.exists():
+        raise SystemExit(f"[ERROR] DB not found at {args.db}. Run 01_load_to_sqlite.py first.")
+    add_src_path()
+    import hll
+
+    with sqlite3.connect(f"file:{args.db}?mode=ro", uri=True) as conn:
+        df = pd.read_sql_query(SQL, conn)
+    orig, dest = df["origId"].to_numpy(), df["destId"].to_numpy()
+    print(f"[Info] customer rows: {len(df):,}")
+
+    exact, t_exact = timed(lambda: df.groupby("origId")["destId"].nunique())
+    print(f"\ncp_diversity ({len(exact):,} accounts, max {int(exact.max()):,})")
+    print(f"{'method':<14} {'seconds':>8} {'exact %':>8} {'mean |rel err|':>15} {'max |err|':>10} {'std. error':>11}")
+    print(f"{'nunique':<14} {t_exact:8.2f} {100.0:8.2f} {0.0:15.4%} {0:>10} {'-':>11}")
+    truth = exact.to_numpy()
+    for prec in args.p:
+        (ids, est), secs = timed(hll.distinct_per_group, orig, dest, prec)
+        est = pd.Series(est, index=ids).reindex(exact.index).to_numpy()
+        err = est - truth
+        print(f"{'hll p=' + str(prec):<14} {secs:8.2f} {np.mean(err == 0):8.2%} "
+              f"{np.mean(np.abs(err) / truth):15.4%} {int(np.abs(err).max()):>10,} "
+              f"{1.04 / np.sqrt(1 << prec):11.2%}")
+
+    n_true, t_true = timed(lambda: np.unique(dest).size)
+    print(f"\ncounterparties_total ({n_true:,} distinct destIds, sketches merged every {args.chunk:,} rows)")
+    print(f"{'method':<14} {'seconds':>8} {'estimate':>14} {'rel err':>9} {'memory':>10}")
+    print(f"{'np.unique':<14} {t_true:8.2f} {n_true:>14,} {0.0:9.3%} {dest.nbytes / 1e6:8.1f} MB")
+    for prec in args.p:
+        est, secs = timed(merged_chunks, hll, dest, prec, args.chunk)
+        print(f"{'hll p=' + str(prec):<14} {secs:8.2f} {est:>14,.0f} {est / n_true - 1:+9.3%} "
+              f"{(1 << prec) / 1e3:8.1f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
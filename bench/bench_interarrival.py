@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Regression check + benchmark: sort-once interarrival_stats vs. the original
+groupby("origId")["step"].apply(interarrival_stats_steps).unstack().
+
+Runs both on the customer-originated (origId, step) pairs from data/paysim.db
+and asserts the ia_mean / ia_median / ia_std frames are equal. The legacy
+apply is slow on the full 6.3M rows, so --legacy-limit caps its input (0 = all).
+
+    python -m bench.bench_interarrival
+    python -m bench.bench_interarrival --legacy-limit 0
+"""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench.common import DB_PATH, load_features_module
+
+SQL = """
+SELECT t.origId, t.step
+FROM transactions t
+JOIN accounts a ON a.account_id = t.origId
+WHERE a.is_merchant = 0
+"""
+
+
+def interarrival_stats_steps(s: pd.Series) -> pd.Series:
+    """Original per-account implementation, kept as the reference."""
+    a = s.sort_values().to_numpy()
+    if a.size < 2:
+        return pd.Series({"ia_mean": np.nan, "ia_median": np.nan, "ia_std": np.nan})
+    d = np.diff(a)
+    return pd.Series({
+        "ia_mean": float(d.mean()),
+        "ia_median": float(np.median(d)),
+        "ia_std": float(d.std(ddof=1)) if d.size > 1 else 0.0,
+    })
+
+
+def legacy(df: pd.DataFrame) -> pd.DataFrame:
+    ia = df.groupby("origId")["step"].apply(interarrival_stats_steps).unstack()
+    ia.index.name = "origId"
+    return ia
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    p.add_argument("--db", type=Path, default=DB_PATH)
+    p.add_argument("--legacy-limit", type=int, default=500_000,
+                   help="rows to time the legacy apply on (0 = full table)")
+    args = p.parse_args()
+
+    if not args.db.exists():
+        raise SystemExit(f"[ERROR] DB not found at {args.db}. Run 01_load_to_sqlite.py first.")
+
+    with sqlite3.connect(f"file:{args.db}?mode=ro", uri=True) as conn:
+        df = pd.read_sql_query(SQL, conn)
+    print(f"[Info] customer rows: {len(df):,}")
+
+    feats = load_features_module()
+    t0 = time.perf_counter()
+    full = feats.interarrival_stats(df["origId"].to_numpy(), df["step"].to_numpy())
+    print(f"[sort] full table:   {time.perf_counter() - t0:8.2f}s  accounts={len(full):,}")
+
+    sub = df if args.legacy_limit <= 0 else df.head(args.legacy_limit)
+    t0 = time.perf_counter()
+    new = feats.interarrival_stats(sub["origId"].to_numpy(), sub["step"].to_numpy())
+    t_new = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    old = legacy(sub)
+    t_old = time.perf_counter() - t0
+
+    pd.testing.assert_frame_equal(new, old[["ia_mean", "ia_median", "ia_std"]], check_index_type=False)
+    print(f"[sort]  {len(sub):>12,} rows: {t_new:8.2f}s")
+    print(f"[apply] {len(sub):>12,} rows: {t_old:8.2f}s")
+    print(f"[OK] identical output; speedup x{t_old / max(t_new, 1e-9):,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Load test for src/query_service.py: concurrent dashboard refreshes.
+
+Each simulated client repeatedly issues one "refresh": the full set of report
+queries a dashboard loads (heatmaps, weekday × hour, amount bins, near band
+at a few thresholds, top features). The first refresh is cold; later ones are
+served from the LRU cache. A last phase adds a cache-busting parameter so every
+request runs its query. Reports throughput and p50/p95/p99 latency per phase.
+
+    python -m bench.bench_query_service                       # in-process server, 8 clients
+    python -m bench.bench_query_service --clients 32 --refreshes 20
+    python -m bench.bench_query_service --url http://127.0.0.1:8765   # an already running service
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bench.common import DB_PATH, add_src_path
+
+REFRESH = [
+    "/q/dayhour?types=CASH_IN,PAYMENT,TRANSFER&lo=9000&hi=10000",
+    "/q/dayhour",
+    "/q/weekhour",
+    "/q/weekhour?types=CASH_IN,PAYMENT,TRANSFER&lo=9000&hi=10000",
+    "/q/amount_bins?width=1000",
+    "/q/near_band",
+    "/q/near_band?threshold=5000",
+    "/q/near_band?threshold=15000&pct=5",
+    "/q/features?order=near_n&limit=50",
+]
+
+
+def fetch(base: str, path: str) -> tuple[float, bool]:
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(base + path, timeout=300) as resp:
+        body = json.loads(resp.read())
+    return time.perf_counter() - t0, bool(body.get("cached"))
+
+
+def run_phase(base: str, clients: int, refreshes: int, vary: bool, offset: int = 0) -> dict:
+    lat: list[float] = []
+    hits = 0
+    lock = threading.Lock()
+
+    def client(c: int) -> None:
+        nonlocal hits
+        for r in range(refreshes):
+            for path in REFRESH:
+                if vary:                                  # a cache-busting parameter: every request misses
+                    path = f"{path}{'&' if '?' in path else '?'}_={offset}.{c}.{r}"
+                secs, cached = fetch(base, path)
+                with lock:
+                    lat.append(secs)
+                    hits += cached
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    wall = time.perf_counter() - t0
+    a = np.array(lat) * 1000
+    return {"requests": len(a), "wall_s": wall, "rps": len(a) / wall, "hit_rate": hits / max(len(a), 1),
+            "p50": np.percentile(a, 50), "p95": np.percentile(a, 95), "p99": np.percentile(a, 99), "max": a.max()}
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    p.add_argument("--url", default=None, help="target a running service instead of starting one")
+    p.add_argument("--clients", type=int, default=8, help="concurrent dashboard clients")
+    p.add_argument("--refreshes", type=int, default=10, help="refreshes per client in the warm phase")
+    p.add_argument("--connections", type=int, default=4, help="pool size for the in-process server")
+    args = p.parse_args()
+
+    server = None
+    if args.url is None:
+        if not DB_PATH.exists():
+            raise SystemExit(f"[ERROR] DB not found at {DB_PATH}. Run 01_load_to_sqlite.py first.")
+        add_src_path()
+        import query_service
+
+        service = query_service.QueryService(DB_PATH, args.connections)
+        server = query_service.serve("127.0.0.1", 0, service)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+    else:
+        base = args.url.rstrip("/")
+
+    print(f"[Info] {base}: {args.clients} clients, {len(REFRESH)} queries per refresh")
+    phases = [
+        ("cold (all clients refresh at once)", run_phase(base, args.clients, 1, vary=False)),
+        ("warm (cached)", run_phase(base, args.clients, args.refreshes, vary=False)),
+        ("uncached (unique parameters)", run_phase(base, args.clients, 1, vary=True, offset=int(time.time()))),
+    ]
+    print(f"{'phase':<36} {'requests':>9} {'req/s':>9} {'hits':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, r in phases:
+        print(f"{name:<36} {r['requests']:>9,} {r['rps']:>9,.0f} {r['hit_rate']:>6.0%} "
+              f"{r['p50']:8.2f} {r['p95']:8.2f} {r['p99']:8.2f} {r['max']:8.1f}")
+    with urllib.request.urlopen(base + "/stats") as resp:
+        print(f"[Info] service stats: {json.loads(resp.read())['cache']}")
+    if server is not None:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
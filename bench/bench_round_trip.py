@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: join-based round_trip_flag vs. the original per-account set loop.
+
+Both implementations run on the same (origId, destId) edges pulled from
+data/paysim.db; the outputs must be identical. The legacy loop is very slow on
+the full 6.3M rows, so --legacy-limit caps the rows it is timed on (0 = all).
+
+    python -m bench.bench_round_trip
+    python -m bench.bench_round_trip --legacy-limit 0     # full head-to-head
+"""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+from bench.common import DB_PATH, load_features_module, timed
+
+
+def round_trip_flag_loop(df: pd.DataFrame) -> pd.Series:
+    """Original implementation (per-account Python sets), kept as the reference."""
+    sent = df.groupby("origId")["destId"].apply(set)
+    recv = df.groupby("destId")["origId"].apply(set)
+    idx = sent.index.union(recv.index)
+    out = pd.Series(False, index=idx, name="round_trip_any")
+    for acc in idx:
+        s = sent.get(acc, set())
+        r = recv.get(acc, set())
+        out.loc[acc] = len(s & r) > 0
+    out.index.name = "origId"
+    return out
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    p.add_argument("--db", type=Path, default=DB_PATH)
+    p.add_argument("--legacy-limit", type=int, default=500_000,
+                   help="rows to time the legacy loop on (0 = full table)")
+    args = p.parse_args()
+
+    if not args.db.exists():
+        raise SystemExit(f"[ERROR] DB not found at {args.db}. Run 01_load_to_sqlite.py first.")
+
+    with sqlite3.connect(f"file:{args.db}?mode=ro", uri=True) as conn:
+        df = pd.read_sql_query("SELECT origId, destId FROM transactions", conn)
+    print(f"[Info] edges: {len(df):,}")
+
+    feats = load_features_module()
+    rt_full, t_full = timed(feats.round_trip_flag, df)
+    print(f"[join] full table:   {t_full:8.2f}s  flagged={int(rt_full.sum()):,} / {len(rt_full):,}")
+
+    sub = df if args.legacy_limit <= 0 else df.head(args.legacy_limit)
+    rt_new, t_new = timed(feats.round_trip_flag, sub)
+    rt_old, t_old = timed(round_trip_flag_loop, sub)
+    pd.testing.assert_series_equal(rt_new, rt_old, check_index_type=False)
+    print(f"[join] {len(sub):>12,} rows: {t_new:8.2f}s")
+    print(f"[loop] {len(sub):>12,} rows: {t_old:8.2f}s")
+    print(f"[OK] identical output; speedup x{t_old / max(t_new, 1e-9):,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
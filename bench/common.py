@@ -0,0 +1,46 @@
+"""Paths and loaders shared by the bench modules."""
+
+from __future__ import annotations
+
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+SRC_DIR = ROOT / "src"
+DB_PATH = ROOT / "data" / "paysim.db"
+BENCH_DIR = ROOT / "data" / "bench"
+
+
+def add_src_path(src_dir: Path = SRC_DIR) -> None:
+    """Stage scripts import their sibling helper modules by plain name."""
+    if str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+
+def load_stage(filename: str, name: str, src_dir: Path = SRC_DIR):
+    """Import a numbered stage script (not importable by name) from `src_dir`."""
+    add_src_path(src_dir)
+    spec = importlib.util.spec_from_file_location(name, src_dir / filename)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def load_features_module(src_dir: Path = SRC_DIR):
+    return load_stage("03_features_accounts.py", "features_accounts", src_dir)
+
+
+def parse_rows(text: str) -> int:
+    """'1M' / '6.3M' / '50M' / '250k' / '100000' → int."""
+    t = text.strip().lower().replace("_", "")
+    mult = {"k": 1_000, "m": 1_000_000}.get(t[-1:], 1)
+    return int(round(float(t[:-1] if mult > 1 else t) * mult))
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    res = fn(*args)
+    return res, time.perf_counter() - t0
@@ -0,0 +1,47 @@
+"""
+Compare two bench.run result files stage by stage.
+
+    python -m bench.compare data/bench/results/abc123_1M.json data/bench/results/def456_1M.json
+
+Ratios are new/old: wall < 1.00 is faster, RSS < 1.00 is leaner.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+
+def _ratio(new: float | None, old: float | None) -> str:
+    return f"x{new / old:5.2f}" if new and old else "   - "
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    p.add_argument("old", type=Path)
+    p.add_argument("new", type=Path)
+    args = p.parse_args()
+
+    old, new = (json.loads(f.read_text()) for f in (args.old, args.new))
+    print(f"old: {old['meta']['commit']} ({old['meta']['rows']:,} rows)   "
+          f"new: {new['meta']['commit']} ({new['meta']['rows']:,} rows)")
+    if old["meta"]["rows"] != new["meta"]["rows"]:
+        print("[Info] row counts differ; compare rows/s rather than wall time")
+
+    print(f"{'stage':<38} {'old s':>9} {'new s':>9} {'wall':>7} {'old MB':>8} {'new MB':>8} {'rss':>7}")
+    for stage in dict.fromkeys([*old["stages"], *new["stages"]]):
+        o, n = old["stages"].get(stage, {}), new["stages"].get(stage, {})
+        print(f"{stage:<38} {o.get('wall_s', float('nan')):9.2f} {n.get('wall_s', float('nan')):9.2f} "
+              f"{_ratio(n.get('wall_s'), o.get('wall_s')):>7} "
+              f"{o.get('peak_rss_mb', float('nan')):8.0f} {n.get('peak_rss_mb', float('nan')):8.0f} "
+              f"{_ratio(n.get('peak_rss_mb'), o.get('peak_rss_mb')):>7}")
+        op, np_ = o.get("parts_s", {}), n.get("parts_s", {})
+        for part in dict.fromkeys([*op, *np_]):
+            print(f"  {part:<36} {op.get(part, float('nan')):9.3f} {np_.get(part, float('nan')):9.3f} "
+                  f"{_ratio(np_.get(part), op.get(part)):>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
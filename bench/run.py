@@ -0,0 +1,166 @@
+"""
+End-to-end benchmark of the pipeline on synthetic PaySim-shaped data.
+
+Copies the current src/ and sql/ into a work directory (so every stage writes
+under <workdir>/data, never the real data/), generates the CSV once per
+(rows, seed), then runs each stage in its own child process and records wall
+time, rows/s and that child's peak RSS:
+
+    load            01_load_to_sqlite.py (SQLite + Parquet copy)
+    indexes         01_apply_indexes.py (covering indexes + ANALYZE)
+    features        03_features_accounts.py, end to end
+    features_parts  read / aggregates / inter-arrival / counterparty / round-trip
+    iforest         04_anomaly_iforest.py --refit
+    queries         heatmap + histogram SQL, aggregate cube, log histogram
+
+Results go to data/bench/results/<commit>_<rows>.json; compare two runs with
+bench.compare. This parent process never imports numpy/pandas: Linux carries
+ru_maxrss across fork+exec, so a heavy parent would inflate every child's peak.
+
+    python -m bench.run --rows 1M
+    python -m bench.run --rows 6.3M --stages load features
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from importlib.metadata import version
+from pathlib import Path
+
+from bench.common import BENCH_DIR, ROOT, add_src_path, parse_rows
+
+add_src_path()
+from perf import maxrss_mb  # noqa: E402
+
+STAGES = ["load", "indexes", "features", "features_parts", "iforest", "queries"]
+
+
+def git_commit() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "src", "sql", "bench"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "nogit"
+
+
+def prepare_workdir(workdir: Path, n_rows: int, seed: int) -> Path:
+    """Fresh copy of src/ + sql/; synthetic CSV regenerated (in a child) only if rows/seed changed."""
+    for sub in ("src", "sql"):
+        shutil.rmtree(workdir / sub, ignore_errors=True)
+        shutil.copytree(ROOT / sub, workdir / sub, ignore=shutil.ignore_patterns("__pycache__"))
+    csv = workdir / "data" / "synthetic.csv"
+    meta = workdir / "data" / "synthetic.json"
+    want = {"rows": n_rows, "seed": seed}
+    if not (csv.exists() and meta.exists() and json.loads(meta.read_text()) == want):
+        cmd = [sys.executable, "-m", "bench.synth", "--rows", str(n_rows), "--seed", str(seed), "--out", str(csv)]
+        wall, _, _ = run_child(cmd, ROOT, workdir / "logs" / "generate.log")
+        meta.write_text(json.dumps(want))
+        print(f"[Info] generated {n_rows:,} rows in {wall:,.1f}s → {csv}")
+    return csv
+
+
+def run_child(cmd: list[str], cwd: Path, log: Path) -> tuple[float, float, str]:
+    """Run one stage; returns (wall seconds, peak RSS MB of that child, stdout)."""
+    t0 = time.perf_counter()
+    with open(log, "w") as f_log:
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=f_log, text=True,
+                                env={**os.environ, "PYTHONPATH": str(ROOT)})
+        out = proc.stdout.read()
+        _, status, usage = os.wait4(proc.pid, 0)       # rusage of this child only
+    wall = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    with open(log, "a") as f_log:
+        f_log.write(out)
+    if proc.returncode != 0:
+        raise SystemExit(f"[ERROR] {' '.join(cmd)} failed ({proc.returncode}); see {log}")
+    return wall, maxrss_mb(usage.ru_maxrss), out
+
+
+def count_accounts(workdir: Path) -> int:
+    """Rows of the features parquet (read in a child to keep pyarrow out of this process)."""
+    code = "import sys, pyarrow.parquet as pq; print(pq.read_metadata(sys.argv[1]).num_rows)"
+    out = subprocess.run([sys.executable, "-c", code, str(workdir / "data" / "features_accounts.parquet")],
+                         capture_output=True, text=True, check=True).stdout
+    return int(out)
+
+
+def stage_cmd(stage: str, workdir: Path) -> list[str]:
+    py = sys.executable
+    return {
+        "load": [py, "src/01_load_to_sqlite.py", "data/synthetic.csv"],
+        "indexes": [py, "src/01_apply_indexes.py", "--reset", "--no-timing"],
+        "features": [py, "src/03_features_accounts.py"],
+        "features_parts": [py, "-m", "bench.stages", "features_parts", "--root", str(workdir)],
+        "iforest": [py, "src/04_anomaly_iforest.py", "--refit"],
+        "queries": [py, "-m", "bench.stages", "queries", "--root", str(workdir)],
+    }[stage]
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic data.")
+    p.add_argument("--rows", default="1M", help="synthetic row count (1M, 6.3M, 50M, …)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    p.add_argument("--workdir", type=Path, default=None, help="default: data/bench/<rows>_s<seed>")
+    p.add_argument("--out", type=Path, default=None, help="default: data/bench/results/<commit>_<rows>.json")
+    args = p.parse_args()
+
+    n_rows = parse_rows(args.rows)
+    workdir = (args.workdir or BENCH_DIR / f"{args.rows}_s{args.seed}").resolve()
+    (workdir / "logs").mkdir(parents=True, exist_ok=True)
+    prepare_workdir(workdir, n_rows, args.seed)
+
+    commit = git_commit()
+    results = {}
+    for stage in STAGES:
+        if stage not in args.stages:
+            continue
+        wall, rss, out = run_child(stage_cmd(stage, workdir), workdir, workdir / "logs" / f"{stage}.log")
+        res = {"wall_s": round(wall, 3), "peak_rss_mb": round(rss, 1)}
+        rows = n_rows
+        if stage in ("features_parts", "queries"):
+            child = json.loads(out.strip().splitlines()[-1])
+            rows = child["rows"]
+            res["parts_s"] = {k: round(v, 4) for k, v in child["parts"].items()}
+        elif stage == "iforest":
+            rows = count_accounts(workdir)
+        res["rows"] = rows
+        res["rows_per_s"] = round(rows / wall, 1) if wall > 0 else None
+        results[stage] = res
+        print(f"[{stage:<15}] {wall:9.2f}s  {res['rows_per_s'] or 0:>12,.0f} rows/s  peak RSS {rss:8,.0f} MB")
+        for k, v in res.get("parts_s", {}).items():
+            print(f"    {k:<36} {v:9.3f}s")
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "rows": n_rows,
+            "seed": args.seed,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": version("numpy"),
+            "pandas": version("pandas"),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": results,
+    }
+    out = args.out or BENCH_DIR / "results" / f"{commit}_{args.rows}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"[OK] results → {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
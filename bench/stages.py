@@ -0,0 +1,82 @@
+"""
+In-process benchmark stages, run by bench.run in a fresh child process each.
+
+Each stage imports the stage code from <root>/src (the bench work copy, so all
+data paths resolve under <root>/data), times its parts and prints one JSON line:
+{"rows": n, "parts": {name: seconds}}.
+
+    python -m bench.stages features_parts --root data/bench/1M_s0
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from bench.common import add_src_path, load_features_module, timed
+
+QUERY_FILES = ["weekday_hour_all.sql", "weekday_hour_nearthreshold.sql", "hist_amounts_bins_1k.sql"]
+
+
+def features_parts(root: Path) -> dict:
+    """03_features_accounts split into read / aggregates / inter-arrival / counterparty / round-trip."""
+    fe = load_features_module(root / "src")
+    import tx_arrays
+    from accounts import load_accounts
+
+    parts = {}
+    tx_arrays.get_arrays(fe.TX_COLS)                   # build the compact cache outside the timings
+    t0 = time.perf_counter()
+    df = tx_arrays.load_frame(fe.TX_COLS)
+    with sqlite3.connect(f"file:{fe.DB_PATH}?mode=ro", uri=True) as conn:
+        _, is_merchant = load_accounts(conn)
+    cust = df[~is_merchant[df["origId"].to_numpy()]]
+    parts["read"] = time.perf_counter() - t0
+
+    _, parts["aggregates"] = timed(fe.account_aggregates, cust)
+    _, parts["interarrival"] = timed(fe.interarrival_stats, cust["origId"].to_numpy(), cust["step"].to_numpy())
+    _, parts["counterparty"] = timed(fe.counterparty_diversity, cust)
+    _, parts["round_trip"] = timed(fe.round_trip_flag, df)
+    return {"rows": len(df), "parts": parts}
+
+
+def queries(root: Path) -> dict:
+    """Heatmap / histogram SQL, the aggregate cube build and the streamed log histogram."""
+    add_src_path(root / "src")
+    import agg_cube
+    import histograms
+
+    parts = {}
+    with sqlite3.connect(f"file:{agg_cube.DB_PATH}?mode=ro", uri=True) as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        for name in QUERY_FILES:
+            sql = (root / "sql" / name).read_text()
+            _, parts[f"sql/{name}"] = timed(lambda q: conn.execute(q).fetchall(), sql)
+
+    cube, parts["agg_cube.build"] = timed(agg_cube.build_cube, agg_cube.scan_chunks())
+    t0 = time.perf_counter()
+    agg_cube.day_hour(cube, types=["CASH_IN", "PAYMENT", "TRANSFER"], bands=[agg_cube.NEAR_BAND])
+    agg_cube.weekday_hour(cube)
+    agg_cube.amount_hist_1k(cube)
+    parts["agg_cube.views"] = time.perf_counter() - t0
+    _, parts["histograms.log_hist"] = timed(histograms.log_hist, 80)
+    return {"rows": rows, "parts": parts}
+
+
+STAGES = {"features_parts": features_parts, "queries": queries}
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Run one in-process benchmark stage.")
+    p.add_argument("stage", choices=sorted(STAGES))
+    p.add_argument("--root", type=Path, required=True, help="bench work directory (src/, sql/, data/)")
+    args = p.parse_args()
+    print(json.dumps(STAGES[args.stage](args.root.resolve())))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+"""
+Deterministic PaySim-shaped transaction generator.
+
+Emits the PaySim1 CSV schema at any scale, streamed in chunks so 50M rows never
+sit in memory. The same (rows, seed) always produces the same file:
+
+- 743 hourly steps with a day/night activity profile, rows in step order
+- PaySim type mix (CASH_OUT 35%, PAYMENT 34%, CASH_IN 22%, TRANSFER 8%, DEBIT 0.7%)
+- per-type log-normal amounts, plus a small share of 9,000–9,999.99 structuring amounts
+- customer origins ("C…"), merchant destinations ("M…") for PAYMENT/DEBIT
+- fraud only on TRANSFER / CASH_OUT (~0.13% overall), rare isFlaggedFraud
+
+    python -m bench.synth --rows 1M --out data/bench/synthetic_1M.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench.common import ROOT, parse_rows
+
+N_STEPS = 743
+CHUNK = 1_000_000
+
+TYPES = np.array(["CASH_IN", "CASH_OUT", "DEBIT", "PAYMENT", "TRANSFER"])
+TYPE_P = np.array([0.220, 0.352, 0.0065, 0.338, 0.0835])
+TYPE_P = TYPE_P / TYPE_P.sum()
+# log-normal (mu, sigma) per type, same order as TYPES
+AMOUNT_LOGN = np.array([(11.6, 0.9), (11.5, 1.0), (8.0, 1.0), (8.8, 1.0), (12.7, 1.3)])
+AMOUNT_MAX = 92_445_516.64
+STRUCTURING_RATE = 0.002          # of CASH_IN / PAYMENT / TRANSFER rows
+FRAUD_RATE = 0.003                # of TRANSFER / CASH_OUT rows
+FLAG_RATE = 0.01                  # of fraudulent TRANSFERs >= 200k
+
+# accounts per row: origins are mostly distinct (as in PaySim), destinations repeat more
+ORIG_POOL, DEST_POOL, MERCHANT_POOL = 1.0, 0.45, 0.35
+
+# hour-of-day activity (PaySim is quiet between ~01:00 and ~08:00)
+HOUR_PROFILE = np.array([2, 1, .5, .3, .2, .2, .3, .5, 1.5, 4, 6, 7,
+                         7.5, 7.5, 7, 7, 7, 6.5, 6.5, 6, 5.5, 5, 4, 3])
+
+COLUMNS = ["step", "type", "amount", "nameOrig", "oldbalanceOrg", "newbalanceOrig",
+           "nameDest", "oldbalanceDest", "newbalanceDest", "isFraud", "isFlaggedFraud"]
+
+_P31 = 2_147_483_647              # prime; i -> i * 48271 mod p is a bijection on 1..p-1
+
+
+def _names(prefix: str, ids: np.ndarray) -> np.ndarray:
+    """Pool index → PaySim-looking name (scrambled so ids don't look sequential)."""
+    return np.char.add(prefix, ((ids.astype(np.int64) * 48271) % _P31).astype(str))
+
+
+def step_counts(n_rows: int, seed: int) -> np.ndarray:
+    """Rows per step (multinomial over the hourly profile)."""
+    w = np.tile(HOUR_PROFILE, N_STEPS // 24 + 1)[:N_STEPS]
+    rng = np.random.default_rng([seed, 0])
+    return rng.multinomial(n_rows, w / w.sum())
+
+
+def make_chunk(start: int, stop: int, n_rows: int, step_cum: np.ndarray,
+               rng: np.random.Generator) -> pd.DataFrame:
+    n = stop - start
+    step = np.searchsorted(step_cum, np.arange(start, stop), side="right") + 1
+    t = rng.choice(len(TYPES), size=n, p=TYPE_P)
+
+    mu, sigma = AMOUNT_LOGN[t, 0], AMOUNT_LOGN[t, 1]
+    amount = np.exp(rng.normal(mu, sigma))
+    structuring = np.isin(t, [0, 3, 4]) & (rng.random(n) < STRUCTURING_RATE)
+    amount[structuring] = rng.uniform(9000, 9999.99, structuring.sum())
+    amount = np.round(np.clip(amount, 0.01, AMOUNT_MAX), 2)
+
+    to_merchant = np.isin(t, [2, 3])
+    orig = _names("C", rng.integers(1, max(2, int(n_rows * ORIG_POOL)), n))
+    dest_c = _names("C", rng.integers(1, max(2, int(n_rows * DEST_POOL)), n))
+    dest_m = _names("M", rng.integers(1, max(2, int(n_rows * MERCHANT_POOL)), n))
+    dest = np.where(to_merchant, dest_m, dest_c)
+
+    old_o = np.where(rng.random(n) < 0.33, 0.0, np.round(np.exp(rng.normal(10.5, 1.5, n)), 2))
+    new_o = np.where(t == 0, old_o + amount, np.maximum(old_o - amount, 0.0))
+    old_d = np.where(to_merchant | (rng.random(n) < 0.4), 0.0, np.round(np.exp(rng.normal(11, 1.8, n)), 2))
+    new_d = np.where(to_merchant, 0.0, np.where(t == 0, np.maximum(old_d - amount, 0.0), old_d + amount))
+
+    fraud = np.isin(t, [1, 4]) & (rng.random(n) < FRAUD_RATE)
+    flagged = fraud & (t == 4) & (amount >= 200_000) & (rng.random(n) < FLAG_RATE)
+
+    return pd.DataFrame({
+        "step": step, "type": TYPES[t], "amount": amount,
+        "nameOrig": orig, "oldbalanceOrg": old_o, "newbalanceOrig": np.round(new_o, 2),
+        "nameDest": dest, "oldbalanceDest": old_d, "newbalanceDest": np.round(new_d, 2),
+        "isFraud": fraud.astype(np.int8), "isFlaggedFraud": flagged.astype(np.int8),
+    }, columns=COLUMNS)
+
+
+def generate(n_rows: int, out_csv: Path, seed: int = 0, chunksize: int = CHUNK) -> Path:
+    """Write `n_rows` synthetic transactions to `out_csv` (overwrites)."""
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    step_cum = np.cumsum(step_counts(n_rows, seed))
+    tmp = out_csv.with_suffix(".csv.tmp")
+    with open(tmp, "w", newline="") as f:
+        for i, start in enumerate(range(0, n_rows, chunksize)):
+            rng = np.random.default_rng([seed, 1, i])        # per-chunk stream: chunks are independent
+            df = make_chunk(start, min(start + chunksize, n_rows), n_rows, step_cum, rng)
+            df.to_csv(f, header=(i == 0), index=False)
+    tmp.replace(out_csv)
+    return out_csv
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Generate PaySim-shaped synthetic transactions.")
+    p.add_argument("--rows", default="1M", help="row count, e.g. 1M, 6.3M, 50M")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", type=Path, default=None)
+    p.add_argument("--chunksize", type=int, default=CHUNK)
+    args = p.parse_args()
+
+    n = parse_rows(args.rows)
+    out = args.out or ROOT / "data" / "bench" / f"synthetic_{args.rows}_s{args.seed}.csv"
+    t0 = time.time()
+    generate(n, out, args.seed, args.chunksize)
+    print(f"[OK] {n:,} rows → {out} in {time.time() - t0:,.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,8 @@
+-- COUNT(DISTINCT ...) rows: approximate, mergeable per-day version in src/hll.py
 SELECT 'rows_total'      AS metric, COUNT(*)                     AS val FROM transactions
 UNION ALL
 SELECT 'near_9k_10k',           COUNT(*)                         FROM transactions WHERE amount >= 9000 AND amount < 10000
 UNION ALL
-SELECT 'customer_accounts',     COUNT(DISTINCT nameOrig)         FROM transactions WHERE nameOrig LIKE 'C%'
+SELECT 'customer_accounts',     COUNT(DISTINCT t.origId)         FROM transactions t JOIN accounts a ON a.account_id = t.origId WHERE a.is_merchant = 0
 UNION ALL
-SELECT 'counterparties_total',  COUNT(DISTINCT nameDest)         FROM transactions;
\ No newline at end of file
+SELECT 'counterparties_total',  COUNT(DISTINCT destId)           FROM transactions;
\ No newline at end of file
@@ -1,26 +1,38 @@
 -- Core per-account features (SQL-computable subset)
+-- Groups on integer account ids; names are decoded only in the final SELECT.
+-- cp_diversity can be estimated instead with HyperLogLog: 03_features_accounts.py --approx-distinct P
 WITH base AS (
     SELECT
-        nameOrig,
-        amount,
-        nameDest,
-        CASE WHEN amount >= 9000 AND amount < 10000 THEN 1 ELSE 0 END AS near_thresh,
-        isFraud,
-        isFlaggedFraud
-    FROM transactions
-    WHERE nameOrig LIKE 'C%'   -- keep customer-originated accounts
+        t.origId,
+        t.amount,
+        t.destId,
+        CASE WHEN t.amount >= 9000 AND t.amount < 10000 THEN 1 ELSE 0 END AS near_thresh,
+        t.isFraud,
+        t.isFlaggedFraud
+    FROM transactions t
+    JOIN accounts a ON a.account_id = t.origId
+    WHERE a.is_merchant = 0    -- keep customer-originated accounts
+),
+agg AS (
+    SELECT
+        origId                                     AS account_id,
+        COUNT(*)                                   AS n_tx,
+        SUM(amount)                                AS amt_sum,
+        AVG(amount)                                AS amt_mean,
+        MAX(amount)                                AS amt_max,
+        SUM(near_thresh)                           AS near_n,
+        1.0 * SUM(near_thresh) / NULLIF(COUNT(*),0) AS near_pct,
+        SUM(isFraud)                               AS fraud_n,
+        SUM(isFlaggedFraud)                        AS flagged_n,
+        COUNT(DISTINCT destId)                     AS cp_diversity
+    FROM base
+    GROUP BY origId
 )
 SELECT
-    nameOrig                                   AS account,
-    COUNT(*)                                   AS n_tx,
-    SUM(amount)                                AS amt_sum,
-    AVG(amount)                                AS amt_mean,
-    MAX(amount)                                AS amt_max,
-    SUM(near_thresh)                           AS near_n,
-    1.0 * SUM(near_thresh) / NULLIF(COUNT(*),0) AS near_pct,
-    SUM(isFraud)                               AS fraud_n,
-    SUM(isFlaggedFraud)                        AS flagged_n,
-    COUNT(DISTINCT nameDest)                   AS cp_diversity
-FROM base
-GROUP BY nameOrig
-ORDER BY n_tx DESC;
\ No newline at end of file
+    agg.account_id,
+    acc.name                                       AS account,
+    agg.n_tx, agg.amt_sum, agg.amt_mean, agg.amt_max,
+    agg.near_n, agg.near_pct, agg.fraud_n, agg.flagged_n, agg.cp_diversity
+FROM agg
+JOIN accounts acc ON acc.account_id = agg.account_id
+ORDER BY agg.n_tx DESC;
\ No newline at end of file
@@ -1,6 +1,19 @@
--- Speed up common filters/joins
-CREATE INDEX IF NOT EXISTS idx_tx_type         ON transactions(type);
-CREATE INDEX IF NOT EXISTS idx_tx_amount       ON transactions(amount);
-CREATE INDEX IF NOT EXISTS idx_tx_step         ON transactions(step);
-CREATE INDEX IF NOT EXISTS idx_tx_nameorig     ON transactions(nameOrig);
-CREATE INDEX IF NOT EXISTS idx_tx_namedest     ON transactions(nameDest);
\ No newline at end of file
+-- Covering composite indexes matched to the actual access patterns.
+-- Applied (with before/after EXPLAIN QUERY PLAN timings) by src/01_apply_indexes.py.
+-- day_num / hour_of_day are stored generated columns of transactions.
+
+-- near-threshold band: type IN (...) AND amount range, grouped by day × hour
+CREATE INDEX IF NOT EXISTS idx_tx_type_amount_bucket ON transactions(type, amount, day_num, hour_of_day);
+-- all-traffic day × hour counts: ordered covering scan, no temp b-tree for the GROUP BY
+CREATE INDEX IF NOT EXISTS idx_tx_day_hour           ON transactions(day_num, hour_of_day);
+-- per-account history / features / shards: origId lookups in step order; also covers the
+-- out-of-core feature scan (ORDER BY origId, step) so it streams without a sort
+CREATE INDEX IF NOT EXISTS idx_tx_orig_step          ON transactions(origId, step, amount, destId, isFraud, isFlaggedFraud);
+-- incoming side: round trips and investigator drill-down on destId
+CREATE INDEX IF NOT EXISTS idx_tx_dest_step          ON transactions(destId, step, amount, origId);
+-- incremental watermark reads (step > ?)
+CREATE INDEX IF NOT EXISTS idx_tx_step               ON transactions(step);
+-- amount bands without a type filter, MAX(amount)
+CREATE INDEX IF NOT EXISTS idx_tx_amount             ON transactions(amount);
+
+ANALYZE;
\ No newline at end of file
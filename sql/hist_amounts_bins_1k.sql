@@ -0,0 +1,9 @@
+-- 1,000-wide amount histogram computed in the store (no raw rows leave SQLite)
+-- bin k covers [1000*k, 1000*k + 1000); CAST truncates, which is floor for amount > 0
+SELECT
+    CAST(amount / 1000 AS INTEGER) AS bin,
+    COUNT(*)                       AS n
+FROM transactions
+WHERE amount > 0
+GROUP BY bin
+ORDER BY bin;
\ No newline at end of file
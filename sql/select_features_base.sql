@@ -1,11 +1,13 @@
 SELECT
     step,
-    (step - 1) / 24 AS day_num,
-    (step - 1) % 24 AS hour_of_day,
+    day_num,
+    hour_of_day,
   type,
   amount,
-  nameOrig,
-  nameDest,
+  origId,
+  destId,
   isFraud,
-  isFlaggedFraud
+  isFlaggedFraud,
+  oldbalanceOrg - amount - newbalanceOrig AS err_orig,   -- balance inconsistency, sender side
+  oldbalanceDest + amount - newbalanceDest AS err_dest   -- recipient side
 FROM transactions;
\ No newline at end of file
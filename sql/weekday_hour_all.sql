@@ -1,8 +1,8 @@
 -- All transactions by day_num × hour_of_day
 WITH base AS (
     SELECT
-        (step - 1) / 24 AS day_num,
-        (step - 1) % 24 AS hour_of_day
+        day_num,        -- stored generated column: (step - 1) / 24
+        hour_of_day     -- stored generated column: (step - 1) % 24
 FROM transactions
     )
 SELECT
@@ -2,8 +2,8 @@
 -- Limit to retail-relevant types (same as your Python)
 WITH base AS (
     SELECT
-        (step - 1) / 24 AS day_num,
-        (step - 1) % 24 AS hour_of_day
+        day_num,        -- stored generated column: (step - 1) / 24
+        hour_of_day     -- stored generated column: (step - 1) % 24
 FROM transactions
 WHERE type IN ('CASH_IN','PAYMENT','TRANSFER')
   AND amount >= 9000 AND amount < 10000
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Apply sql/helpful_indexes.sql after ingest and report what it changes.
+
+For every query in sql/ and the queries the src/ scripts issue, print the
+EXPLAIN QUERY PLAN and wall time before and after creating the covering
+indexes + ANALYZE. The same report is written to reports/query_plans.txt so
+runs can be diffed.
+
+    python src/01_apply_indexes.py              # measure, apply, measure again
+    python src/01_apply_indexes.py --reset      # drop the managed indexes first (clean "before")
+    python src/01_apply_indexes.py --no-timing  # plans only, no query execution
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import features_incremental
+from perf import span
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+SQL_DIR = ROOT / "sql"
+INDEX_SQL = SQL_DIR / "helpful_indexes.sql"
+OUT_TXT = ROOT / "reports" / "query_plans.txt"
+
+GENERATED_COLS = {"day_num", "hour_of_day"}
+
+
+def load_features_module():
+    """Import 03_features_accounts.py (not importable by name) to reuse its SQL constants."""
+    spec = importlib.util.spec_from_file_location("features_accounts", HERE.parent / "03_features_accounts.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def collect_queries(conn: sqlite3.Connection) -> list[tuple[str, str, tuple | dict]]:
+    """(label, sql, params) for every read query in sql/ and src/."""
+    queries = []
+    for path in sorted(SQL_DIR.glob("*.sql")):
+        text = path.read_text().strip()
+        if path == INDEX_SQL or not text:
+            continue
+        queries.append((f"sql/{path.name}", text, ()))
+
+    feats = load_features_module()
+    max_step = conn.execute("SELECT MAX(step) FROM transactions").fetchone()[0] or 0
+    some_acc = conn.execute("SELECT origId FROM transactions LIMIT 1").fetchone()
+    some_acc = some_acc[0] if some_acc else 0
+    queries += [
+        ("03_features_accounts.SHARD_SQL", feats.SHARD_SQL, {"n": 8, "k": 0}),
+        ("03_features_accounts.SHARD_EDGES_SQL", feats.SHARD_EDGES_SQL, {"n": 8, "k": 0}),
+        ("03_features_accounts.OOC_SQL", feats.OOC_SQL, ()),
+        ("03_features_accounts.OOC_REV_SQL", feats.OOC_REV_SQL, (some_acc, some_acc + 1000)),
+        ("features_incremental.NEW_ROWS_SQL (last day)", features_incremental.NEW_ROWS_SQL,
+         (max(0, max_step - 24),)),
+        # inline queries in agg_cube.scan_chunks / histograms (SQLite fallback paths)
+        ("agg_cube.scan_chunks", "SELECT step, type, amount FROM transactions", ()),
+        ("histograms.amount_max", "SELECT MAX(amount) FROM transactions", ()),
+        # investigator drill-down pattern (ad-hoc)
+        ("account lookup (origId OR destId)",
+         "SELECT * FROM transactions WHERE origId = ? OR destId = ? ORDER BY step",
+         (some_acc, some_acc)),
+    ]
+    return queries
+
+
+def explain(conn: sqlite3.Connection, sql: str, params) -> str:
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql.rstrip().rstrip(';')}", params).fetchall()
+    return " | ".join(r[-1] for r in rows)
+
+
+def time_query(conn: sqlite3.Connection, sql: str, params) -> tuple[float, int]:
+    """Run to completion, streaming rows (nothing is kept); returns (seconds, rows)."""
+    t0 = time.perf_counter()
+    cur = conn.execute(sql, params)
+    n = 0
+    while rows := cur.fetchmany(100_000):
+        n += len(rows)
+    return time.perf_counter() - t0, n
+
+
+def measure(conn, queries, timing: bool) -> dict:
+    out = {}
+    for label, sql, params in queries:
+        plan = explain(conn, sql, params)
+        secs, n = time_query(conn, sql, params) if timing else (float("nan"), -1)
+        out[label] = (plan, secs, n)
+    return out
+
+
+def managed_indexes() -> list[str]:
+    return re.findall(r"CREATE INDEX IF NOT EXISTS (\w+)", INDEX_SQL.read_text())
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Apply covering indexes and report query plans.")
+    p.add_argument("--db", type=Path, default=DB_PATH)
+    p.add_argument("--reset", action="store_true", help="drop the managed indexes before measuring")
+    p.add_argument("--no-timing", dest="timing", action="store_false", help="plans only")
+    args = p.parse_args()
+
+    if not args.db.exists():
+        raise SystemExit(f"[ERROR] DB not found at {args.db}. Run 01_load_to_sqlite.py first.")
+
+    conn = sqlite3.connect(args.db)
+    cols = {r[1] for r in conn.execute("PRAGMA table_xinfo(transactions)")}
+    if not GENERATED_COLS <= cols:
+        # stored generated columns can only be declared in CREATE TABLE
+        raise SystemExit("[ERROR] transactions lacks stored day_num/hour_of_day; re-run 01_load_to_sqlite.py.")
+
+    if args.reset:
+        for name in managed_indexes():
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.commit()
+
+    queries = collect_queries(conn)
+    print(f"[1/3] Measuring {len(queries)} queries before indexing…")
+    with span("measure_before", kind="query"):
+        before = measure(conn, queries, args.timing)
+
+    print(f"[2/3] Applying {INDEX_SQL.name} ({', '.join(managed_indexes())}) + ANALYZE…")
+    t0 = time.perf_counter()
+    with span("create_indexes", kind="query"):
+        conn.executescript(INDEX_SQL.read_text())
+        conn.commit()
+    print(f"    -> done in {time.perf_counter() - t0:,.1f}s")
+
+    print("[3/3] Measuring after…")
+    with span("measure_after", kind="query"):
+        after = measure(conn, queries, args.timing)
+    conn.close()
+
+    lines = []
+    for label, _, _ in queries:
+        plan_b, t_b, n = before[label]
+        plan_a, t_a, _ = after[label]
+        speed = f"x{t_b / t_a:,.1f}" if args.timing and t_a > 0 else "-"
+        lines += [
+            f"== {label}",
+            f"   before {t_b:8.3f}s  {plan_b}",
+            f"   after  {t_a:8.3f}s  {plan_a}",
+            f"   rows={n:,}  speedup={speed}",
+        ]
+    report = "\n".join(lines) + "\n"
+    print(report)
+    OUT_TXT.parent.mkdir(parents=True, exist_ok=True)
+    OUT_TXT.write_text(report)
+    print(f"[OK] query plan report → {OUT_TXT}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
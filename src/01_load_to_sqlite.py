@@ -5,22 +5,160 @@ Load PaySim CSV -> SQLite
 Features:
 - Robust path handling (works from any CWD; script or console).
 - WAL + synchronous=NORMAL to speed up bulk ingest safely.
-- Auto-avoid SQLite's ~999-parameter limit.
-- Chunked streaming to keep memory stable on 6.3M rows.
-- Clear logging + verification COUNT(*).
+- Raw sqlite3 executemany (one row per statement -> never hits the ~999-parameter limit).
+- Chunked streaming with explicit dtypes to keep memory stable on 6.3M rows.
+- Multi-file input (e.g. several simulated months) appended into one table.
+- Account names dictionary-encoded to integer ids (table: accounts) inside SQLite,
+  so Python memory stays flat no matter how many distinct accounts there are.
+- Optional columnar copy (Parquet, partitioned by day_num) for column-projected reads.
+- Clear logging + verification COUNT(*), rows/sec and peak RSS.
+
+Usage:
+    python src/01_load_to_sqlite.py                      # default PaySim CSV in data/
+    python src/01_load_to_sqlite.py data/m1.csv data/m2.csv --chunksize 100000
 
 Outputs:
-- data/paysim.db (table: transactions)
+- data/paysim.db
+    transactions    (origId/destId -> accounts.account_id; stored day_num/hour_of_day)
+    accounts        (account_id, name, is_merchant)
+    v_transactions  (view: decoded names + day_num/hour_of_day)
+- data/transactions_parquet/day_num=*/  (unless --no-parquet; see parquet_store.py)
 """
 
 from __future__ import annotations
 
+import argparse
+import sqlite3
 import sys
 import time
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
+
+import parquet_store
+from parquet_store import TX_TYPES
+from perf import peak_rss_mb, span, traced_iter
+
+# Explicit dtypes: no per-chunk inference, no object column for `type`.
+CSV_DTYPES = {
+    "step": "int32",
+    "type": pd.CategoricalDtype(TX_TYPES),
+    "amount": "float64",
+    "nameOrig": "string",
+    "oldbalanceOrg": "float64",
+    "newbalanceOrig": "float64",
+    "nameDest": "string",
+    "oldbalanceDest": "float64",
+    "newbalanceDest": "float64",
+    "isFraud": "int8",
+    "isFlaggedFraud": "int8",
+}
+COLUMNS = list(CSV_DTYPES)
+
+# Staging table mirrors the CSV; names are swapped for integer ids on the way into `transactions`.
+STAGE_DDL = """
+CREATE TEMP TABLE stage (
+    step            INTEGER,
+    type            TEXT,
+    amount          REAL,
+    nameOrig        TEXT,
+    oldbalanceOrg   REAL,
+    newbalanceOrig  REAL,
+    nameDest        TEXT,
+    oldbalanceDest  REAL,
+    newbalanceDest  REAL,
+    isFraud         INTEGER,
+    isFlaggedFraud  INTEGER
+)
+"""
+
+# Persistent account dictionary: PaySim name ("C1231006815") -> int32 id, plus C/M prefix flag.
+ACCOUNTS_DDL = """
+CREATE TABLE accounts (
+    account_id   INTEGER PRIMARY KEY,
+    name         TEXT NOT NULL UNIQUE,
+    is_merchant  INTEGER NOT NULL      -- 1 = 'M…' merchant, 0 = 'C…' customer
+)
+"""
+
+DDL = """
+CREATE TABLE transactions (
+    step            INTEGER,
+    type            TEXT,
+    amount          REAL,
+    origId          INTEGER,
+    oldbalanceOrg   REAL,
+    newbalanceOrig  REAL,
+    destId          INTEGER,
+    oldbalanceDest  REAL,
+    newbalanceDest  REAL,
+    isFraud         INTEGER,
+    isFlaggedFraud  INTEGER,
+    -- step-derived buckets, stored so GROUP BY / covering indexes don't recompute them
+    day_num         INTEGER GENERATED ALWAYS AS ((step - 1) / 24) STORED,
+    hour_of_day     INTEGER GENERATED ALWAYS AS ((step - 1) % 24) STORED
+)
+"""
+
+# Decoded view for ad-hoc queries / drill-down that still want names.
+VIEW_DDL = """
+CREATE VIEW v_transactions AS
+SELECT
+    t.step,
+    t.day_num,
+    t.hour_of_day,
+    t.type,
+    t.amount,
+    o.name            AS nameOrig,
+    t.oldbalanceOrg,
+    t.newbalanceOrig,
+    d.name            AS nameDest,
+    t.oldbalanceDest,
+    t.newbalanceDest,
+    t.isFraud,
+    t.isFlaggedFraud
+FROM transactions t
+JOIN accounts o ON o.account_id = t.origId
+JOIN accounts d ON d.account_id = t.destId
+"""
+
+STAGE_SQL = (
+    f"INSERT INTO stage ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(COLUMNS))})"
+)
+
+# New names get the next ids in order of first appearance (origins, then destinations).
+ENCODE_SQL = """
+INSERT OR IGNORE INTO accounts (name, is_merchant)
+SELECT nameOrig, substr(nameOrig, 1, 1) = 'M' FROM stage
+UNION ALL
+SELECT nameDest, substr(nameDest, 1, 1) = 'M' FROM stage
+"""
+
+INSERT_SQL = """
+INSERT INTO transactions (step, type, amount,
+                          origId, oldbalanceOrg, newbalanceOrig,
+                          destId, oldbalanceDest, newbalanceDest,
+                          isFraud, isFlaggedFraud)
+SELECT s.step, s.type, s.amount,
+       o.account_id, s.oldbalanceOrg, s.newbalanceOrig,
+       d.account_id, s.oldbalanceDest, s.newbalanceDest,
+       s.isFraud, s.isFlaggedFraud
+FROM stage s
+JOIN accounts o ON o.name = s.nameOrig
+JOIN accounts d ON d.name = s.nameDest
+ORDER BY s.rowid
+"""
+
+# Same join as INSERT_SQL, read back so the Parquet copy carries the encoded ids too.
+IDS_SQL = """
+SELECT o.account_id, d.account_id
+FROM stage s
+JOIN accounts o ON o.name = s.nameOrig
+JOIN accounts d ON d.name = s.nameDest
+ORDER BY s.rowid
+"""
 
 
 def resolve_project_root() -> Path:
@@ -33,105 +171,128 @@ def resolve_project_root() -> Path:
         return Path.cwd()
 
 
-def safe_insert_params(n_cols: int, sqlite_param_limit: int = 999) -> int:
-    """
-    Compute safe maximum rows per multi-row INSERT for SQLite, given column count.
-    If result < 1, return 1 to avoid zero/negative edge cases.
-    """
-    return max(1, sqlite_param_limit // max(1, n_cols))
+def iter_chunks(csv_paths: list[Path], chunksize: int):
+    """Yield typed DataFrame chunks from each CSV in turn; only one chunk is alive at a time."""
+    for path in csv_paths:
+        reader = pd.read_csv(path, dtype=CSV_DTYPES, usecols=COLUMNS, chunksize=chunksize)
+        with reader:
+            for chunk in reader:
+                yield path, chunk[COLUMNS]
 
 
-def main() -> int:
+def parse_args(argv: list[str] | None, data_dir: Path) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Stream PaySim CSV file(s) into SQLite.")
+    p.add_argument("csv", nargs="*", type=Path,
+                   default=[data_dir / "PS_20174392719_1491204439457_log.csv"],
+                   help="one or more PaySim CSVs, appended in the order given")
+    p.add_argument("--db", type=Path, default=data_dir / "paysim.db")
+    p.add_argument("--chunksize", type=int, default=50_000,
+                   help="rows per read/executemany batch (bounds peak memory)")
+    p.add_argument("--parquet", action=argparse.BooleanOptionalAction, default=True,
+                   help="also write the day_num-partitioned Parquet copy")
+    p.add_argument("--parquet-dir", type=Path, default=parquet_store.DATASET_DIR)
+    return p.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
     t0 = time.time()
 
     # ----- Paths -----
     ROOT = resolve_project_root()
     DATA_DIR = ROOT / "data"
-    CSV_PATH = DATA_DIR / "PS_20174392719_1491204439457_log.csv"
-    DB_PATH = DATA_DIR / "paysim.db"
+    args = parse_args(argv, DATA_DIR)
+    CSV_PATHS: list[Path] = args.csv
+    DB_PATH: Path = args.db
+    CHUNK: int = args.chunksize
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    if not CSV_PATH.exists():
-        print(f"[ERROR] CSV not found: {CSV_PATH}")
+    missing = [p for p in CSV_PATHS if not p.exists()]
+    if missing:
+        for p in missing:
+            print(f"[ERROR] CSV not found: {p}")
         print("Place the PaySim CSV in the 'data/' folder and retry.")
         return 1
 
-    # ----- Load CSV (streaming read optional; here full read is OK on modern Macs) -----
-    print(f"[1/4] Loading CSV: {CSV_PATH.name}")
-    df = pd.read_csv(CSV_PATH)
-    print(f"    -> {len(df):,} rows, {len(df.columns)} columns")
-    print(f"    -> columns: {list(df.columns)}")
-
-    # Decide insertion strategy to avoid SQLite's 999-parameter limit
-    n_cols = len(df.columns)
-    max_multi_rows = safe_insert_params(n_cols)  # with 11 cols -> 90 rows max
-    # We'll use executemany (method=None), which never hits the limit,
-    # but keep the computed value in case you want to try method="multi".
-    print(f"[Info] SQLite param limit handling: columns={n_cols}, "
-          f"max_multi_rows_if_used={max_multi_rows}")
-
-    # Chunk size: large enough to be fast, small enough to keep memory stable.
-    # For executemany, this controls how many rows are sent per batch.
-    CHUNK = 50_000
-
-    # ----- Create DB engine -----
+    print(f"[1/4] Input: {len(CSV_PATHS)} file(s): {[p.name for p in CSV_PATHS]}")
+    print(f"    -> streaming in chunks of {CHUNK:,} rows, columns: {COLUMNS}")
+
+    # ----- Create DB -----
     print(f"[2/4] Creating SQLite DB at: {DB_PATH}")
-    engine = create_engine(f"sqlite:///{DB_PATH}", future=True)
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)  # explicit BEGIN/COMMIT below
 
     # Speed tweaks for bulk load (safe defaults for local dev):
-    with engine.begin() as conn:
-        conn.exec_driver_sql("PRAGMA journal_mode=WAL;")
-        conn.exec_driver_sql("PRAGMA synchronous=NORMAL;")
-        conn.exec_driver_sql("PRAGMA temp_store=MEMORY;")
-        conn.exec_driver_sql("PRAGMA mmap_size=30000000000;")  # best-effort; ignored if not supported
-
-    # ----- Write to SQLite (chunked, executemany) -----
-    print(f"[3/4] Writing table 'transactions' (chunksize={CHUNK}, executemany)…")
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=30000000000;")  # best-effort; ignored if not supported
+    conn.execute("DROP VIEW IF EXISTS v_transactions;")
+    conn.execute("DROP TABLE IF EXISTS transactions;")
+    conn.execute("DROP TABLE IF EXISTS accounts;")
+    conn.execute(ACCOUNTS_DDL)
+    conn.execute(DDL)
+    conn.execute(VIEW_DDL)
+    conn.execute(STAGE_DDL)
+
+    # a stale columnar copy must never outlive the DB it was built from
+    parquet_store.reset_dataset(args.parquet_dir)
+    if args.parquet:
+        print(f"    -> Parquet copy: {args.parquet_dir}")
+
+    # ----- Write to SQLite (streaming, one transaction per chunk) -----
+    print(f"[3/4] Writing table 'transactions' (chunksize={CHUNK:,}, executemany)…")
     t_write = time.time()
-    df.to_sql(
-        "transactions",
-        engine,
-        if_exists="replace",
-        index=False,
-        chunksize=CHUNK,
-        method=None,  # executemany -> avoids 999-parameter limit cleanly
-    )
-    print(f"    -> write completed in {time.time() - t_write:,.1f}s")
+    n_rows = 0
+    current = None
+    try:
+        chunks = traced_iter(iter_chunks(CSV_PATHS, CHUNK), "parse_csv", "io", rows=lambda pc: len(pc[1]))
+        for part_no, (path, chunk) in enumerate(chunks):
+            if path != current:
+                print(f"    -> {path.name}")
+                current = path
+            conn.execute("BEGIN;")
+            with span("stage", kind="query", rows=len(chunk)):
+                conn.executemany(STAGE_SQL, chunk.itertuples(index=False, name=None))
+            with span("encode_accounts", kind="query", rows=len(chunk)):
+                conn.execute(ENCODE_SQL)
+            with span("insert", kind="query", rows=len(chunk)):
+                conn.execute(INSERT_SQL)
+            if args.parquet:
+                with span("read_ids", kind="query", rows=len(chunk)):
+                    ids = np.array(conn.execute(IDS_SQL).fetchall(), dtype=np.int32)
+                with span("write_parquet", kind="io", rows=len(chunk)):
+                    chunk = chunk.drop(columns=["nameOrig", "nameDest"]).assign(
+                        origId=ids[:, 0], destId=ids[:, 1])
+                    parquet_store.write_chunk(chunk, part_no, args.parquet_dir)
+            with span("commit", kind="query"):
+                conn.execute("DELETE FROM stage;")
+                conn.execute("COMMIT;")
+            n_rows += len(chunk)
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK;")
+        conn.close()
+        raise
+    dt_write = time.time() - t_write
+    rate = n_rows / dt_write if dt_write > 0 else float("nan")
+    print(f"    -> {n_rows:,} rows written in {dt_write:,.1f}s ({rate:,.0f} rows/s)")
 
     # ----- Verify -----
     print("[4/4] Verifying row count…")
-    with engine.connect() as conn:
-        total = conn.execute(text("SELECT COUNT(*) FROM transactions")).scalar_one()
-    print(f"    -> COUNT(*) = {total:,}")
+    with span("verify", kind="query"):
+        total = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        n_accounts = conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+    conn.close()
+    print(f"    -> COUNT(*) = {total:,} transactions, {n_accounts:,} accounts")
+    if total != n_rows:
+        print(f"[ERROR] row count mismatch: wrote {n_rows:,}, table has {total:,}")
+        return 1
 
+    print(f"[Info] peak RSS: {peak_rss_mb():,.0f} MB")
     print(f"✅ Done in {time.time() - t0:,.1f}s. Database ready at: {DB_PATH}")
+    print("Next: python src/01_apply_indexes.py  (covering indexes + ANALYZE, with query-plan report)")
     return 0
 
 
 if __name__ == "__main__":
     sys.exit(main())
-
-import sqlite3
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-
-# connect to your SQLite DB
-conn = sqlite3.connect("/Users/alejandrosoba/Documents/FIU-PaySim/data/paysim.db")
-
-# now run your SQL query
-df = pd.read_sql_query("""
-    SELECT day_num, hour_of_day, COUNT(*) AS n
-    FROM v_transactions
-    WHERE type IN ('CASH_IN','PAYMENT','TRANSFER')
-      AND amount BETWEEN 9000 AND 9999.99
-    GROUP BY day_num, hour_of_day
-    ORDER BY day_num, hour_of_day;
-""", conn)
-
-# pivot for heatmap
-pivot = df.pivot(index="hour_of_day", columns="day_num", values="n")
-
-# plot
-sns.heatmap(pivot, cmap="Reds")
-plt.show()
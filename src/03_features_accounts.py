@@ -1,12 +1,43 @@
 #!/usr/bin/env python3
 """
 Build per-account features from PaySim (SQLite -> CSV/Parquet).
+
+    python src/03_features_accounts.py                 # full rebuild
+    python src/03_features_accounts.py --incremental   # fold in only steps past the watermark
+    python src/03_features_accounts.py --workers 8     # hash-partitioned shards in a process pool
+    python src/03_features_accounts.py --out-of-core   # stream accounts in origId order, bounded memory
+
+Every mode appends the network columns from tx_graph.py (cached CSR adjacency),
+the balance-inconsistency columns from balance_features.py and the rolling-window
+burst columns from velocity_features.py (one NumPy pass each over the compact
+tx_arrays); --no-graph / --no-balance / --no-velocity skip them.
+
+--approx-distinct P estimates cp_diversity with HyperLogLog sketches (hll.py,
+2^P registers per account at most, ~1.04/sqrt(2^P) relative error on accounts
+with many counterparties, near exact on the usual few) instead of exact sets.
 """
 
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import resource
 import sqlite3
+import time
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import balance_features
+import features_incremental
+import hll
+from bands import NEAR_HI, NEAR_LO
+import tx_arrays
+import tx_graph
+import velocity_features
+from accounts import decode, load_accounts
+from perf import peak_rss_mb, span, traced_iter
 
 # ---------- Paths ----------
 HERE = Path(__file__).resolve()
@@ -17,60 +48,101 @@ OUT_CSV = OUT_DIR / "features_accounts.csv"
 OUT_PARQ = OUT_DIR / "features_accounts.parquet"
 
 # ---------- SQL ----------
-SQL = """
-SELECT
-  step,
-  (step - 1) / 24       AS day_num,
-  (step - 1) % 24       AS hour_of_day,
-  type,
-  amount,
-  nameOrig,
-  nameDest,
-  isFraud,
-  isFlaggedFraud
+# columns the feature build actually uses (projected from the compact tx_arrays cache)
+TX_COLS = ["step", "amount", "origId", "destId", "isFraud", "isFlaggedFraud"]
+
+# Parallel mode: shard k holds the customer accounts with origId % n = k ...
+SHARD_SQL = """
+SELECT t.step, t.amount, t.origId, t.destId, t.isFraud, t.isFlaggedFraud
+FROM transactions t
+JOIN accounts a ON a.account_id = t.origId
+WHERE a.is_merchant = 0 AND t.origId % :n = :k
+"""
+# ... and the edges with min(origId, destId) % n = k, so an edge and its reverse meet in one shard
+SHARD_EDGES_SQL = """
+SELECT origId, destId
 FROM transactions
+WHERE MIN(origId, destId) % :n = :k
+"""
+
+# Out-of-core mode: every account's rows arrive contiguously, served by idx_tx_orig_step ...
+OOC_SQL = """
+SELECT origId, step, amount, destId, isFraud, isFlaggedFraud
+FROM transactions
+ORDER BY origId, step
+"""
+# ... and the incoming edges of a finished origId range (idx_tx_dest_step) settle round trips
+OOC_REV_SQL = """
+SELECT destId, origId
+FROM transactions
+WHERE destId BETWEEN ? AND ?
 """
 
 # ---------- Helpers ----------
-def interarrival_stats_steps(s: pd.Series) -> pd.Series:
-    a = s.sort_values().to_numpy()
-    if a.size < 2:
-        return pd.Series({"ia_mean": np.nan, "ia_median": np.nan, "ia_std": np.nan})
-    d = np.diff(a)
-    return pd.Series({
-        "ia_mean": float(d.mean()),
-        "ia_median": float(np.median(d)),
-        "ia_std": float(d.std(ddof=1)) if d.size > 1 else 0.0,
-    })
+def interarrival_stats(acc: np.ndarray, step: np.ndarray) -> pd.DataFrame:
+    """
+    ia_mean / ia_median / ia_std of the gaps between an account's consecutive steps.
+
+    Sort once by (account, step), np.diff, drop the gaps that cross an account
+    boundary, then reduce each account's segment (np.add.reduceat). Accounts with
+    a single transaction get NaN; exactly one gap gives ia_std = 0.0.
+    """
+    order = np.lexsort((step, acc))
+    a = acc[order]
+    s = step[order].astype(np.int64)
+    same = a[1:] == a[:-1]
+    gap_acc = a[1:][same]
+    gap = np.diff(s)[same].astype(np.float64)
+
+    # gap_acc is sorted; sorting gaps inside each segment as well gives the medians
+    order = np.lexsort((gap, gap_acc))
+    gap_acc, gap = gap_acc[order], gap[order]
+    ids, starts, n = np.unique(gap_acc, return_index=True, return_counts=True)
+
+    if ids.size:
+        mean = np.add.reduceat(gap, starts) / n
+        dev = gap - np.repeat(mean, n)
+        ss = np.add.reduceat(dev * dev, starts)
+        std = np.where(n > 1, np.sqrt(ss / np.maximum(n - 1, 1)), 0.0)
+        median = (gap[starts + (n - 1) // 2] + gap[starts + n // 2]) / 2.0
+    else:
+        mean = std = median = np.zeros(0)
+
+    out = pd.DataFrame(
+        {"ia_mean": mean, "ia_median": median, "ia_std": std},
+        index=pd.Index(ids, name="origId"),
+    )
+    return out.reindex(pd.Index(np.unique(acc), name="origId"))
 
 def round_trip_flag(df: pd.DataFrame) -> pd.Series:
-    sent = df.groupby("nameOrig")["nameDest"].apply(set)
-    recv = df.groupby("nameDest")["nameOrig"].apply(set)
-    idx = sent.index.union(recv.index)
-    out = pd.Series(False, index=idx, name="round_trip_any")
-    for acc in idx:
-        s = sent.get(acc, set())
-        r = recv.get(acc, set())
-        out.loc[acc] = len(s & r) > 0
-    # ensure index has a name for joins
-    out.index.name = "nameOrig"
-    return out
+    """
+    True for every account that both sent to and received from the same counterparty.
 
-# ---------- Main ----------
-def main() -> int:
-    if not DB_PATH.exists():
-        raise SystemExit(f"[ERROR] DB not found at {DB_PATH}. Run 01_load_to_sqlite.py first.")
+    Join-based: pack each (orig, dest) edge of integer account ids into one
+    int64 key and look it up among the reversed (dest, orig) keys.
+    """
+    orig = df["origId"].to_numpy(dtype=np.int64)
+    dest = df["destId"].to_numpy(dtype=np.int64)
+    ids = np.union1d(orig, dest)
+    n_acc = np.int64(ids[-1] + 1) if ids.size else np.int64(1)
 
-    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn:
-        df = pd.read_sql_query(SQL, conn)
+    fwd = np.unique(orig * n_acc + dest)
+    rev = np.unique(dest * n_acc + orig)
+    hit = np.isin(fwd, rev, assume_unique=True)
 
-    # focus on customer-originated accounts
-    df["is_customer_orig"] = df["nameOrig"].str.startswith("C")
-    df_cust = df[df["is_customer_orig"]].copy()
-    df_cust["near_thresh"] = df_cust["amount"].between(9000, 9999.99).astype(int)
+    # both ends of a reciprocated edge appear as origin of one of the pair
+    flagged = np.isin(ids, fwd[hit] // n_acc)
+    return pd.Series(flagged, index=pd.Index(ids, name="origId"), name="round_trip_any")
 
-    # aggregates
-    agg = df_cust.groupby("nameOrig").agg(
+def account_aggregates(df_cust: pd.DataFrame) -> pd.DataFrame:
+    """Count / amount / near-threshold / fraud-label aggregates per customer origId."""
+    df_cust = df_cust.assign(
+        near_thresh=((df_cust["amount"] >= NEAR_LO) & (df_cust["amount"] < NEAR_HI)).astype(int),
+        # the Parquet copy stores flags as int8; count in int64 so per-account sums can't wrap
+        isFraud=df_cust["isFraud"].astype(np.int64),
+        isFlaggedFraud=df_cust["isFlaggedFraud"].astype(np.int64),
+    )
+    agg = df_cust.groupby("origId").agg(
         n_tx=("amount", "size"),
         amt_sum=("amount", "sum"),
         amt_mean=("amount", "mean"),
@@ -80,41 +152,281 @@ def main() -> int:
         flagged_n=("isFlaggedFraud", "sum"),
     )
     agg["near_pct"] = agg["near_n"] / agg["n_tx"].clip(lower=1)
-    agg.index.name = "nameOrig"  # <-- normalize index name
+    agg.index.name = "origId"  # <-- normalize index name
+    return agg
 
-    # inter-arrival
-    ia = (
-        df_cust.groupby("nameOrig")["step"]
-        .apply(interarrival_stats_steps)
-        .unstack()  # columns: ia_mean, ia_median, ia_std
-    )
-    ia.index.name = "nameOrig"  # <-- normalize
-
-    # counterparty diversity
+def counterparty_diversity(df_cust: pd.DataFrame, hll_p: int | None = None) -> pd.Series:
+    """Distinct destIds per customer origId (HyperLogLog estimate with 2^hll_p registers if given)."""
+    if hll_p is not None:
+        ids, est = hll.distinct_per_group(df_cust["origId"].to_numpy(), df_cust["destId"].to_numpy(), hll_p)
+        return pd.Series(est, index=pd.Index(ids, name="origId"), name="cp_diversity")
     cp_div = (
-        df_cust.groupby("nameOrig")["nameDest"]
+        df_cust.groupby("origId")["destId"]
         .nunique()
         .rename("cp_diversity")
     )
-    cp_div.index.name = "nameOrig"  # <-- normalize
+    cp_div.index.name = "origId"  # <-- normalize
+    return cp_div
 
-    # round-trip heuristic (uses full df to consider both directions)
-    rt = round_trip_flag(df)        # already named and indexed
+def account_features(df_cust: pd.DataFrame, hll_p: int | None = None) -> pd.DataFrame:
+    """Aggregates, inter-arrival stats and counterparty diversity per customer origId."""
+    with span("aggregates", rows=len(df_cust)):
+        agg = account_aggregates(df_cust)
+
+    # inter-arrival (columns: ia_mean, ia_median, ia_std)
+    with span("interarrival", rows=len(df_cust)):
+        ia = interarrival_stats(df_cust["origId"].to_numpy(), df_cust["step"].to_numpy())
+
+    # counterparty diversity
+    with span("counterparty", rows=len(df_cust)):
+        cp_div = counterparty_diversity(df_cust, hll_p)
+
+    with span("join", kind="convert"):
+        return agg.join(ia, how="left").join(cp_div, how="left")
 
-    # join all
-    features = (
-        agg.join(ia, how="left")
-        .join(cp_div, how="left")
-        .join(rt, how="left")
-        .fillna({"cp_diversity": 0, "round_trip_any": False})
-        .reset_index(names="account")
-    )
 
-    # write outputs
+def build_shard(k: int, n: int, hll_p: int | None = None) -> tuple[pd.DataFrame, np.ndarray, dict]:
+    """Worker: features for shard k of n, plus the accounts its edge partition flags as round trips."""
+    t0 = time.time()
+    params = {"n": n, "k": k}
+    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn:
+        df = pd.read_sql_query(SHARD_SQL, conn, params=params)
+        edges = pd.read_sql_query(SHARD_EDGES_SQL, conn, params=params)
+    feats = account_features(df, hll_p)
+    rt = round_trip_flag(edges)
+    stats = {"shard": k, "rows": len(df), "edges": len(edges),
+             "seconds": time.time() - t0, "peak_rss_mb": peak_rss_mb()}
+    return feats, rt.index[rt.to_numpy()].to_numpy(), stats
+
+
+# ---------- Main ----------
+def output_frame(features: pd.DataFrame, names: np.ndarray, extra: dict[str, np.ndarray] | None = None) -> pd.DataFrame:
+    """
+    origId-indexed features -> output rows with account_id + decoded account name, plus
+    the per-account-id `extra` columns (memory-mapped caches; only these ids' rows are read).
+    """
+    features = features.reset_index(names="account_id")
+    features["account_id"] = features["account_id"].astype(np.int32)
+    # decode ids only at the output boundary
+    features.insert(1, "account", decode(features["account_id"], names))
+    if extra is not None:
+        ids = features["account_id"].to_numpy()
+        for col, arr in extra.items():
+            features[col] = np.asarray(arr[ids])
+    return features
+
+
+def write_outputs(features: pd.DataFrame, names: np.ndarray, extra: dict[str, np.ndarray] | None = None) -> None:
+    with span("output_frame", kind="convert", rows=len(features)):
+        features = output_frame(features, names, extra)
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    with span("write_csv", kind="io", rows=len(features)):
+        features.to_csv(OUT_CSV, index=False)
+    with span("write_parquet", kind="io", rows=len(features)):
+        features.to_parquet(OUT_PARQ, index=False)
+    print(f"[OK] wrote features: {OUT_CSV} and {OUT_PARQ}")
+
+
+def run_incremental(extra: dict[str, np.ndarray] | None) -> int:
+    t0 = time.time()
+    state = features_incremental.load_state()
+    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn, span("read", kind="query") as sp:
+        new = features_incremental.read_new_rows(conn, state["last_step"])
+        names, is_merchant = load_accounts(conn)
+        sp.rows = len(new)
+    print(f"[Info] watermark step={state['last_step']}: {len(new):,} new rows")
+    if new.empty and OUT_PARQ.exists():
+        print("[OK] features already up to date")
+        return 0
+
+    with span("fold", rows=len(new)):
+        state = features_incremental.fold(state, new, is_merchant)
+    with span("save_state", kind="io"):
+        features_incremental.save_state(state)
+    write_outputs(features_incremental.finalize(state), names, extra)
+    print(f"[Info] watermark → step={state['last_step']} ({state['rows']:,} rows) in {time.time() - t0:,.1f}s")
+    return 0
+
+
+def run_parallel(workers: int, shards: int, extra: dict[str, np.ndarray] | None, hll_p: int | None = None) -> int:
+    t0 = time.time()
+    print(f"[Info] parallel build: {workers} workers, {shards} shards (origId % {shards})")
+    parts, flagged = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool, span("shards"):
+        futures = [pool.submit(build_shard, k, shards, hll_p) for k in range(shards)]
+        for fut in as_completed(futures):
+            feats, rt_ids, st = fut.result()
+            parts.append(feats)
+            flagged.append(rt_ids)
+            print(f"    -> shard {st['shard']:>3}: {st['rows']:>10,} rows, {st['edges']:>10,} edges, "
+                  f"{st['seconds']:6.1f}s, worker peak RSS {st['peak_rss_mb']:,.0f} MB")
+
+    with span("merge_shards", kind="convert"):
+        features = pd.concat(parts).sort_index()
+        features["round_trip_any"] = features.index.isin(np.concatenate(flagged))
+    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn:
+        names, _ = load_accounts(conn)
+    write_outputs(features, names, extra)
+    print(f"[Info] {len(features):,} accounts in {time.time() - t0:,.1f}s; peak RSS "
+          f"parent {peak_rss_mb():,.0f} MB, largest worker {peak_rss_mb(resource.RUSAGE_CHILDREN):,.0f} MB")
+    return 0
+
+
+def finished_accounts(done: pd.DataFrame, conn: sqlite3.Connection,
+                      is_merchant: np.ndarray, hll_p: int | None = None) -> pd.DataFrame:
+    """Features for a block of complete accounts (all their rows are in `done`)."""
+    orig = done["origId"].to_numpy(dtype=np.int64)
+    dest = done["destId"].to_numpy(dtype=np.int64)
+    feats = account_features(done[~is_merchant[orig]], hll_p)
+
+    # reciprocated edge: this block sent a->b, and b->a appears among a's incoming rows
+    lo, hi = int(orig[0]), int(orig[-1])
+    rev = pd.read_sql_query(OOC_REV_SQL, conn, params=(lo, hi))
+    n_acc = np.int64(len(is_merchant))
+    fwd = np.unique(orig * n_acc + dest)
+    back = rev["destId"].to_numpy(dtype=np.int64) * n_acc + rev["origId"].to_numpy(dtype=np.int64)
+    hit = np.unique(fwd[np.isin(fwd, back)] // n_acc)
+    feats["round_trip_any"] = feats.index.isin(hit)
+    return feats
+
+
+def run_out_of_core(chunksize: int, extra: dict[str, np.ndarray] | None, hll_p: int | None = None) -> int:
+    """
+    Stream transactions ordered by (origId, step) in chunks of `chunksize` rows and
+    finalize each account as soon as the next origId starts; features go straight to
+    Parquet row groups / CSV appends. Peak memory is bounded by the chunk size (plus the
+    largest single account and the O(accounts) name/merchant arrays): the graph, balance
+    and velocity columns stay memory-mapped in their caches and each flush gathers only
+    its accounts' rows. Building one of those caches from cold is a whole-table pass,
+    so a strictly bounded run has them built beforehand (or skips them with
+    --no-graph / --no-balance / --no-velocity). Rows sharing a
+    step are summed in index order, so amt_sum/amt_mean can differ from the in-memory
+    build in the last ulp.
+    """
+    t0 = time.time()
+    tmp_parq = OUT_PARQ.with_suffix(".parquet.tmp")
+    tmp_csv = OUT_CSV.with_suffix(".csv.tmp")
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    features.to_csv(OUT_CSV, index=False)
-    features.to_parquet(OUT_PARQ, index=False)
+    n_rows = n_acc = 0
+    writer = None
+
+    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn, open(tmp_csv, "w", newline="") as f_csv:
+        names, is_merchant = load_accounts(conn)
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_tx_orig_step'").fetchone():
+            print("[Info] idx_tx_orig_step missing: SQLite will sort in a temp b-tree "
+                  "(run 01_apply_indexes.py for a streaming index scan)")
+        print(f"[Info] out-of-core build: chunks of {chunksize:,} rows ordered by origId")
+
+        def flush(done: pd.DataFrame) -> None:
+            nonlocal writer, n_acc
+            with span("features", rows=len(done)):
+                feats = finished_accounts(done, conn, is_merchant, hll_p)
+            with span("output_frame", kind="convert", rows=len(feats)):
+                # map the extra columns afresh per flush: pages read here are released with the
+                # mapping, so RSS does not grow to the whole cache over the run
+                fresh = {c: np.load(arr.filename, mmap_mode="r") for c, arr in extra.items()} if extra else None
+                out = output_frame(feats, names, fresh)
+                del fresh
+                table = pa.Table.from_pandas(out, preserve_index=False)
+            with span("write", kind="io", rows=len(out)):
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_parq, table.schema)
+                writer.write_table(table.cast(writer.schema))
+                out.to_csv(f_csv, header=n_acc == 0, index=False)
+            n_acc += len(out)
+
+        carry = None
+        try:
+            for chunk in traced_iter(pd.read_sql_query(OOC_SQL, conn, chunksize=chunksize), "read", "query"):
+                n_rows += len(chunk)
+                df = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+                last = df["origId"].iat[-1]
+                tail = (df["origId"] == last).to_numpy()
+                carry = df[tail]               # the last account may continue in the next chunk
+                if not tail.all():
+                    flush(df[~tail])
+            if carry is not None and len(carry):
+                flush(carry)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    if writer is None:
+        raise SystemExit("[ERROR] no transactions to build features from")
+    os.replace(tmp_parq, OUT_PARQ)
+    os.replace(tmp_csv, OUT_CSV)
     print(f"[OK] wrote features: {OUT_CSV} and {OUT_PARQ}")
+    print(f"[Info] {n_rows:,} rows → {n_acc:,} accounts in {time.time() - t0:,.1f}s; "
+          f"peak RSS {peak_rss_mb():,.0f} MB")
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Build per-account features.")
+    p.add_argument("--incremental", action="store_true",
+                   help=f"fold only rows with step > watermark ({features_incremental.WATERMARK_PATH.name})")
+    p.add_argument("--workers", type=int, default=0,
+                   help="process-pool size for the sharded build (0 = single process)")
+    p.add_argument("--shards", type=int, default=None,
+                   help="number of account-hash shards (default: --workers)")
+    p.add_argument("--out-of-core", action="store_true",
+                   help="stream accounts in origId order with bounded memory")
+    p.add_argument("--chunksize", type=int, default=500_000,
+                   help="rows per chunk for --out-of-core")
+    p.add_argument("--no-graph", dest="graph", action="store_false",
+                   help="skip the tx_graph network columns")
+    p.add_argument("--no-balance", dest="balance", action="store_false",
+                   help="skip the balance_features columns")
+    p.add_argument("--no-velocity", dest="velocity", action="store_false",
+                   help="skip the velocity_features columns")
+    p.add_argument("--approx-distinct", type=int, default=None, metavar="P",
+                   help="HyperLogLog cp_diversity with up to 2^P registers per account (e.g. 14; not --incremental)")
+    args = p.parse_args()
+
+    if not DB_PATH.exists():
+        raise SystemExit(f"[ERROR] DB not found at {DB_PATH}. Run 01_load_to_sqlite.py first.")
+    # columns indexed by account id, appended to every mode's output (graph, balance, velocity);
+    # memory-mapped from their caches, never concatenated into one frame
+    extra = {}
+    if args.graph:
+        with span("graph"):
+            extra.update(tx_graph.node_feature_columns(DB_PATH))
+    if args.balance:
+        with span("balance"):
+            extra.update(balance_features.balance_columns(DB_PATH))
+    if args.velocity:
+        with span("velocity"):
+            extra.update(velocity_features.velocity_columns(DB_PATH))
+    extra = extra or None
+    if args.incremental:
+        if args.approx_distinct is not None:
+            print("[Info] --incremental keeps exact cp_diversity from its distinct-edge state")
+        return run_incremental(extra)
+    if args.out_of_core:
+        return run_out_of_core(args.chunksize, extra, args.approx_distinct)
+    if args.workers > 0:
+        return run_parallel(args.workers, args.shards or args.workers, extra, args.approx_distinct)
+
+    # compact typed columns (uint16 step, int32 ids, bool flags), memory-mapped from data/tx_arrays
+    df = tx_arrays.load_frame(TX_COLS)
+    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn, span("load_accounts", kind="query"):
+        names, is_merchant = load_accounts(conn)
+
+    # focus on customer-originated accounts
+    df["is_customer_orig"] = ~is_merchant[df["origId"].to_numpy()]
+
+    # round-trip heuristic (uses full df to consider both directions)
+    with span("round_trip", rows=len(df)):
+        rt = round_trip_flag(df)        # already named and indexed
+
+    # join all
+    with span("features", rows=int(df["is_customer_orig"].sum())):
+        features = (
+            account_features(df[df["is_customer_orig"]], args.approx_distinct)
+            .join(rt, how="left")
+            .fillna({"cp_diversity": 0, "round_trip_any": False})
+        )
+    write_outputs(features, names, extra)
     return 0
 
 if __name__ == "__main__":
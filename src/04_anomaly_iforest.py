@@ -1,42 +1,241 @@
 #!/usr/bin/env python3
+"""
+Isolation Forest anomaly scores for the per-account features.
+
+Fit once (StandardScaler + 300-tree IsolationForest on a sample of accounts) and
+persist both to data/models/iforest.joblib; later runs reuse the saved model and
+only score. Scoring streams features_accounts.parquet in chunks, optionally in a
+process pool, and writes data/anomaly_scores.parquet row group by row group.
+--changed re-scores only accounts whose feature values differ from the last
+scoring run (per-row feature hash), e.g. after an incremental feature update.
+
+    python src/04_anomaly_iforest.py                    # fit if no saved model, score everything
+    python src/04_anomaly_iforest.py --refit --sample 0 # refit on all accounts (original behaviour)
+    python src/04_anomaly_iforest.py --changed --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import resource
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+
+import joblib
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
-import numpy as np
+
+from perf import peak_rss_mb, span, traced_iter
+from feature_cols import NUM_COLS
 
 HERE = Path(__file__).resolve()
 ROOT = HERE.parents[1]
 FEAT_PATH = ROOT / "data" / "features_accounts.parquet"
+MODEL_PATH = ROOT / "data" / "models" / "iforest.joblib"
+SCORES_PATH = ROOT / "data" / "anomaly_scores.parquet"
 OUT_CSV = ROOT / "reports" / "anomalies_accounts.csv"
 
-NUM_COLS = [
-    "n_tx","amt_sum","amt_mean","amt_max","near_n","near_pct",
-    "ia_mean","ia_median","ia_std","cp_diversity"
-]
+SAMPLE = 250_000
+CHUNK = 100_000
+# tweak contamination by how many you want to review
+CONTAMINATION = 0.005
+
+SCORES_SCHEMA = pa.schema([
+    ("account_id", pa.int32()),
+    ("feat_hash", pa.uint64()),
+    ("iso_score", pa.float64()),
+    ("is_anom", pa.bool_()),
+])
+
+
+# ---------- Model ----------
+def fit_model(sample: int, contamination: float = CONTAMINATION, seed: int = 42) -> dict:
+    """Fit scaler + forest on `sample` random accounts (0 = all) and return the bundle."""
+    cols = ["account_id"] + NUM_COLS
+    with span("read_features", kind="io") as sp:
+        df = pd.read_parquet(FEAT_PATH, columns=cols)
+        sp.rows = len(df)
+    with span("sample", kind="convert"):
+        if 0 < sample < len(df):
+            df = df.sample(n=sample, random_state=seed)
+        X = df[NUM_COLS].fillna(0.0).to_numpy()
+
+    t0 = time.perf_counter()
+    with span("fit", rows=len(X)):
+        scaler = StandardScaler().fit(X)
+        model = IsolationForest(n_estimators=300, contamination=contamination, random_state=seed)
+        model.fit(scaler.transform(X))
+    secs = time.perf_counter() - t0
+    return {
+        "scaler": scaler,
+        "model": model,
+        "num_cols": NUM_COLS,
+        "contamination": contamination,
+        "model_id": f"{time.time_ns():x}",
+        "fit_rows": len(df),
+        "fit_seconds": secs,
+    }
+
+
+def load_or_fit(refit: bool, sample: int, contamination: float = CONTAMINATION) -> dict:
+    if not refit and MODEL_PATH.exists():
+        with span("load_model", kind="io"):
+            bundle = joblib.load(MODEL_PATH)
+        if bundle["num_cols"] == NUM_COLS and bundle.get("contamination") == contamination:
+            print(f"[Info] loaded model {bundle['model_id']} ({bundle['fit_rows']:,} fit rows) from {MODEL_PATH}")
+            return bundle
+        print("[Info] saved model has different feature columns / contamination; refitting")
+    with span("fit_model"):
+        bundle = fit_model(sample, contamination)
+    MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with span("save_model", kind="io"):
+        joblib.dump(bundle, MODEL_PATH)
+    print(f"[OK] fit on {bundle['fit_rows']:,} accounts in {bundle['fit_seconds']:,.1f}s → {MODEL_PATH}")
+    return bundle
+
+
+# ---------- Scoring ----------
+_BUNDLE: dict | None = None
 
-def main() -> int:
-    if not FEAT_PATH.exists():
-        raise SystemExit(f"[ERROR] features not found: {FEAT_PATH}. Run 03_features_accounts.py first.")
 
-    df = pd.read_parquet(FEAT_PATH)
-    X = df[NUM_COLS].fillna(0.0).to_numpy()
-    Xs = StandardScaler().fit_transform(X)
+def _init_worker(model_path: Path) -> None:
+    global _BUNDLE
+    _BUNDLE = joblib.load(model_path)
 
-    # tweak contamination by how many you want to review
-    model = IsolationForest(n_estimators=300, contamination=0.005, random_state=42)
-    scores = model.fit_predict(Xs)              # -1 anomaly, 1 normal
-    iso_score = model.decision_function(Xs)     # lower = more anomalous
 
-    out = df[["account"] + NUM_COLS].copy()
-    out["iso_score"] = iso_score
-    out["is_anom"] = (scores == -1)
+def score_chunk(X: np.ndarray, bundle: dict | None = None) -> np.ndarray:
+    """decision_function on raw feature rows (lower = more anomalous, < 0 = anomaly)."""
+    if not len(X):
+        return np.zeros(0)
+    b = bundle or _BUNDLE
+    return b["model"].decision_function(b["scaler"].transform(X))
 
-    out.sort_values("iso_score", ascending=True, inplace=True)
+
+def feature_hash(df: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(df[NUM_COLS], index=False).to_numpy()
+
+
+def load_previous(model_id: str) -> pd.DataFrame | None:
+    """Last scores indexed by account_id, if they came from the same model."""
+    if not SCORES_PATH.exists():
+        return None
+    meta = pq.read_schema(SCORES_PATH).metadata or {}
+    if meta.get(b"model_id", b"").decode() != model_id:
+        print("[Info] previous scores are from another model; scoring everything")
+        return None
+    return pd.read_parquet(SCORES_PATH).set_index("account_id")
+
+
+def iter_chunks(chunksize: int, prev: pd.DataFrame | None):
+    """(account_id, hash, X of rows to score, mask of those rows, prev scores) per features batch."""
+    pf = pq.ParquetFile(FEAT_PATH)
+    batches = pf.iter_batches(batch_size=chunksize, columns=["account_id"] + NUM_COLS)
+    for batch in traced_iter(batches, "read_batch", "io", rows=lambda b: b.num_rows):
+        with span("prepare", kind="convert", rows=batch.num_rows):
+            df = batch.to_pandas()
+            ids = df["account_id"].to_numpy(dtype=np.int32)
+            h = feature_hash(df)
+            if prev is None:
+                todo = np.ones(len(df), dtype=bool)
+                old = np.full(len(df), np.nan)
+            else:
+                p = prev.reindex(ids)
+                todo = (p["feat_hash"].to_numpy() != h) | p["feat_hash"].isna().to_numpy()
+                old = p["iso_score"].to_numpy(dtype=np.float64)
+            X = df.loc[todo, NUM_COLS].fillna(0.0).to_numpy()
+        yield ids, h, X, todo, old
+
+
+def score_all(bundle: dict, workers: int, chunksize: int, changed: bool) -> tuple[int, int, float]:
+    """Stream features → scores parquet; returns (accounts, rescored, scoring seconds)."""
+    prev = load_previous(bundle["model_id"]) if changed else None
+    tmp = SCORES_PATH.with_suffix(".parquet.tmp")
+    schema = SCORES_SCHEMA.with_metadata({"model_id": bundle["model_id"]})
+    n_total = n_scored = 0
+    t_score = 0.0
+
+    def emit(writer, ids, h, todo, old, s):
+        nonlocal n_total, n_scored
+        score = old.copy()
+        score[todo] = s
+        with span("write_scores", kind="io", rows=len(ids)):
+            writer.write_table(pa.table({
+                "account_id": ids, "feat_hash": h, "iso_score": score, "is_anom": score < 0,
+            }, schema=schema))
+        n_total += len(ids)
+        n_scored += int(todo.sum())
+
+    with pq.ParquetWriter(tmp, schema) as writer:
+        if workers <= 1:
+            for ids, h, X, todo, old in iter_chunks(chunksize, prev):
+                t0 = time.perf_counter()
+                with span("score", rows=len(X)):
+                    s = score_chunk(X, bundle)
+                t_score += time.perf_counter() - t0
+                emit(writer, ids, h, todo, old, s)
+        else:
+            t0 = time.perf_counter()
+            pending: deque = deque()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(MODEL_PATH,)) as pool:
+                for ids, h, X, todo, old in iter_chunks(chunksize, prev):
+                    pending.append((pool.submit(score_chunk, X), ids, h, todo, old))
+                    if len(pending) >= 2 * workers:     # bounded prefetch, results kept in order
+                        fut, *rest = pending.popleft()
+                        emit(writer, *rest, fut.result())
+                with span("drain_workers"):
+                    while pending:
+                        fut, *rest = pending.popleft()
+                        emit(writer, *rest, fut.result())
+            t_score = time.perf_counter() - t0
+    tmp.replace(SCORES_PATH)
+    return n_total, n_scored, t_score
+
+
+def write_report() -> None:
+    with span("read", kind="io"):
+        df = pd.read_parquet(FEAT_PATH, columns=["account", "account_id"] + NUM_COLS)
+        sc = pd.read_parquet(SCORES_PATH, columns=["account_id", "iso_score", "is_anom"])
+    with span("merge_sort", kind="convert", rows=len(df)):
+        out = df.merge(sc, on="account_id", how="left", validate="one_to_one")
+        out.sort_values("iso_score", ascending=True, inplace=True, kind="stable")
     OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(OUT_CSV, index=False)
-    print(f"[OK] anomalies saved → {OUT_CSV} (top rows are most anomalous)")
+    with span("write_csv", kind="io", rows=len(out)):
+        out.to_csv(OUT_CSV, index=False)
+    print(f"[OK] anomalies saved → {OUT_CSV} (top rows are most anomalous; {int(out['is_anom'].sum()):,} flagged)")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Isolation Forest scoring with a persisted model.")
+    p.add_argument("--refit", action="store_true", help="fit a new model even if one is saved")
+    p.add_argument("--sample", type=int, default=SAMPLE, help="accounts to fit on (0 = all)")
+    p.add_argument("--contamination", type=float, default=CONTAMINATION,
+                   help="expected anomaly share; sets the is_anom threshold")
+    p.add_argument("--changed", action="store_true",
+                   help="re-score only accounts whose features changed since the last run")
+    p.add_argument("--workers", type=int, default=1, help="scoring processes")
+    p.add_argument("--chunksize", type=int, default=CHUNK, help="accounts per scoring chunk")
+    args = p.parse_args()
+
+    if not FEAT_PATH.exists():
+        raise SystemExit(f"[ERROR] features not found: {FEAT_PATH}. Run 03_features_accounts.py first.")
+
+    bundle = load_or_fit(args.refit, args.sample, args.contamination)
+    with span("score_all"):
+        n_total, n_scored, secs = score_all(bundle, args.workers, args.chunksize, args.changed)
+    print(f"[Info] scored {n_scored:,} of {n_total:,} accounts in {secs:,.1f}s "
+          f"({n_scored / max(secs, 1e-9):,.0f} accounts/s, {args.workers} worker(s)) → {SCORES_PATH}")
+    with span("report"):
+        write_report()
+    print(f"[Info] peak RSS parent {peak_rss_mb():,.0f} MB, "
+          f"largest worker {peak_rss_mb(resource.RUSAGE_CHILDREN):,.0f} MB")
     return 0
 
 if __name__ == "__main__":
-    raise SystemExit(main())
\ No newline at end of file
+    raise SystemExit(main())
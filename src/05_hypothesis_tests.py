@@ -1,37 +1,119 @@
 #!/usr/bin/env python3
+"""
+Flagged vs clean accounts: Welch t / Mann-Whitney on near_pct, plus permutation
+and bootstrap tests for every anomaly feature (resampling.py).
+
+With 16 flagged vs millions of clean accounts the asymptotic p-values are not
+reliable; the permutation p-values and bootstrap CIs do not lean on them.
+Resamples are seeded from SEED and cached by input hash, so reruns are instant.
+
+    python src/05_hypothesis_tests.py                          # 10k permutations, 10k bootstraps
+    python src/05_hypothesis_tests.py --permutations 100000 --workers 4
+
+Outputs:
+- reports/hypothesis_tests.txt         near_pct tests + per-feature table
+- reports/hypothesis_resampling.csv    feature, means, t/U with permutation p, bootstrap CI
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+
 import pandas as pd
 from scipy import stats
 
+import resampling
+from perf import span
+from feature_cols import NUM_COLS
+
 HERE = Path(__file__).resolve()
 ROOT = HERE.parents[1]
 FEAT_PATH = ROOT / "data" / "features_accounts.parquet"
 OUT_TXT = ROOT / "reports" / "hypothesis_tests.txt"
+OUT_CSV = ROOT / "reports" / "hypothesis_resampling.csv"
+
+
+def resample_all(df: pd.DataFrame, flagged_mask, n_perm: int, n_boot: int, seed: int,
+                 pool, batch: int) -> pd.DataFrame:
+    rows = []
+    for col in NUM_COLS:
+        flagged = df.loc[flagged_mask, col].dropna().to_numpy()
+        clean = df.loc[~flagged_mask, col].dropna().to_numpy()
+        if len(flagged) < 5 or len(clean) < 5:
+            print(f"[WARN] {col}: not enough accounts per group; skipped")
+            continue
+        t0 = time.perf_counter()
+        perm = resampling.permutation_test(flagged, clean, n_perm, seed, pool, batch)
+        boot = resampling.bootstrap_diff(flagged, clean, n_boot, seed, pool, batch)
+        secs = time.perf_counter() - t0
+        rows.append({
+            "feature": col, "n_flagged": len(flagged), "n_clean": len(clean),
+            "mean_flagged": flagged.mean(), "mean_clean": clean.mean(),
+            "welch_t": perm["t"], "p_perm_t": perm["p_t"],
+            "mw_u": perm["u"], "p_perm_u": perm["p_u"],
+            "diff": boot["diff"], "ci_lo": boot["lo"], "ci_hi": boot["hi"], "boot_se": boot["se"],
+            "boot_exact": boot["exact"], "n_perm": n_perm, "n_boot": n_boot,
+        })
+        state = "cached" if perm["cached"] and boot["cached"] else f"{secs:,.1f}s"
+        print(f"[Info] {col:<13} p_perm(t)={perm['p_t']:.4g}  p_perm(U)={perm['p_u']:.4g}  "
+              f"95% CI [{boot['lo']:,.4g}, {boot['hi']:,.4g}]  ({state})")
+    return pd.DataFrame(rows)
+
 
 def main() -> int:
+    p = argparse.ArgumentParser(description="Flagged vs clean accounts: classical and resampling tests.")
+    p.add_argument("--permutations", type=int, default=10_000)
+    p.add_argument("--bootstrap", type=int, default=10_000)
+    p.add_argument("--seed", type=int, default=resampling.SEED, help="default: SEED from the environment / .env")
+    p.add_argument("--workers", type=int, default=1, help="resampling processes")
+    p.add_argument("--batch", type=int, default=resampling.BATCH, help="resamples per task")
+    args = p.parse_args()
+
     if not FEAT_PATH.exists():
         raise SystemExit(f"[ERROR] features not found: {FEAT_PATH}")
 
-    df = pd.read_parquet(FEAT_PATH)
+    with span("read_features", kind="io") as sp:
+        df = pd.read_parquet(FEAT_PATH, columns=["flagged_n"] + NUM_COLS)
+        sp.rows = len(df)
     # “Flagged” means account ever had isFlaggedFraud in its outgoing txs
-    flagged = df[df["flagged_n"] > 0]["near_pct"].dropna().to_numpy()
-    clean   = df[df["flagged_n"] == 0]["near_pct"].dropna().to_numpy()
+    is_flagged = (df["flagged_n"] > 0).to_numpy()
+    flagged = df.loc[is_flagged, "near_pct"].dropna().to_numpy()
+    clean   = df.loc[~is_flagged, "near_pct"].dropna().to_numpy()
 
     # If either side is empty, bail early
     if len(flagged) < 5 or len(clean) < 5:
         raise SystemExit("[WARN] Not enough accounts per group to test.")
 
-    t_res = stats.ttest_ind(flagged, clean, equal_var=False)
-    mw_res = stats.mannwhitneyu(flagged, clean, alternative="two-sided")
+    with span("tests", rows=len(flagged) + len(clean)):
+        t_res = stats.ttest_ind(flagged, clean, equal_var=False)
+        mw_res = stats.mannwhitneyu(flagged, clean, alternative="two-sided")
+
+    t0 = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            res = resample_all(df, is_flagged, args.permutations, args.bootstrap, args.seed, pool, args.batch)
+    else:
+        res = resample_all(df, is_flagged, args.permutations, args.bootstrap, args.seed, None, args.batch)
+    secs = time.perf_counter() - t0
 
     OUT_TXT.parent.mkdir(parents=True, exist_ok=True)
+    res.to_csv(OUT_CSV, index=False)
     with OUT_TXT.open("w") as f:
         f.write(f"Flagged n={len(flagged)}, Clean n={len(clean)}\n")
         f.write(f"T-test (Welch): stat={t_res.statistic:.4f}, p={t_res.pvalue:.4g}\n")
         f.write(f"Mann-Whitney U: stat={mw_res.statistic:.4f}, p={mw_res.pvalue:.4g}\n")
+        f.write(f"\nPermutation ({args.permutations:,}) and bootstrap ({args.bootstrap:,}) tests, "
+                f"flagged - clean, seed={args.seed}\n")
+        cols = ["feature", "n_flagged", "welch_t", "p_perm_t", "mw_u", "p_perm_u", "diff", "ci_lo", "ci_hi"]
+        f.write(res[cols].to_string(index=False, float_format=lambda x: f"{x:.4g}") + "\n")
 
+    print(f"[OK] resampling tests for {len(res)} feature(s) in {secs:,.1f}s ({args.workers} worker(s))")
     print(f"[OK] wrote results → {OUT_TXT}")
+    print(f"[OK] per-feature table → {OUT_CSV}")
     return 0
 
 if __name__ == "__main__":
-    raise SystemExit(main())
\ No newline at end of file
+    raise SystemExit(main())
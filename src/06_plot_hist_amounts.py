@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 from pathlib import Path
-import sqlite3
-import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
+
+import histograms
 
 HERE = Path(__file__).resolve()
 ROOT = HERE.parents[1]
@@ -11,12 +10,11 @@ DB_PATH = ROOT / "data" / "paysim.db"
 OUT_PNG = ROOT / "reports" / "hist_amounts_log.png"
 
 def main() -> int:
-    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
-    df = pd.read_sql_query("SELECT amount FROM transactions", conn)
-    conn.close()
+    # log-spaced bin counts from one streaming pass; raw amounts are never materialized
+    counts, edges = histograms.log_hist(80, DB_PATH)
 
     plt.figure(figsize=(10,6))
-    plt.hist(df["amount"], bins=np.logspace(0, np.log10(df["amount"].max()), 80))
+    plt.hist(edges[:-1], bins=edges, weights=counts)
     plt.xscale("log")
     plt.xlabel("amount (log-scale)")
     plt.ylabel("count")
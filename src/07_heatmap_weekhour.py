@@ -1,29 +1,18 @@
 #!/usr/bin/env python3
 from pathlib import Path
-import sqlite3
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 
+import agg_cube
+
 HERE = Path(__file__).resolve()
 ROOT = HERE.parents[1]
 DB_PATH = ROOT / "data" / "paysim.db"
 OUT_PNG = ROOT / "reports" / "heatmap_weekday_hour.png"
 
-SQL = """
--- Compute weekday (0=Mon … 6=Sun) and hour-of-day (0..23)
-SELECT
-  ((step-1)/24) % 7       AS weekday,
-  (step-1) % 24           AS hour_of_day,
-  COUNT(*)                AS n
-FROM transactions
-GROUP BY weekday, hour_of_day
-ORDER BY weekday, hour_of_day;
-"""
-
 def main() -> int:
-    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn:
-        df = pd.read_sql_query(SQL, conn)
+    # weekday (0=Mon … 6=Sun) × hour-of-day (0..23) counts from the shared aggregate cube
+    df = agg_cube.weekday_hour(agg_cube.get_cube(DB_PATH))
 
     # pivot to 7x24 matrix (rows=weekday, cols=hour)
     mat = df.pivot(index="weekday", columns="hour_of_day", values="n").fillna(0).to_numpy()
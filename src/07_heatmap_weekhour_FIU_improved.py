@@ -1,34 +1,27 @@
 #!/usr/bin/env python3
 from pathlib import Path
-import sqlite3
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 
+import agg_cube
+from perf import span
+
 HERE = Path(__file__).resolve()
 ROOT = HERE.parents[1]
 DB_PATH = ROOT / "data" / "paysim.db"
 OUT_PNG = ROOT / "reports" / "heatmap_weekday_hour.png"
 OUT_CSV = ROOT / "reports" / "weekday_hour_counts.csv"  # NEW
 
-SQL = """
--- Compute weekday (0=Mon … 6=Sun) and hour-of-day (0..23)
-SELECT
-  ((step-1)/24) % 7       AS weekday,
-  (step-1) % 24           AS hour_of_day,
-  COUNT(*)                AS n
-FROM transactions
-GROUP BY weekday, hour_of_day
-ORDER BY weekday, hour_of_day;
-"""
-
 def main() -> int:
-    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn:
-        df = pd.read_sql_query(SQL, conn)
+    # weekday (0=Mon … 6=Sun) × hour-of-day (0..23) counts from the shared aggregate cube
+    cube = agg_cube.get_cube(DB_PATH)
+    with span("views", kind="convert"):
+        df = agg_cube.weekday_hour(cube)
 
     # --- CSV EXPORT (for Tableau) ---
     OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(OUT_CSV, index=False)
+    with span("write_csv", kind="io", rows=len(df)):
+        df.to_csv(OUT_CSV, index=False)
     print(f"[OK] wrote CSV → {OUT_CSV} (columns: weekday, hour_of_day, n)")
 
     # --- HEATMAP (Python) ---
@@ -36,23 +29,25 @@ def main() -> int:
     wd_labels = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
     hr_labels = [f"{h:02d}:00" for h in range(24)]
 
-    plt.figure(figsize=(11, 5.5))
-    im = plt.imshow(mat, aspect="auto", cmap="viridis", origin="upper")
-    plt.colorbar(im, label="Transactions")
-    plt.xticks(np.arange(24), hr_labels, rotation=90)
-    plt.yticks(np.arange(7), wd_labels)
-    plt.xlabel("Hour of day")
-    plt.ylabel("Weekday")
-    plt.title("Weekday × Hour Activity Heatmap")
-
-    # highlight max cell
-    w_i, h_i = np.unravel_index(np.argmax(mat), mat.shape)
-    plt.scatter([h_i],[w_i], marker="o", s=80,
-                edgecolor="black", facecolor="none", linewidths=1.2)
-
-    plt.tight_layout()
+    with span("plot", kind="plot"):
+        plt.figure(figsize=(11, 5.5))
+        im = plt.imshow(mat, aspect="auto", cmap="viridis", origin="upper")
+        plt.colorbar(im, label="Transactions")
+        plt.xticks(np.arange(24), hr_labels, rotation=90)
+        plt.yticks(np.arange(7), wd_labels)
+        plt.xlabel("Hour of day")
+        plt.ylabel("Weekday")
+        plt.title("Weekday × Hour Activity Heatmap")
+
+        # highlight max cell
+        w_i, h_i = np.unravel_index(np.argmax(mat), mat.shape)
+        plt.scatter([h_i],[w_i], marker="o", s=80,
+                    edgecolor="black", facecolor="none", linewidths=1.2)
+
+        plt.tight_layout()
     OUT_PNG.parent.mkdir(parents=True, exist_ok=True)
-    plt.savefig(OUT_PNG, dpi=150)
+    with span("savefig", kind="io"):
+        plt.savefig(OUT_PNG, dpi=150)
     plt.close()
     print(f"[OK] saved heatmap → {OUT_PNG}")
     return 0
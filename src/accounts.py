@@ -0,0 +1,35 @@
+"""
+Account dictionary helpers (table `accounts`, built by 01_load_to_sqlite.py).
+
+Transactions store int ids (origId/destId); stages group/join on those and only
+decode back to PaySim names ("C1231006815") when writing outputs.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+
+import numpy as np
+
+
+def load_accounts(conn: sqlite3.Connection) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return (names, is_merchant) arrays indexed directly by account_id.
+
+    account_id is a SQLite rowid (1..N), so slot 0 is unused ("" / False).
+    """
+    n = conn.execute("SELECT COALESCE(MAX(account_id), 0) FROM accounts").fetchone()[0]
+    names = np.full(n + 1, "", dtype=object)
+    is_merchant = np.zeros(n + 1, dtype=bool)
+    cur = conn.execute("SELECT account_id, name, is_merchant FROM accounts")
+    while rows := cur.fetchmany(500_000):
+        ids, nm, merch = zip(*rows)
+        ids = np.fromiter(ids, dtype=np.int64, count=len(rows))
+        names[ids] = nm
+        is_merchant[ids] = merch
+    return names, is_merchant
+
+
+def decode(ids, names: np.ndarray) -> np.ndarray:
+    """Map integer account ids back to their PaySim names."""
+    return names[np.asarray(ids, dtype=np.int64)]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Single-pass aggregate cube for the report scripts.
+
+One scan over (step, type, amount) fills, with np.bincount accumulation:
+- count / amt_sum  [day_num × hour_of_day × type × amount band]
+- hist_1k          1,000-wide amount histogram (amount > 0), bin k = [1000k, 1000k+1000)
+
+The cube is saved to data/agg_cube.npz and reused while data/paysim.db is
+unchanged, so heatmaps/histograms render in milliseconds instead of each
+re-scanning 6.3M rows:
+
+    python src/agg_cube.py            # (re)build and print the checks.sql counters
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import parquet_store
+from bands import NEAR_HI, NEAR_LO
+from histograms import fold_1k
+from parquet_store import TX_TYPES
+from perf import span
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+CUBE_PATH = ROOT / "data" / "agg_cube.npz"
+
+# Amount bands (right-open); [NEAR_LO, NEAR_HI) is the structuring window below AML_THRESHOLD
+# ([9000, 10000) by default). Base edges that fall inside the window are dropped.
+_BASE_EDGES = [0, 1_000, 5_000, 10_000, 50_000, 100_000, 1_000_000]
+BAND_EDGES = np.array(sorted({e for e in _BASE_EDGES if not NEAR_LO < e < NEAR_HI} | {NEAR_LO, NEAR_HI}) + [np.inf])
+NEAR_BAND = int(np.flatnonzero(BAND_EDGES == NEAR_LO)[0])
+N_HOURS = 24
+N_TYPES = len(TX_TYPES)
+N_BANDS = len(BAND_EDGES) - 1
+
+CHUNK = 1_000_000
+
+
+def source_signature(db_path: Path = DB_PATH) -> str:
+    """Cheap fingerprint of the DB file; any re-ingest changes it."""
+    st = db_path.stat()
+    return f"{db_path.resolve()}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def scan_chunks(db_path: Path = DB_PATH, chunksize: int = CHUNK):
+    """Yield (step, type, amount) DataFrames from the Parquet copy if present, else SQLite."""
+    cols = ["step", "type", "amount"]
+    if parquet_store.dataset_exists():
+        yield from parquet_store.iter_batches(cols, batch_size=chunksize)
+        return
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        yield from pd.read_sql_query(
+            "SELECT step, type, amount FROM transactions", conn, chunksize=chunksize
+        )
+
+
+def _add_padded(acc: np.ndarray, part: np.ndarray) -> np.ndarray:
+    """acc + part along axis 0, growing acc if part is longer (new days / larger amounts)."""
+    if part.shape[0] > acc.shape[0]:
+        acc = np.concatenate([acc, np.zeros((part.shape[0] - acc.shape[0],) + acc.shape[1:], acc.dtype)])
+    acc[: part.shape[0]] += part
+    return acc
+
+
+def build_cube(chunks) -> dict:
+    """Accumulate every report aggregate in one pass over `chunks`."""
+    cell = (N_HOURS, N_TYPES, N_BANDS)
+    count = np.zeros((0,) + cell, dtype=np.int64)
+    amt_sum = np.zeros((0,) + cell, dtype=np.float64)
+    hist_1k = np.zeros(0, dtype=np.int64)
+    n_rows = 0
+    amt_max = 0.0
+
+    for df in chunks:
+        step = df["step"].to_numpy(dtype=np.int64)
+        amount = df["amount"].to_numpy(dtype=np.float64)
+        t_code = pd.Categorical(df["type"], categories=TX_TYPES).codes.astype(np.int64)
+        if (t_code < 0).any():
+            raise ValueError(f"unknown transaction type(s): {set(df['type'][t_code < 0])}")
+
+        day = (step - 1) // 24
+        hour = (step - 1) % 24
+        band = np.clip(np.searchsorted(BAND_EDGES, amount, side="right") - 1, 0, N_BANDS - 1)
+
+        n_days = int(day.max()) + 1
+        flat = ((day * N_HOURS + hour) * N_TYPES + t_code) * N_BANDS + band
+        size = n_days * N_HOURS * N_TYPES * N_BANDS
+        count = _add_padded(count, np.bincount(flat, minlength=size).reshape((n_days,) + cell))
+        amt_sum = _add_padded(
+            amt_sum, np.bincount(flat, weights=amount, minlength=size).reshape((n_days,) + cell)
+        )
+
+        pos = amount[np.isfinite(amount) & (amount > 0)]
+        if pos.size:
+            hist_1k = _add_padded(hist_1k, np.bincount((pos // 1000).astype(np.int64)))
+            amt_max = max(amt_max, float(pos.max()))
+        n_rows += len(df)
+
+    return {
+        "count": count,
+        "amt_sum": amt_sum,
+        "hist_1k": hist_1k,
+        "band_edges": BAND_EDGES,
+        "types": np.array(TX_TYPES),
+        "n_rows": np.int64(n_rows),
+        "amt_max": np.float64(amt_max),
+    }
+
+
+def save_cube(cube: dict, source: str, path: Path = CUBE_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp.npz")       # concurrent builders never share a file
+    np.savez(tmp, source=np.array(source), **cube)
+    tmp.replace(path)
+
+
+def load_cube(path: Path = CUBE_PATH) -> dict:
+    with np.load(path) as z:
+        return {k: z[k] for k in z.files}
+
+
+def get_cube(db_path: Path = DB_PATH, path: Path = CUBE_PATH, rebuild: bool = False) -> dict:
+    """Load the saved cube if it was built from the current DB; otherwise scan once and save."""
+    if not db_path.exists():
+        raise SystemExit(f"[ERROR] DB not found at {db_path}. Run 01_load_to_sqlite.py first.")
+    source = source_signature(db_path)
+    if not rebuild and path.exists():
+        with span("cube_load", kind="io"):
+            cube = load_cube(path)
+        if str(cube["source"]) == source and np.array_equal(cube["band_edges"], BAND_EDGES):
+            return cube
+    t0 = time.time()
+    with span("cube_build", kind="query") as sp:
+        cube = build_cube(scan_chunks(db_path))
+        sp.rows = int(cube["n_rows"])
+    with span("cube_save", kind="io"):
+        save_cube(cube, source, path)
+    cube["source"] = np.array(source)
+    print(f"[Info] built aggregate cube ({int(cube['n_rows']):,} rows) in {time.time() - t0:,.1f}s → {path}")
+    return cube
+
+
+# ---------- Views (same shape as the per-script SQL they replace) ----------
+def _select(cube: dict, value: str, types=None, bands=None) -> np.ndarray:
+    """Sum `value` over the selected types/bands → [day, hour] matrix."""
+    arr = cube[value]
+    t_idx = [TX_TYPES.index(t) for t in types] if types is not None else slice(None)
+    b_idx = list(bands) if bands is not None else slice(None)
+    return arr[:, :, t_idx, :][:, :, :, b_idx].sum(axis=(2, 3))
+
+
+def day_hour(cube: dict, types=None, bands=None, value: str = "count") -> pd.DataFrame:
+    """Long (day_num, hour_of_day, n) frame; empty cells dropped like a SQL GROUP BY."""
+    mat = _select(cube, value, types, bands)
+    d, h = np.nonzero(mat)
+    return pd.DataFrame({"day_num": d, "hour_of_day": h, "n": mat[d, h]})
+
+
+def weekday_hour(cube: dict, types=None, bands=None, value: str = "count") -> pd.DataFrame:
+    """Long (weekday, hour_of_day, n) frame, weekday = day_num % 7 (0=Mon … 6=Sun)."""
+    mat = _select(cube, value, types, bands)
+    wk = np.zeros((7, N_HOURS), dtype=mat.dtype)
+    np.add.at(wk, np.arange(mat.shape[0]) % 7, mat)
+    w, h = np.nonzero(wk)
+    return pd.DataFrame({"weekday": w, "hour_of_day": h, "n": wk[w, h]})
+
+
+def amount_hist_1k(cube: dict) -> tuple[np.ndarray, np.ndarray]:
+    """(counts, edges) of the 1,000-wide histogram, folded exactly like np.histogram."""
+    return fold_1k(cube["hist_1k"], float(cube["amt_max"]))
+
+
+def main() -> int:
+    cube = get_cube(rebuild=True)
+    n_near = int(cube["count"][..., NEAR_BAND].sum())
+    print(f"rows_total   {int(cube['n_rows']):>12,}")
+    print(f"near_band    {n_near:>12,}  [{NEAR_LO:,.2f}, {NEAR_HI:,.2f})")
+    print(f"cube shape   {cube['count'].shape} (day, hour, type, band)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
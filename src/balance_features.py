@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Balance-inconsistency features from the PaySim balance columns.
+
+Per transaction (dollars; exact integer cents when tx_arrays stores them so):
+
+    err_orig = oldbalanceOrg  - amount - newbalanceOrig     # sender side
+    err_dest = oldbalanceDest + amount - newbalanceDest     # recipient side
+    drain    = oldbalanceOrg > 0 and newbalanceOrig == 0    # account emptied
+
+A consistent ledger has both errors at 0; in PaySim the fraudulent transfers
+are the ones that break it. One NumPy pass over the compact tx_arrays columns
+aggregates them per account id with np.bincount / np.maximum.at (no SQL scan),
+and the result is cached in data/balance_features/ (npy_cache: one .npy per
+column, memory-mapped on load), invalidated like the aggregate cube when
+data/paysim.db changes:
+
+- bal_err_orig_mean / _max   mean / max |err_orig| over the account's outgoing txs
+- bal_err_dest_mean / _max   mean / max |err_dest| over its incoming txs (NaN if none)
+- drain_n / drain_pct        outgoing txs that emptied the account, count / share
+
+    python src/balance_features.py    # (re)build and print summary stats
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import npy_cache
+import tx_arrays
+from agg_cube import source_signature
+from perf import span
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+CACHE_DIR = ROOT / "data" / "balance_features"
+
+BALANCE_COLS = ["bal_err_orig_mean", "bal_err_orig_max", "bal_err_dest_mean", "bal_err_dest_max",
+                "drain_n", "drain_pct"]
+TX_COLS = ["origId", "destId", "amount", "oldbalanceOrg", "newbalanceOrig", "oldbalanceDest", "newbalanceDest"]
+
+
+def error_terms(a: dict) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(err_orig, err_dest, drain) per transaction from tx_arrays columns, errors in dollars."""
+    money = ["amount", "oldbalanceOrg", "newbalanceOrig", "oldbalanceDest", "newbalanceDest"]
+    if all(a[c].dtype != np.float64 for c in money):
+        amt, ob_o, nb_o, ob_d, nb_d = (a[c].astype(np.int64) for c in money)    # cents: exact
+        err_orig = (ob_o - amt - nb_o) / 100.0
+        err_dest = (ob_d + amt - nb_d) / 100.0
+    else:
+        amt, ob_o, nb_o, ob_d, nb_d = (tx_arrays.dollars(a[c]) for c in money)
+        err_orig = np.round(ob_o - amt - nb_o, 2)        # drop float noise below a cent
+        err_dest = np.round(ob_d + amt - nb_d, 2)
+    drain = (ob_o > 0) & (nb_o == 0)
+    return err_orig, err_dest, drain
+
+
+def _per_account(acc: np.ndarray, err: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(count, mean |err|, max |err|) per account id; mean/max NaN where count is 0."""
+    cnt = np.bincount(acc, minlength=n)
+    ab = np.abs(err)
+    peak = np.zeros(n)
+    np.maximum.at(peak, acc, ab)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(acc, weights=ab, minlength=n) / cnt
+    return cnt, mean, np.where(cnt > 0, peak, np.nan)
+
+
+def balance_features(a: dict, n_accounts: int) -> pd.DataFrame:
+    """BALANCE_COLS for every account id (index = account_id, row 0 unused)."""
+    orig = np.asarray(a["origId"], dtype=np.int64)
+    dest = np.asarray(a["destId"], dtype=np.int64)
+    err_orig, err_dest, drain = error_terms(a)
+    n_out, orig_mean, orig_max = _per_account(orig, err_orig, n_accounts)
+    _, dest_mean, dest_max = _per_account(dest, err_dest, n_accounts)
+    drain_n = np.bincount(orig, weights=drain, minlength=n_accounts).astype(np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drain_pct = np.where(n_out > 0, drain_n / n_out, np.nan)
+    return pd.DataFrame({
+        "bal_err_orig_mean": orig_mean, "bal_err_orig_max": orig_max,
+        "bal_err_dest_mean": dest_mean, "bal_err_dest_max": dest_max,
+        "drain_n": drain_n, "drain_pct": drain_pct,
+    }, index=pd.Index(np.arange(n_accounts), name="origId"))
+
+
+def balance_columns(db_path: Path = DB_PATH, cache_dir: Path = CACHE_DIR,
+                    rebuild: bool = False) -> dict[str, np.ndarray]:
+    """balance_features() of the current DB as memory-mapped columns, cached until data/paysim.db changes."""
+    if not db_path.exists():
+        raise SystemExit(f"[ERROR] DB not found at {db_path}. Run 01_load_to_sqlite.py first.")
+    source = source_signature(db_path)
+    if not rebuild:
+        with span("balance_load", kind="io"):
+            cols = npy_cache.load_columns(cache_dir, source, BALANCE_COLS)
+        if cols is not None:
+            return cols
+    t0 = time.time()
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        n_accounts = conn.execute("SELECT COALESCE(MAX(account_id), 0) + 1 FROM accounts").fetchone()[0]
+    a = tx_arrays.get_arrays(TX_COLS, db_path)
+    with span("balance_features", rows=len(a["origId"])):
+        f = balance_features(a, int(n_accounts))
+    with span("balance_save", kind="io"):
+        npy_cache.save_columns(cache_dir, {c: f[c].to_numpy() for c in BALANCE_COLS}, source)
+    print(f"[Info] balance features ({len(a['origId']):,} rows) in {time.time() - t0:,.1f}s → {cache_dir}")
+    return npy_cache.load_columns(cache_dir, source, BALANCE_COLS)
+
+
+def get_balance_features(db_path: Path = DB_PATH, cache_dir: Path = CACHE_DIR, rebuild: bool = False) -> pd.DataFrame:
+    """balance_features() of the current DB, indexed by account id."""
+    cols = balance_columns(db_path, cache_dir, rebuild)
+    return pd.DataFrame(cols, index=pd.Index(np.arange(len(cols["drain_n"])), name="origId"))
+
+
+def main() -> int:
+    f = get_balance_features(rebuild=True)
+    a = tx_arrays.get_arrays(TX_COLS)
+    err_orig, err_dest, drain = error_terms(a)
+    n = len(err_orig)
+    print(f"rows         {n:>12,}")
+    print(f"err_orig!=0  {int(np.count_nonzero(err_orig)):>12,}  ({np.count_nonzero(err_orig) / max(n, 1):.1%})")
+    print(f"err_dest!=0  {int(np.count_nonzero(err_dest)):>12,}  ({np.count_nonzero(err_dest) / max(n, 1):.1%})")
+    print(f"drains       {int(drain.sum()):>12,}")
+    print(f"accounts     {int((f['bal_err_orig_mean'].notna() | f['bal_err_dest_mean'].notna()).sum()):>12,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Multi-threshold structuring scan: many amount bands in one vectorized pass.
+
+All band edges are merged into one sorted array; each amount is placed in an
+elementary interval with a single np.searchsorted, and counts / sums are
+accumulated per interval (totals, per day × hour, per origin account). A band is
+a contiguous range of intervals, read off a cumulative sum, so overlapping bands
+(3k, 5k, 10k, 15k × several widths × currencies) cost one pass, not one per band.
+Rows come from the compact tx_arrays cache, split into row ranges across a
+process pool.
+
+    python src/band_scan.py                                       # the AML_THRESHOLD band
+    python src/band_scan.py --thresholds 3000 5000 10000 15000 --widths 0.05 0.1 --workers 4
+    python src/band_scan.py --band 9500:10000 --fx EUR=1.08 --types CASH_IN PAYMENT TRANSFER
+
+Outputs:
+- reports/band_scan_summary.csv   band, currency, threshold, lo, hi, n, amt_sum, n_accounts, share
+- reports/band_scan_dayhour.csv   band, day_num, hour_of_day, n
+- data/band_scan_accounts.parquet band, account_id, account, n, amt_sum
+"""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import tx_arrays
+from accounts import decode, load_accounts
+from bands import AML_BAND_PCT, Band, default_bands, sweep
+from parquet_store import TX_TYPES
+from perf import span
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+OUT_SUMMARY = ROOT / "reports" / "band_scan_summary.csv"
+OUT_DAYHOUR = ROOT / "reports" / "band_scan_dayhour.csv"
+OUT_ACCOUNTS = ROOT / "data" / "band_scan_accounts.parquet"
+
+N_HOURS = 24
+SCAN_CHUNK = 2_000_000
+
+
+# ---------- Scan ----------
+def interval_plan(bands: list[Band]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sorted distinct edges, and each band's [first, last) elementary-interval index."""
+    edges = np.unique([e for b in bands for e in (b.lo, b.hi)])
+    lo_idx = np.searchsorted(edges, [b.lo for b in bands])
+    hi_idx = np.searchsorted(edges, [b.hi for b in bands])
+    return edges, lo_idx, hi_idx
+
+
+def scan_arrays(amount: np.ndarray, day: np.ndarray, hour: np.ndarray, acc: np.ndarray,
+                edges: np.ndarray, covered: np.ndarray, n_days: int) -> dict:
+    """Per elementary interval: counts/sums, day×hour counts, and sparse (account, interval) totals."""
+    n_int = len(edges) - 1
+    iv = np.searchsorted(edges, amount, side="right") - 1
+    keep = (iv >= 0) & (iv < n_int)
+    keep[keep] = covered[iv[keep]]
+    iv, amount = iv[keep], amount[keep]
+    day, hour, acc = day[keep].astype(np.int64), hour[keep].astype(np.int64), acc[keep].astype(np.int64)
+    amt = amount.astype(np.float64)
+
+    keys, inv = np.unique(acc * n_int + iv, return_inverse=True)
+    return {
+        "n": np.bincount(iv, minlength=n_int),
+        "sum": np.bincount(iv, weights=amt, minlength=n_int),
+        "dayhour": np.bincount((iv * n_days + day) * N_HOURS + hour,
+                               minlength=n_int * n_days * N_HOURS).reshape(n_int, n_days, N_HOURS),
+        "acc_key": keys,
+        "acc_n": np.bincount(inv, minlength=len(keys)),
+        "acc_sum": np.bincount(inv, weights=amt, minlength=len(keys)),
+    }
+
+
+def _scan_rows(start: int, stop: int, edges: np.ndarray, covered: np.ndarray, n_days: int,
+               type_codes: list[int] | None, cents: bool) -> dict:
+    """Worker: scan rows [start, stop) of the tx_arrays cache."""
+    a = tx_arrays.get_arrays(["amount", "day_num", "hour_of_day", "origId", "type"])
+    sl = slice(start, stop)
+    amount = a["amount"][sl] if cents else tx_arrays.dollars(a["amount"][sl])
+    day, hour, acc = a["day_num"][sl], a["hour_of_day"][sl], a["origId"][sl]
+    if type_codes is not None:
+        m = np.isin(a["type"][sl], type_codes)
+        amount, day, hour, acc = amount[m], day[m], hour[m], acc[m]
+    return scan_arrays(amount, day, hour, acc, edges, covered, n_days)
+
+
+def _merge(parts: list[dict]) -> dict:
+    keys = np.concatenate([p["acc_key"] for p in parts])
+    uniq, inv = np.unique(keys, return_inverse=True)
+    return {
+        "n": sum(p["n"] for p in parts),
+        "sum": sum(p["sum"] for p in parts),
+        "dayhour": sum(p["dayhour"] for p in parts),
+        "acc_key": uniq,
+        "acc_n": np.bincount(inv, weights=np.concatenate([p["acc_n"] for p in parts]),
+                             minlength=len(uniq)).astype(np.int64),
+        "acc_sum": np.bincount(inv, weights=np.concatenate([p["acc_sum"] for p in parts]), minlength=len(uniq)),
+    }
+
+
+def scan(bands: list[Band], types: list[str] | None = None, workers: int = 1,
+         chunksize: int = SCAN_CHUNK) -> dict[str, pd.DataFrame]:
+    """
+    Every band in one pass over the tx_arrays cache, split into row ranges across
+    `workers` processes. Returns DataFrames:
+    summary (band, lo, hi, n, amt_sum, n_accounts), dayhour (band, day_num,
+    hour_of_day, n; empty cells dropped) and accounts (band, account_id, n, amt_sum).
+    """
+    a = tx_arrays.get_arrays(["amount", "day_num"])
+    n_rows = len(a["amount"])
+    n_days = int(a["day_num"].max()) + 1 if n_rows else 1
+    cents = a["amount"].dtype != np.float64
+    edges, lo_idx, hi_idx = interval_plan(bands)
+    n_int = len(edges) - 1
+    covered = np.zeros(n_int, dtype=bool)
+    for lo, hi in zip(lo_idx, hi_idx):
+        covered[lo:hi] = True
+    scan_edges = np.rint(edges * 100).astype(np.int64) if cents else edges
+    codes = [TX_TYPES.index(t) for t in types] if types else None
+
+    ranges = [(s, min(s + chunksize, n_rows)) for s in range(0, n_rows, chunksize)] or [(0, 0)]
+    args = (scan_edges, covered, n_days, codes, cents)
+    if workers > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_scan_rows, *zip(*[(s, e, *args) for s, e in ranges])))
+    else:
+        parts = [_scan_rows(s, e, *args) for s, e in ranges]
+    r = _merge(parts)
+    scale = 100.0 if cents else 1.0
+
+    # a band is the interval range [lo_idx, hi_idx): difference of cumulative sums
+    cum_n = np.concatenate([[0], np.cumsum(r["n"])])
+    cum_s = np.concatenate([[0.0], np.cumsum(r["sum"])])
+    cum_dh = np.concatenate([np.zeros((1, n_days, N_HOURS), np.int64), np.cumsum(r["dayhour"], axis=0)])
+
+    acc = r["acc_key"] // max(n_int, 1)
+    iv = r["acc_key"] % max(n_int, 1)
+    summary, dayhour, accounts = [], [], []
+    for b, lo, hi in zip(bands, lo_idx, hi_idx):
+        sel = (iv >= lo) & (iv < hi)
+        ids, inv = np.unique(acc[sel], return_inverse=True)
+        acc_n = np.bincount(inv, weights=r["acc_n"][sel], minlength=len(ids)).astype(np.int64)
+        acc_sum = np.bincount(inv, weights=r["acc_sum"][sel], minlength=len(ids)) / scale
+        accounts.append(pd.DataFrame({"band": b.name, "account_id": ids.astype(np.int32),
+                                      "n": acc_n, "amt_sum": acc_sum}))
+        mat = cum_dh[hi] - cum_dh[lo]
+        d, h = np.nonzero(mat)
+        dayhour.append(pd.DataFrame({"band": b.name, "day_num": d, "hour_of_day": h, "n": mat[d, h]}))
+        summary.append({"band": b.name, "currency": b.currency, "threshold": b.threshold, "lo": b.lo, "hi": b.hi,
+                        "n": int(cum_n[hi] - cum_n[lo]), "amt_sum": (cum_s[hi] - cum_s[lo]) / scale,
+                        "n_accounts": len(ids)})
+    summary = pd.DataFrame(summary)
+    summary["share"] = summary["n"] / max(n_rows, 1)
+    return {
+        "summary": summary,
+        "dayhour": pd.concat(dayhour, ignore_index=True),
+        "accounts": pd.concat(accounts, ignore_index=True),
+    }
+
+
+def parse_band(text: str) -> Band:
+    lo, hi = (float(x) for x in text.split(":"))
+    if not lo < hi:
+        raise argparse.ArgumentTypeError(f"band {text!r}: need LO < HI")
+    return Band(f"{lo:g}-{hi:g}", lo, hi, hi, "")
+
+
+def parse_fx(text: str) -> tuple[str, float]:
+    code, _, rate = text.partition("=")
+    return code, float(rate)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Scan many structuring bands in one pass.")
+    p.add_argument("--thresholds", type=float, nargs="+", default=None,
+                   help="thresholds; each gives bands [T*(1-w), T) (default: AML_THRESHOLD band)")
+    p.add_argument("--widths", type=float, nargs="+", default=None,
+                   help="band widths as fractions of the threshold (default: AML_BAND_PCT / 100)")
+    p.add_argument("--fx", type=parse_fx, nargs="+", default=None, metavar="CUR=RATE",
+                   help="also sweep thresholds given in these currencies (base units per 1 CUR)")
+    p.add_argument("--band", type=parse_band, nargs="+", default=[], metavar="LO:HI",
+                   help="explicit right-open bands in base currency")
+    p.add_argument("--types", nargs="+", choices=TX_TYPES, default=None, help="transaction types (default: all)")
+    p.add_argument("--workers", type=int, default=1, help="scan processes")
+    p.add_argument("--chunksize", type=int, default=SCAN_CHUNK, help="rows per scan task")
+    args = p.parse_args()
+
+    bands = list(args.band)
+    if args.thresholds:
+        fx = {"": 1.0, **dict(args.fx)} if args.fx else None
+        bands += sweep(args.thresholds, args.widths or [AML_BAND_PCT / 100], fx)
+    bands = list({b.name: b for b in bands or default_bands()}.values())
+
+    t0 = time.time()
+    with span("scan") as sp:
+        res = scan(bands, args.types, args.workers, args.chunksize)
+        sp.rows = int(res["summary"]["n"].sum())
+    secs = time.time() - t0
+
+    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as conn:
+        names, _ = load_accounts(conn)
+    accounts = res["accounts"]
+    accounts.insert(2, "account", decode(accounts["account_id"], names))
+
+    with span("write", kind="io"):
+        OUT_SUMMARY.parent.mkdir(parents=True, exist_ok=True)
+        res["summary"].to_csv(OUT_SUMMARY, index=False)
+        res["dayhour"].to_csv(OUT_DAYHOUR, index=False)
+        OUT_ACCOUNTS.parent.mkdir(parents=True, exist_ok=True)
+        accounts.to_parquet(OUT_ACCOUNTS, index=False)
+
+    money = "{:,.2f}".format
+    print(res["summary"].to_string(index=False, formatters={
+        "threshold": "{:,.0f}".format, "lo": money, "hi": money, "amt_sum": "{:,.0f}".format,
+        "share": "{:.4%}".format}))
+    print(f"[OK] {len(bands)} band(s) scanned in {secs:,.2f}s ({args.workers} worker(s))")
+    print(f"[OK] summary → {OUT_SUMMARY}\n[OK] day×hour → {OUT_DAYHOUR}\n[OK] accounts → {OUT_ACCOUNTS}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
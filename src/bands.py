@@ -0,0 +1,70 @@
+"""
+Threshold bands for structuring analysis.
+
+The reporting threshold comes from AML_THRESHOLD (environment, else .env, else
+10,000); the default structuring band is the AML_BAND_PCT percent just below it,
+right-open: [9,000, 10,000) for the defaults. Every script that used to hard-code
+9000/9999.99 reads NEAR_LO / NEAR_HI from here; band_scan.py sweeps many bands.
+
+    sweep([3000, 5000, 10000, 15000], widths=[0.05, 0.1], fx={"EUR": 1.08})
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+ENV_FILE = ROOT / ".env"
+ENV_KEYS = ["AML_THRESHOLD", "AML_BAND_PCT"]
+
+
+def env(key: str, default: str) -> str:
+    """Process environment first, then KEY=VALUE lines in ROOT/.env."""
+    if key in os.environ:
+        return os.environ[key]
+    if ENV_FILE.exists():
+        for line in ENV_FILE.read_text().splitlines():
+            k, sep, v = line.partition("=")
+            if sep and k.strip() == key:
+                return v.split("#", 1)[0].strip().strip("\"'")
+    return default
+
+
+AML_THRESHOLD = float(env("AML_THRESHOLD", "10000"))
+AML_BAND_PCT = float(env("AML_BAND_PCT", "10"))
+NEAR_LO = round(AML_THRESHOLD * (1 - AML_BAND_PCT / 100), 2)
+NEAR_HI = AML_THRESHOLD            # excluded: the band is [NEAR_LO, NEAR_HI)
+
+
+def fmt_amount(x: float) -> str:
+    return f"{x:,.0f}" if x == int(x) else f"{x:,.2f}"
+
+
+NEAR_LABEL = f"{fmt_amount(NEAR_LO)}–{fmt_amount(NEAR_HI - 0.01)}"     # "9,000–9,999.99"
+NEAR_SHORT = f"{NEAR_LO / 1000:g}k–{NEAR_HI / 1000:g}k"                      # "9k–10k"
+
+
+class Band(NamedTuple):
+    name: str
+    lo: float              # inclusive, base currency
+    hi: float              # exclusive
+    threshold: float       # in `currency`
+    currency: str
+
+
+def sweep(thresholds, widths=(AML_BAND_PCT / 100,), fx: dict[str, float] | None = None) -> list[Band]:
+    """[T·rate·(1-w), T·rate) for every threshold T, width fraction w and currency rate."""
+    bands = []
+    for cur, rate in (fx or {"": 1.0}).items():
+        for t in thresholds:
+            for w in widths:
+                lo, hi = round(t * rate * (1 - w), 2), round(t * rate, 2)
+                bands.append(Band(f"{cur}{t:g}@{w * 100:g}%", lo, hi, float(t), cur))
+    return bands
+
+
+def default_bands() -> list[Band]:
+    return [Band(f"{AML_THRESHOLD:g}@{AML_BAND_PCT:g}%", NEAR_LO, NEAR_HI, AML_THRESHOLD, "")]
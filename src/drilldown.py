@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Investigator drill-down: any account's full transaction history in milliseconds.
+
+An account-sorted offset index over the compact tx_arrays columns, both sides:
+
+- out_rows / out_indptr   row ids sorted by (origId, step); account a sent rows
+                          out_rows[out_indptr[a]:out_indptr[a + 1]]
+- in_rows  / in_indptr    the same by (destId, step) for what a received
+
+Cached under data/drilldown/ as .npy files (memory-mapped on load) and rebuilt
+when data/paysim.db changes, like the aggregate cube. A lookup is two slices
+plus a gather from the tx_arrays memmaps: no SQL scan, no index to apply.
+
+    python src/drilldown.py C1231006815                 # time-ordered history
+    python src/drilldown.py C1231006815 --hops 1        # + each counterparty's history
+    python src/drilldown.py --top 50 --out reports/drilldown_top50.csv   # top anomalies, one call
+
+Python API: history(account), neighbourhood(account), histories(ids), export_top(n, path).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import tx_arrays
+from agg_cube import source_signature
+from parquet_store import TX_TYPES
+from perf import span
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+INDEX_DIR = ROOT / "data" / "drilldown"
+ANOMALIES_CSV = ROOT / "reports" / "anomalies_accounts.csv"
+
+INDEX_ARRAYS = ["out_rows", "out_indptr", "in_rows", "in_indptr"]
+COLUMNS = ["step", "type", "amount", "origId", "oldbalanceOrg", "newbalanceOrig",
+           "destId", "oldbalanceDest", "newbalanceDest", "isFraud", "isFlaggedFraud"]
+SQL_CHUNK = 900                 # ids per IN (...) lookup
+_BUILD_LOCK = threading.Lock()  # query_service threads share one build
+
+
+# ---------- Index ----------
+def build_index(db_path: Path = DB_PATH) -> dict[str, np.ndarray]:
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        n_accounts = conn.execute("SELECT COALESCE(MAX(account_id), 0) + 1 FROM accounts").fetchone()[0]
+    a = tx_arrays.get_arrays(["origId", "destId", "step"], db_path)
+    step = np.asarray(a["step"])
+    out = {}
+    for side, acc in (("out", np.asarray(a["origId"])), ("in", np.asarray(a["destId"]))):
+        order = np.lexsort((step, acc))                        # stable: same-step rows keep ingest order
+        out[f"{side}_rows"] = order.astype(np.int32 if len(order) < 2**31 else np.int64)
+        out[f"{side}_indptr"] = np.concatenate([[0], np.cumsum(np.bincount(acc, minlength=n_accounts))])
+    return out
+
+
+def get_index(db_path: Path = DB_PATH, index_dir: Path = INDEX_DIR, rebuild: bool = False) -> dict[str, np.ndarray]:
+    """The memory-mapped offset index, (re)built if data/paysim.db changed."""
+    if not db_path.exists():
+        raise SystemExit(f"[ERROR] DB not found at {db_path}. Run 01_load_to_sqlite.py first.")
+    source = source_signature(db_path)
+    meta = index_dir / "meta.json"
+    with _BUILD_LOCK:
+        if rebuild or not meta.exists() or json.loads(meta.read_text()).get("source") != source:
+            t0 = time.time()
+            with span("drilldown_build", kind="compute"):
+                idx = build_index(db_path)
+            index_dir.mkdir(parents=True, exist_ok=True)
+            with span("drilldown_save", kind="io"):
+                for name, arr in idx.items():
+                    tmp = index_dir / f"{name}.{os.getpid()}.tmp.npy"
+                    np.save(tmp, arr)
+                    tmp.replace(index_dir / f"{name}.npy")
+                meta.write_text(json.dumps({"source": source}))
+            print(f"[Info] built drill-down index in {time.time() - t0:,.1f}s → {index_dir}")
+    return {name: np.load(index_dir / f"{name}.npy", mmap_mode="r") for name in INDEX_ARRAYS}
+
+
+# ---------- Lookups ----------
+def resolve(accounts, db_path: Path = DB_PATH, index: dict | None = None) -> np.ndarray:
+    """PaySim names ("C…"/"M…") or integer ids → account ids; unknown names or ids raise KeyError."""
+    vals = [accounts] if isinstance(accounts, (str, int, np.integer)) else list(accounts)
+    names = [v for v in vals if isinstance(v, str) and not v.isdigit()]
+    found = {}
+    if names:
+        with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+            for i in range(0, len(names), SQL_CHUNK):
+                part = names[i:i + SQL_CHUNK]
+                found.update(conn.execute(
+                    f"SELECT name, account_id FROM accounts WHERE name IN ({', '.join('?' * len(part))})", part))
+    missing = [n for n in names if n not in found]
+    if missing:
+        raise KeyError(f"unknown account(s): {missing[:5]}")
+    ids = [found[v] if v in found else int(v) for v in vals]
+    n_accounts = len((index if index is not None else get_index(db_path))["out_indptr"]) - 1
+    bad = [i for i in ids if not 0 <= i < n_accounts]
+    if bad:
+        raise KeyError(f"unknown account id(s): {bad[:5]}")
+    return np.array(ids, dtype=np.int64)
+
+
+def account_names(ids: np.ndarray, db_path: Path = DB_PATH) -> dict[int, str]:
+    """Names for just these ids (primary-key lookups, not the whole dictionary)."""
+    ids = [int(i) for i in np.unique(ids)]
+    out = {}
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        for i in range(0, len(ids), SQL_CHUNK):
+            part = ids[i:i + SQL_CHUNK]
+            out.update(conn.execute(
+                f"SELECT account_id, name FROM accounts WHERE account_id IN ({', '.join('?' * len(part))})", part))
+    return out
+
+
+def _rows(index: dict, side: str, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(row ids, owning account) for every transaction of `ids` on one side."""
+    indptr = index[f"{side}_indptr"]
+    ids = ids[(ids >= 0) & (ids < len(indptr) - 1)]
+    lo, hi = np.asarray(indptr[ids]), np.asarray(indptr[ids + 1])
+    n = hi - lo
+    if not n.sum():
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    # concatenated ranges lo[i]..hi[i] without a Python loop
+    pos = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) + np.repeat(lo, n)
+    return np.asarray(index[f"{side}_rows"][pos], dtype=np.int64), np.repeat(ids, n)
+
+
+def histories(ids, index: dict | None = None, db_path: Path = DB_PATH, names: bool = True) -> pd.DataFrame:
+    """
+    Both sides of every account in `ids`, one row per (account, transaction):
+    `account_id`, `direction` (out / in / self), `counterparty`, then the transaction
+    columns; ordered by account (as given), step, ingest row.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    index = index if index is not None else get_index(db_path)
+    o_rows, o_acc = _rows(index, "out", ids)
+    i_rows, i_acc = _rows(index, "in", ids)
+    rows = np.concatenate([o_rows, i_rows])
+    acc = np.concatenate([o_acc, i_acc])
+    direction = np.concatenate([np.zeros(len(o_rows), np.int8), np.ones(len(i_rows), np.int8)])
+
+    # a self-transfer is on both sides of its account: keep it once
+    key = acc * (rows.max(initial=0) + 1) + rows
+    _, first = np.unique(key, return_index=True)
+    rows, acc, direction = rows[first], acc[first], direction[first]
+
+    a = tx_arrays.get_arrays(COLUMNS, db_path)
+    step = np.asarray(a["step"][rows])
+    uniq, first = np.unique(ids, return_index=True)             # accounts in first-occurrence order
+    order = np.lexsort((rows, step, first[np.searchsorted(uniq, acc)]))
+    rows, acc, direction = rows[order], acc[order], direction[order]
+
+    cols = {c: a[c][rows] for c in COLUMNS}
+    df = pd.DataFrame({
+        "account_id": acc,
+        "direction": np.where(cols["origId"] == cols["destId"], "self", np.where(direction == 0, "out", "in")),
+        "counterparty": np.where(direction == 0, cols["destId"], cols["origId"]).astype(np.int64),
+        "row": rows,
+    })
+    for c in COLUMNS:
+        if c == "type":
+            df[c] = pd.Categorical.from_codes(cols[c], categories=TX_TYPES)
+        elif c in tx_arrays.MONEY_COLS:
+            df[c] = tx_arrays.dollars(cols[c])
+        else:
+            df[c] = cols[c]
+    if names:
+        lookup = account_names(np.concatenate([df["account_id"].to_numpy(), df["counterparty"].to_numpy()]), db_path)
+        df.insert(1, "account", df["account_id"].map(lookup))
+        df.insert(4, "counterparty_name", df["counterparty"].map(lookup))
+    return df
+
+
+def history(account, db_path: Path = DB_PATH) -> pd.DataFrame:
+    """One account's full time-ordered history (sent and received)."""
+    return histories(resolve(account, db_path), db_path=db_path)
+
+
+def neighbourhood(account, cp_limit: int | None = None, db_path: Path = DB_PATH) -> pd.DataFrame:
+    """
+    The account's history (hop 0) plus every counterparty's own history (hop 1,
+    `account` = the counterparty). cp_limit keeps each counterparty's most recent rows.
+    """
+    index = get_index(db_path)
+    own = histories(resolve(account, db_path, index), index, db_path)
+    cps = pd.unique(own.loc[own["counterparty"] != own["account_id"], "counterparty"])
+    hop1 = histories(cps, index, db_path)
+    if cp_limit is not None:
+        hop1 = hop1.groupby("account_id", sort=False).tail(cp_limit)
+    return pd.concat([own.assign(hop=0), hop1.assign(hop=1)], ignore_index=True)
+
+
+def top_anomalies(n: int, path: Path = ANOMALIES_CSV) -> np.ndarray:
+    """account_ids of the n most anomalous accounts (anomalies_accounts.csv is sorted by iso_score)."""
+    if not path.exists():
+        raise SystemExit(f"[ERROR] {path} not found. Run 04_anomaly_iforest.py first.")
+    return pd.read_csv(path, usecols=["account_id"], nrows=n)["account_id"].to_numpy(dtype=np.int64)
+
+
+def export_top(n: int, out: Path, hops: int = 0, cp_limit: int | None = None, db_path: Path = DB_PATH) -> pd.DataFrame:
+    """Histories of the top-n anomalies in one batch lookup, written to CSV or Parquet by suffix."""
+    ids = top_anomalies(n)
+    index = get_index(db_path)
+    df = histories(ids, index, db_path).assign(hop=0)
+    if hops:
+        cps = np.setdiff1d(df["counterparty"].unique(), ids)
+        hop1 = histories(cps, index, db_path)
+        if cp_limit is not None:
+            hop1 = hop1.groupby("account_id", sort=False).tail(cp_limit)
+        df = pd.concat([df, hop1.assign(hop=1)], ignore_index=True)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix == ".parquet":
+        df.to_parquet(out, index=False)
+    else:
+        df.to_csv(out, index=False)
+    return df
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Account drill-down over the offset index.")
+    p.add_argument("accounts", nargs="*", help="PaySim names (C…/M…) or account ids")
+    p.add_argument("--hops", type=int, choices=[0, 1], default=0, help="1 = add each counterparty's history")
+    p.add_argument("--cp-limit", type=int, default=None, help="most recent rows per counterparty at hop 1")
+    p.add_argument("--top", type=int, default=None, help="export the top-N accounts of anomalies_accounts.csv")
+    p.add_argument("--out", type=Path, default=None, help="write to .csv / .parquet instead of printing")
+    p.add_argument("--rebuild", action="store_true", help="rebuild the index")
+    args = p.parse_args()
+
+    get_index(rebuild=args.rebuild)
+    t0 = time.perf_counter()
+    if args.top:
+        out = args.out or ROOT / "reports" / f"drilldown_top{args.top}.csv"
+        df = export_top(args.top, out, args.hops, args.cp_limit)
+        print(f"[OK] {df['account_id'].nunique():,} accounts, {len(df):,} rows in "
+              f"{(time.perf_counter() - t0) * 1000:,.1f} ms → {out}")
+        return 0
+    if not args.accounts:
+        if args.rebuild:
+            return 0
+        p.error("give account names/ids or --top N")
+
+    try:
+        frames = [neighbourhood(a, args.cp_limit) if args.hops else history(a).assign(hop=0) for a in args.accounts]
+    except KeyError as e:
+        raise SystemExit(f"[ERROR] {e.args[0]}")
+    df = pd.concat(frames, ignore_index=True)
+    secs = time.perf_counter() - t0
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(args.out, index=False) if args.out.suffix == ".parquet" else df.to_csv(args.out, index=False)
+        print(f"[OK] {len(df):,} rows → {args.out}")
+    else:
+        with pd.option_context("display.width", 200, "display.max_columns", 20, "display.max_rows", 200):
+            print(df.drop(columns=["account_id", "counterparty", "row"]).to_string(index=False))
+    print(f"[Info] {len(df):,} rows in {secs * 1000:,.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
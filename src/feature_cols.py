@@ -0,0 +1,15 @@
+"""
+Numeric account-feature columns shared by the model and the hypothesis tests.
+
+04_anomaly_iforest fits on NUM_COLS and 05_hypothesis_tests compares flagged vs
+clean accounts on the same list; both import it from here so they cannot drift.
+All columns are produced by 03_features_accounts.py.
+"""
+
+from velocity_features import VELOCITY_COLS
+
+NUM_COLS = [
+    "n_tx","amt_sum","amt_mean","amt_max","near_n","near_pct",
+    "ia_mean","ia_median","ia_std","cp_diversity",
+    "bal_err_orig_mean","bal_err_orig_max","bal_err_dest_mean","drain_pct"
+] + VELOCITY_COLS
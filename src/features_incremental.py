@@ -0,0 +1,208 @@
+"""
+Incremental (append-only) maintenance of the per-account features.
+
+Keeps mergeable per-account state next to features_accounts.parquet and folds
+in only transactions with step > watermark. All state is exact, so the
+finalized features match a full rebuild of 03_features_accounts.py:
+
+- accounts.parquet  per customer origin: n_tx, amt_sum, amt_max, near_n, fraud_n,
+                    flagged_n, first/last step, inter-arrival n / sum / sum of squares
+                    (steps are integers, so the running moments are exact int64)
+- ia_hist.parquet   sparse (origId, diff, cnt) histogram of inter-arrival gaps → exact median
+- edges.npy         sorted distinct (origId << 32 | destId) keys → cp_diversity and round trips
+- features_accounts.watermark.json   {"last_step", "rows"}; written last, so it only
+                    ever points at a complete state
+
+Rows must arrive in step order across runs (new steps > watermark). Late rows with
+step <= watermark are not picked up; run a full rebuild in that case. Account ids
+come from the accounts table, which ingest rebuilds deterministically when the same
+files are loaded in the same order, so appending months keeps existing ids stable.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import parquet_store
+from bands import NEAR_HI, NEAR_LO
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+STATE_DIR = ROOT / "data" / "features_state"
+WATERMARK_PATH = ROOT / "data" / "features_accounts.watermark.json"
+
+TX_COLS = ["step", "amount", "origId", "destId", "isFraud", "isFlaggedFraud"]
+NEW_ROWS_SQL = f"SELECT {', '.join(TX_COLS)} FROM transactions WHERE step > ?"
+
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+
+STATE_COLS = {
+    "n_tx": np.int64, "amt_sum": np.float64, "amt_max": np.float64,
+    "near_n": np.int64, "fraud_n": np.int64, "flagged_n": np.int64,
+    "first_step": np.int64, "last_step": np.int64,
+    "ia_n": np.int64, "ia_sum": np.int64, "ia_sumsq": np.int64,
+}
+
+
+# ---------- State I/O ----------
+def empty_state() -> dict:
+    acct = pd.DataFrame({c: pd.Series(dtype=t) for c, t in STATE_COLS.items()})
+    acct.index = pd.Index([], dtype=np.int64, name="origId")
+    hist = pd.DataFrame({"origId": pd.Series(dtype=np.int64),
+                         "diff": pd.Series(dtype=np.int64),
+                         "cnt": pd.Series(dtype=np.int64)})
+    return {"acct": acct, "ia_hist": hist, "edges": np.zeros(0, dtype=np.int64),
+            "last_step": 0, "rows": 0}
+
+
+def load_state(state_dir: Path = STATE_DIR, watermark_path: Path = WATERMARK_PATH) -> dict:
+    """Saved state, or an empty one (watermark 0) if none exists yet."""
+    if not watermark_path.exists():
+        return empty_state()
+    wm = json.loads(watermark_path.read_text())
+    return {
+        "acct": pd.read_parquet(state_dir / "accounts.parquet"),
+        "ia_hist": pd.read_parquet(state_dir / "ia_hist.parquet"),
+        "edges": np.load(state_dir / "edges.npy"),
+        "last_step": int(wm["last_step"]),
+        "rows": int(wm["rows"]),
+    }
+
+
+def save_state(state: dict, state_dir: Path = STATE_DIR, watermark_path: Path = WATERMARK_PATH) -> None:
+    state_dir.mkdir(parents=True, exist_ok=True)
+    state["acct"].to_parquet(state_dir / "accounts.parquet")
+    state["ia_hist"].to_parquet(state_dir / "ia_hist.parquet", index=False)
+    np.save(state_dir / "edges.npy", state["edges"])
+    watermark_path.write_text(json.dumps({"last_step": state["last_step"], "rows": state["rows"]}))
+
+
+def read_new_rows(conn: sqlite3.Connection, last_step: int) -> pd.DataFrame:
+    """Only transactions past the watermark (partition-pruned when the Parquet copy exists)."""
+    if parquet_store.dataset_exists():
+        day_lo = max(0, (last_step - 1) // 24)
+        return parquet_store.read_transactions(
+            TX_COLS, filters=[("day_num", ">=", day_lo), ("step", ">", last_step)]
+        )
+    return pd.read_sql_query(NEW_ROWS_SQL, conn, params=(last_step,))
+
+
+# ---------- Fold ----------
+def fold(state: dict, df: pd.DataFrame, is_merchant: np.ndarray) -> dict:
+    """Merge a batch of new transactions (all with step > watermark) into `state`."""
+    if df.empty:
+        return state
+    orig = df["origId"].to_numpy(dtype=np.int64)
+    dest = df["destId"].to_numpy(dtype=np.int64)
+
+    # distinct edges over all rows (round trips look at both directions)
+    edges = np.union1d(state["edges"], np.unique((orig << ID_BITS) | dest))
+
+    # per-account aggregates over customer-originated rows
+    cust = df[~is_merchant[orig]].sort_values(["origId", "step"], kind="stable")
+    cust = cust.assign(
+        origId=cust["origId"].astype(np.int64),
+        near=((cust["amount"] >= NEAR_LO) & (cust["amount"] < NEAR_HI)).astype(np.int64),
+    )
+    new = cust.groupby("origId").agg(
+        n_tx=("amount", "size"),
+        amt_sum=("amount", "sum"),
+        amt_max=("amount", "max"),
+        near_n=("near", "sum"),
+        fraud_n=("isFraud", "sum"),
+        flagged_n=("isFlaggedFraud", "sum"),
+        first_step=("step", "min"),
+        last_step=("step", "max"),
+    )
+
+    # inter-arrival gaps: within the batch, plus the bridge from each account's previous last step
+    acc = cust["origId"].to_numpy()
+    st = cust["step"].to_numpy(dtype=np.int64)
+    same = acc[1:] == acc[:-1]
+    gap_acc, gap = acc[1:][same], np.diff(st)[same]
+    old = state["acct"]
+    seen = new.index.intersection(old.index)
+    gap_acc = np.concatenate([gap_acc, seen.to_numpy()])
+    gap = np.concatenate([gap, new.loc[seen, "first_step"].to_numpy() - old.loc[seen, "last_step"].to_numpy()])
+
+    gaps = pd.DataFrame({"origId": gap_acc, "diff": gap})
+    mom = gaps.assign(sq=gap * gap).groupby("origId").agg(
+        ia_n=("diff", "size"), ia_sum=("diff", "sum"), ia_sumsq=("sq", "sum")
+    )
+    new = new.join(mom, how="left").fillna({"ia_n": 0, "ia_sum": 0, "ia_sumsq": 0})
+
+    # merge with the old state: additive columns add, max/last take the newer, first keeps the older
+    merged = new.add(old, fill_value=0)
+    idx = merged.index
+    merged["amt_max"] = np.fmax(new["amt_max"].reindex(idx), old["amt_max"].reindex(idx))
+    merged["first_step"] = old["first_step"].reindex(idx).fillna(new["first_step"].reindex(idx))
+    merged["last_step"] = new["last_step"].reindex(idx).fillna(old["last_step"].reindex(idx))
+    merged = merged[list(STATE_COLS)].astype(STATE_COLS)
+    merged.index.name = "origId"
+
+    hist = (
+        pd.concat([state["ia_hist"], gaps.assign(cnt=1)], ignore_index=True)
+        .groupby(["origId", "diff"], as_index=False)["cnt"].sum()
+    )
+
+    return {
+        "acct": merged,
+        "ia_hist": hist,
+        "edges": edges,
+        "last_step": max(state["last_step"], int(df["step"].max())),
+        "rows": state["rows"] + len(df),
+    }
+
+
+# ---------- Finalize ----------
+def _hist_median(hist: pd.DataFrame) -> pd.Series:
+    """Exact median per origId from a sparse (origId, diff, cnt) histogram (np.median semantics)."""
+    if hist.empty:
+        return pd.Series(dtype=np.float64, index=pd.Index([], dtype=np.int64, name="origId"), name="ia_median")
+    h = hist.sort_values(["origId", "diff"])
+    acc = h["origId"].to_numpy()
+    val = h["diff"].to_numpy(dtype=np.float64)
+    cum = np.cumsum(h["cnt"].to_numpy())
+    first = np.r_[True, acc[1:] != acc[:-1]]
+    starts = np.flatnonzero(first)
+    ids = acc[starts]
+    before = np.r_[0, cum][starts]                       # positions used by earlier accounts
+    n = np.r_[cum[starts[1:] - 1], cum[-1]] - before
+    lo = np.searchsorted(cum, before + (n - 1) // 2, side="right")
+    hi = np.searchsorted(cum, before + n // 2, side="right")
+    return pd.Series((val[lo] + val[hi]) / 2.0, index=pd.Index(ids, name="origId"), name="ia_median")
+
+
+def finalize(state: dict) -> pd.DataFrame:
+    """State → the feature frame 03_features_accounts.py writes (indexed by origId)."""
+    s = state["acct"].sort_index()
+    f = pd.DataFrame(index=s.index)
+    f["n_tx"] = s["n_tx"]
+    f["amt_sum"] = s["amt_sum"]
+    f["amt_mean"] = s["amt_sum"] / s["n_tx"]
+    f["amt_max"] = s["amt_max"]
+    f["near_n"] = s["near_n"]
+    f["fraud_n"] = s["fraud_n"]
+    f["flagged_n"] = s["flagged_n"]
+    f["near_pct"] = s["near_n"] / s["n_tx"].clip(lower=1)
+
+    n, sm, sq = s["ia_n"], s["ia_sum"], s["ia_sumsq"]
+    f["ia_mean"] = (sm / n).where(n >= 1)
+    f["ia_median"] = _hist_median(state["ia_hist"]).reindex(f.index)
+    var = (n * sq - sm * sm) / (n * (n - 1)).where(n >= 2)   # integer numerator: no cancellation
+    f["ia_std"] = np.sqrt(var.clip(lower=0)).where(n >= 2, 0.0).where(n >= 1)
+
+    edges = state["edges"]
+    src, cnt = np.unique(edges >> ID_BITS, return_counts=True)
+    f["cp_diversity"] = pd.Series(cnt, index=src).reindex(f.index, fill_value=0).astype(np.int64)
+
+    rev = ((edges & ID_MASK) << ID_BITS) | (edges >> ID_BITS)
+    flagged = np.unique(edges[np.isin(edges, rev, assume_unique=True)] >> ID_BITS)
+    f["round_trip_any"] = np.isin(f.index.to_numpy(), flagged)
+    return f
@@ -0,0 +1,90 @@
+"""
+Amount histograms from bin counts only — raw amounts never land in a DataFrame.
+
+- 1,000-wide bins: pushed down to SQLite (sql/hist_amounts_bins_1k.sql), or read from
+  the aggregate cube (agg_cube.amount_hist_1k), which uses the same fold below.
+- arbitrary fixed edges (e.g. the log-spaced bins of 06_plot_hist_amounts.py):
+  one streaming pass, np.histogram per chunk, counts summed.
+
+Plot from counts with plt.hist(edges[:-1], bins=edges, weights=counts); the bars are
+identical to plt.hist(raw_amounts, bins=edges).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import parquet_store
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+SQL_HIST_1K = ROOT / "sql" / "hist_amounts_bins_1k.sql"
+
+CHUNK = 1_000_000
+
+
+def fold_1k(hist_1k: np.ndarray, amt_max: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Dense floor(amount/1000) counts → (counts, edges) identical to
+    np.histogram(a, np.arange(0, hi + 1000, 1000)) with hi = ceil(max/1000)*1000.
+    np.histogram's last bin is closed, so an amount equal to hi folds into it.
+    """
+    hi = int(np.ceil(float(amt_max) / 1000.0) * 1000)
+    edges = np.arange(0, hi + 1000, 1000, dtype=int)
+    n_bins = len(edges) - 1
+    counts = np.zeros(n_bins, dtype=np.int64)
+    counts[: min(n_bins, hist_1k.size)] = hist_1k[:n_bins]
+    if hist_1k.size > n_bins and n_bins:
+        counts[-1] += hist_1k[n_bins:].sum()
+    return counts, edges
+
+
+def hist_1k_sql(conn: sqlite3.Connection) -> tuple[np.ndarray, np.ndarray]:
+    """1,000-wide bins grouped inside SQLite; only (bin, n) rows come back."""
+    rows = pd.read_sql_query(SQL_HIST_1K.read_text(), conn)
+    if rows.empty:
+        return np.zeros(0, dtype=np.int64), np.zeros(1, dtype=int)
+    amt_max = conn.execute("SELECT MAX(amount) FROM transactions").fetchone()[0]
+    dense = np.zeros(int(rows["bin"].max()) + 1, dtype=np.int64)
+    dense[rows["bin"].to_numpy()] = rows["n"].to_numpy()
+    return fold_1k(dense, amt_max)
+
+
+def iter_amounts(db_path: Path = DB_PATH, chunksize: int = CHUNK):
+    """Amount column in bounded chunks (Parquet copy if present, else SQLite)."""
+    if parquet_store.dataset_exists():
+        for df in parquet_store.iter_batches(["amount"], batch_size=chunksize):
+            yield df["amount"].to_numpy()
+        return
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        for df in pd.read_sql_query("SELECT amount FROM transactions", conn, chunksize=chunksize):
+            yield df["amount"].to_numpy()
+
+
+def amount_max(db_path: Path = DB_PATH) -> float:
+    """MAX(amount): Parquet footer statistics when available, else one SQLite aggregate."""
+    if parquet_store.dataset_exists():
+        m = parquet_store.column_max("amount")
+        if m is not None:
+            return float(m)
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        return float(conn.execute("SELECT MAX(amount) FROM transactions").fetchone()[0])
+
+
+def stream_hist(edges: np.ndarray, db_path: Path = DB_PATH, chunksize: int = CHUNK) -> np.ndarray:
+    """Counts for fixed `edges` accumulated chunk by chunk (np.histogram semantics)."""
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for a in iter_amounts(db_path, chunksize):
+        counts += np.histogram(a, bins=edges)[0]
+    return counts
+
+
+def log_hist(n_edges: int = 80, db_path: Path = DB_PATH) -> tuple[np.ndarray, np.ndarray]:
+    """Log-spaced bins np.logspace(0, log10(max), n_edges) and their counts."""
+    edges = np.logspace(0, np.log10(amount_max(db_path)), n_edges)
+    return stream_hist(edges, db_path), edges
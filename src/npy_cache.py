@@ -0,0 +1,47 @@
+"""
+Directory caches of named column arrays: one .npy per column plus meta.json.
+
+The idiom tx_arrays and the graph CSR use, shared by the per-account feature
+caches (graph node features, balance, velocity):
+
+- every .npy is written to a per-process temp name and renamed into place, so
+  an interrupted or concurrent build never leaves a truncated file behind
+- meta.json (source signature + column names) is renamed in last; a cache is
+  valid only if it matches the current source and every column loads
+- loads are np.load(mmap_mode="r"), so callers can slice rows without reading
+  whole columns (03_features_accounts --out-of-core)
+
+    save_columns(cache_dir, {"a": arr, ...}, source)
+    cols = load_columns(cache_dir, source)     # dict of memmaps, or None = rebuild
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+def save_columns(cache_dir: Path, columns: dict[str, np.ndarray], source: str) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    pid = os.getpid()
+    for name, arr in columns.items():
+        tmp = cache_dir / f"{name}.{pid}.tmp.npy"
+        np.save(tmp, np.asarray(arr))
+        tmp.replace(cache_dir / f"{name}.npy")
+    tmp = cache_dir / f"meta.{pid}.tmp"
+    tmp.write_text(json.dumps({"source": source, "columns": list(columns)}))
+    tmp.replace(cache_dir / "meta.json")
+
+
+def load_columns(cache_dir: Path, source: str, columns: list[str] | None = None) -> dict[str, np.ndarray] | None:
+    """Memory-mapped columns, or None if the cache is missing, stale or unreadable."""
+    try:
+        meta = json.loads((cache_dir / "meta.json").read_text())
+        if meta.get("source") != source or not set(columns or []) <= set(meta["columns"]):
+            return None
+        return {c: np.load(cache_dir / f"{c}.npy", mmap_mode="r") for c in (columns or meta["columns"])}
+    except (OSError, ValueError, KeyError):
+        return None
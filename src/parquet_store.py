@@ -0,0 +1,117 @@
+"""
+Columnar copy of `transactions` (Parquet dataset, hive-partitioned by day_num).
+
+Written by 01_load_to_sqlite.py next to data/paysim.db. Reads go through
+pyarrow with column projection and predicate pushdown (partition pruning on
+day_num, row-group statistics on the rest), so scripts only decode the columns
+and row groups they actually need:
+
+    read_transactions(["amount"])
+    read_transactions(["step", "amount"],
+                      filters=[("type", "in", ["CASH_IN", "PAYMENT", "TRANSFER"]),
+                               ("amount", ">=", 9000), ("amount", "<", 10000)])
+
+Filters use pyarrow's DNF list-of-tuples syntax.
+"""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DATASET_DIR = ROOT / "data" / "transactions_parquet"
+
+# PaySim transaction types; fixed categories keep codes stable across chunks/files.
+TX_TYPES = ["CASH_IN", "CASH_OUT", "DEBIT", "PAYMENT", "TRANSFER"]
+
+PARTITION_COL = "day_num"
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_COL, pa.int16())]), flavor="hive")
+
+
+def to_arrow_chunk(chunk: pd.DataFrame) -> pa.Table:
+    """Encoded ingest chunk -> Arrow table with compact dtypes and step-derived columns."""
+    step = chunk["step"].to_numpy(dtype=np.int32)
+    out = pd.DataFrame({
+        "step": step,
+        PARTITION_COL: ((step - 1) // 24).astype(np.int16),
+        "hour_of_day": ((step - 1) % 24).astype(np.int8),
+        "type": chunk["type"],                      # categorical -> dictionary-encoded
+        "amount": chunk["amount"].to_numpy(dtype=np.float64),
+        "origId": chunk["origId"].to_numpy(dtype=np.int32),
+        "oldbalanceOrg": chunk["oldbalanceOrg"].to_numpy(dtype=np.float64),
+        "newbalanceOrig": chunk["newbalanceOrig"].to_numpy(dtype=np.float64),
+        "destId": chunk["destId"].to_numpy(dtype=np.int32),
+        "oldbalanceDest": chunk["oldbalanceDest"].to_numpy(dtype=np.float64),
+        "newbalanceDest": chunk["newbalanceDest"].to_numpy(dtype=np.float64),
+        "isFraud": chunk["isFraud"].to_numpy(dtype=np.int8),
+        "isFlaggedFraud": chunk["isFlaggedFraud"].to_numpy(dtype=np.int8),
+    })
+    return pa.Table.from_pandas(out, preserve_index=False)
+
+
+def reset_dataset(dataset_dir: Path = DATASET_DIR) -> None:
+    """Drop any previous dataset so a fresh ingest never mixes with stale files."""
+    if dataset_dir.exists():
+        shutil.rmtree(dataset_dir)
+
+
+def write_chunk(chunk: pd.DataFrame, part_no: int, dataset_dir: Path = DATASET_DIR) -> None:
+    """Append one ingest chunk; each chunk lands as its own file inside every day_num it touches."""
+    pq.write_to_dataset(
+        to_arrow_chunk(chunk),
+        root_path=dataset_dir,
+        partition_cols=[PARTITION_COL],
+        basename_template=f"part-{part_no:05d}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def dataset_exists(dataset_dir: Path = DATASET_DIR) -> bool:
+    return dataset_dir.is_dir() and any(dataset_dir.glob(f"{PARTITION_COL}=*/*.parquet"))
+
+
+def column_max(column: str, dataset_dir: Path = DATASET_DIR) -> float | None:
+    """Max of `column` from the Parquet row-group statistics (footers only, no data pages)."""
+    best = None
+    dataset = ds.dataset(dataset_dir, format="parquet", partitioning=PARTITIONING)
+    for frag in dataset.get_fragments():
+        meta = frag.metadata
+        j = meta.schema.names.index(column)
+        for i in range(meta.num_row_groups):
+            st = meta.row_group(i).column(j).statistics
+            if st is None or not st.has_min_max:
+                return None                      # no stats somewhere → caller must scan
+            best = st.max if best is None else max(best, st.max)
+    return best
+
+
+def iter_batches(
+    columns: list[str],
+    batch_size: int = 1_000_000,
+    filters: list | None = None,
+    dataset_dir: Path = DATASET_DIR,
+):
+    """Stream `columns` as pandas DataFrames of at most `batch_size` rows (bounded memory)."""
+    dataset = ds.dataset(dataset_dir, format="parquet", partitioning=PARTITIONING)
+    expr = pq.filters_to_expression(filters) if filters else None
+    for batch in dataset.to_batches(columns=columns, filter=expr, batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_transactions(
+    columns: list[str] | None = None,
+    filters: list | None = None,
+    dataset_dir: Path = DATASET_DIR,
+) -> pd.DataFrame:
+    """Read only `columns` (None = all) of the rows matching `filters`."""
+    table = pq.read_table(dataset_dir, columns=columns, filters=filters, partitioning=PARTITIONING)
+    return table.to_pandas()
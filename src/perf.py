@@ -0,0 +1,359 @@
+"""
+Small runtime measurement helpers shared by the stage scripts.
+
+Besides the peak-RSS helpers, this is the tracing layer every src/ script uses:
+
+    from perf import span, traced_iter
+
+    with span("read", kind="query") as sp:
+        df = pd.read_sql_query(SQL, conn)
+        sp.rows = len(df)
+
+Spans nest (paths like "features/aggregates") and are aggregated per path:
+calls, wall, CPU, self time (wall minus child spans), rows and the peak RSS seen
+while the span was open (sampled from /proc/self/statm every few ms on Linux).
+Kinds are query / convert / compute / io / plot, so a trace says how much of a
+run went to SQLite vs. DataFrame conversion vs. numpy vs. writing files.
+
+At exit the process writes data/traces/<script>/<timestamp>_<pid>.json (only if
+it opened a span). Environment flags:
+
+    PAYSIM_TRACE=0          no trace file, spans cost nothing
+    PAYSIM_TRACE_DIR=path   trace directory (default data/traces)
+    PAYSIM_PROFILE=cprofile also dump a cProfile .prof next to the trace
+    PAYSIM_PROFILE=sample   also dump a sampled .folded stack file (flamegraph /
+                            speedscope input), each stack prefixed with its span
+    PAYSIM_PROFILE_HZ=200   sampling rate
+
+Compare runs:
+
+    python src/perf.py show 03_features_accounts            # latest trace of a script
+    python src/perf.py diff 03_features_accounts            # its two latest traces
+    python src/perf.py diff old.json new.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+TRACE_DIR = Path(os.environ.get("PAYSIM_TRACE_DIR", ROOT / "data" / "traces"))
+
+KINDS = ("query", "convert", "compute", "io", "plot")
+RSS_POLL_S = 0.01
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024) if hasattr(os, "sysconf") else 0.0
+_T_IMPORT = time.perf_counter()        # ≈ process start for the scripts (imported at the top)
+
+
+def maxrss_mb(ru_maxrss: int) -> float:
+    """ru_maxrss → MB (bytes on macOS, KB on Linux)."""
+    return ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else ru_maxrss / 1024
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Peak resident set size in MB."""
+    return maxrss_mb(resource.getrusage(who).ru_maxrss)
+
+
+def current_rss_mb() -> float:
+    """Current resident set size in MB (falls back to the peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except OSError:
+        return peak_rss_mb()
+
+
+# ---------- Spans ----------
+class _Agg:
+    """Totals for one span path."""
+    __slots__ = ("kind", "calls", "wall", "cpu", "child", "rows", "peak", "first")
+
+    def __init__(self, kind: str, first: float):
+        self.kind, self.first = kind, first
+        self.calls = 0
+        self.wall = self.cpu = self.child = self.peak = 0.0
+        self.rows = 0
+
+
+class Span:
+    """One open span; set `.rows` inside the block to record throughput."""
+    __slots__ = ("tracer", "name", "kind", "rows", "path", "parent", "t0", "c0", "child", "peak")
+
+    def __init__(self, tracer: "Tracer", name: str, kind: str, rows: int | None):
+        self.tracer, self.name, self.kind, self.rows = tracer, name, kind, rows
+
+    def __enter__(self) -> "Span":
+        stack = self.tracer.stack()
+        self.parent = stack[-1] if stack else None
+        self.path = f"{self.parent.path}/{self.name}" if self.parent else self.name
+        self.child = 0.0
+        self.peak = current_rss_mb()
+        stack.append(self)
+        self.c0 = time.process_time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        wall = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.c0
+        self.tracer.stack().pop()
+        self.peak = max(self.peak, current_rss_mb())
+        if self.parent is not None:
+            self.parent.child += wall
+            self.parent.peak = max(self.parent.peak, self.peak)
+        self.tracer.record(self, wall, cpu)
+
+
+class _NullSpan:
+    __slots__ = ("rows",)
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class Tracer:
+    """Per-process span aggregator; created on the first span() call."""
+
+    def __init__(self, script: str):
+        self.script = script
+        self.t0 = _T_IMPORT
+        self.started = time.strftime("%Y%m%d-%H%M%S")
+        self.aggs: dict[str, _Agg] = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.main_stack: list[Span] = self.stack()
+        self.samples: Counter = Counter()
+        self.profile = os.environ.get("PAYSIM_PROFILE", "").lower()
+        self.profiler = None
+        self.closed = False
+        if self.profile == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profile == "sample":
+            self._start_sampler(float(os.environ.get("PAYSIM_PROFILE_HZ", 200)))
+        self._watch = threading.Thread(target=self._watch_rss, name="perf-rss", daemon=True)
+        self._watch.start()
+        atexit.register(self.close)
+
+    def stack(self) -> list[Span]:
+        st = getattr(self.local, "stack", None)
+        if st is None:
+            st = self.local.stack = []
+        return st
+
+    def record(self, sp: Span, wall: float, cpu: float) -> None:
+        with self.lock:
+            agg = self.aggs.get(sp.path)
+            if agg is None:
+                agg = self.aggs[sp.path] = _Agg(sp.kind, sp.t0 - self.t0)
+            agg.calls += 1
+            agg.wall += wall
+            agg.cpu += cpu
+            agg.child += sp.child
+            agg.rows += sp.rows or 0
+            agg.peak = max(agg.peak, sp.peak)
+
+    def _watch_rss(self) -> None:
+        """Raise `.peak` on the main thread's open spans while they run."""
+        while not self.closed:
+            rss = current_rss_mb()
+            for sp in list(self.main_stack):
+                if rss > sp.peak:
+                    sp.peak = rss
+            time.sleep(RSS_POLL_S)
+
+    def _start_sampler(self, hz: float) -> None:
+        import signal
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        def sample(signum, frame) -> None:
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                frame = frame.f_back
+            spans = [sp.name for sp in self.main_stack] or ["-"]
+            self.samples[";".join(spans + names[::-1])] += 1
+
+        signal.signal(signal.SIGPROF, sample)
+        signal.setitimer(signal.ITIMER_PROF, 1.0 / hz, 1.0 / hz)
+
+    def report(self) -> dict:
+        spans = []
+        for path, a in sorted(self.aggs.items(), key=lambda kv: kv[1].first):
+            spans.append({
+                "path": path, "kind": a.kind, "calls": a.calls,
+                "wall_s": round(a.wall, 4), "self_s": round(a.wall - a.child, 4), "cpu_s": round(a.cpu, 4),
+                "rows": a.rows, "rows_per_s": round(a.rows / a.wall, 1) if a.rows and a.wall > 0 else None,
+                "peak_rss_mb": round(a.peak, 1), "first_s": round(a.first, 4),
+            })
+        return {
+            "meta": {"script": self.script, "argv": sys.argv[1:], "started": self.started, "pid": os.getpid(),
+                     "python": sys.version.split()[0], "profile": self.profile or None},
+            "total": {"wall_s": round(time.perf_counter() - self.t0, 4),
+                      "cpu_s": round(time.process_time(), 4),
+                      "peak_rss_mb": round(peak_rss_mb(), 1)},
+            "spans": spans,
+        }
+
+    def close(self) -> Path | None:
+        if self.closed:
+            return None
+        self.closed = True
+        if self.profile == "sample":
+            import signal
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        out_dir = TRACE_DIR / self.script
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out = out_dir / f"{self.started}_{os.getpid()}.json"
+        out.write_text(json.dumps(self.report(), indent=1))
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(out.with_suffix(".prof"))
+        if self.samples:
+            out.with_suffix(".folded").write_text(
+                "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common()))
+        print(f"[Info] trace → {out}", file=sys.stderr)
+        return out
+
+
+_TRACER: Tracer | None = None
+_ENABLED = os.environ.get("PAYSIM_TRACE", "1") != "0"
+
+
+def tracer() -> Tracer:
+    global _TRACER
+    if _TRACER is None:
+        name = Path(sys.argv[0]).stem if sys.argv and sys.argv[0] not in ("", "-c") else "python"
+        _TRACER = Tracer(name)
+    return _TRACER
+
+
+def span(name: str, kind: str = "compute", rows: int | None = None) -> Span | _NullSpan:
+    """Context manager timing one step of a script (see module docstring)."""
+    if not _ENABLED:
+        return _NullSpan()
+    return Span(tracer(), name, kind, rows)
+
+
+def traced_iter(items, name: str, kind: str = "io", rows=len):
+    """Yield from `items`, timing each next() (e.g. CSV/Parquet chunk reads) as a `name` span."""
+    it = iter(items)
+    while True:
+        with span(name, kind) as sp:
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            sp.rows = rows(item) if rows else None
+        yield item
+
+
+def _disable_in_child() -> None:
+    # forked pool workers exit via os._exit; never let them touch the parent's trace
+    global _TRACER, _ENABLED
+    if _TRACER is not None:
+        _TRACER.closed = True
+    _TRACER, _ENABLED = None, False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_disable_in_child)
+
+
+# ---------- Trace files ----------
+def resolve_traces(arg: str, n: int) -> list[Path]:
+    """A trace file, or the `n` latest traces of a script name under TRACE_DIR."""
+    p = Path(arg)
+    if p.is_file():
+        return [p]
+    runs = sorted((p if p.is_dir() else TRACE_DIR / arg).glob("*.json"), key=lambda f: f.stat().st_mtime)
+    if len(runs) < n:
+        raise SystemExit(f"[ERROR] need {n} trace(s) for {arg!r}, found {len(runs)} in {TRACE_DIR / arg}")
+    return runs[-n:]
+
+
+def by_kind(report: dict) -> dict[str, float]:
+    out = dict.fromkeys(KINDS, 0.0)
+    for s in report["spans"]:
+        out[s["kind"]] = out.get(s["kind"], 0.0) + s["self_s"]
+    return out
+
+
+def show(path: Path) -> None:
+    r = json.loads(path.read_text())
+    print(f"{r['meta']['script']} {' '.join(r['meta']['argv'])}  ({path.name})")
+    print(f"{'span':<44} {'kind':<8} {'calls':>6} {'wall s':>9} {'self s':>9} {'cpu s':>9} "
+          f"{'rows/s':>12} {'peak MB':>8}")
+    for s in r["spans"]:
+        depth = s["path"].count("/")
+        print(f"{'  ' * depth + s['path'].rsplit('/', 1)[-1]:<44} {s['kind']:<8} {s['calls']:>6} "
+              f"{s['wall_s']:9.3f} {s['self_s']:9.3f} {s['cpu_s']:9.3f} "
+              f"{s['rows_per_s'] or 0:>12,.0f} {s['peak_rss_mb']:8,.0f}")
+    t = r["total"]
+    print(f"{'total':<59} {t['wall_s']:9.3f} {'':>9} {t['cpu_s']:9.3f} {'':>12} {t['peak_rss_mb']:8,.0f}")
+    print("self time by kind: " + ", ".join(f"{k} {v:.2f}s" for k, v in by_kind(r).items() if v))
+
+
+def diff(old_path: Path, new_path: Path) -> None:
+    old, new = (json.loads(p.read_text()) for p in (old_path, new_path))
+    o_spans = {s["path"]: s for s in old["spans"]}
+    n_spans = {s["path"]: s for s in new["spans"]}
+
+    def ratio(n, o):
+        return f"x{n / o:5.2f}" if n and o else "   - "
+
+    print(f"old: {old_path}\nnew: {new_path}")
+    print(f"{'span':<44} {'old s':>9} {'new s':>9} {'wall':>7} {'old MB':>8} {'new MB':>8}")
+    nan = {"wall_s": float("nan"), "peak_rss_mb": float("nan")}
+    for path in dict.fromkeys([*o_spans, *n_spans]):
+        o, n = o_spans.get(path, nan), n_spans.get(path, nan)
+        print(f"{path:<44} {o['wall_s']:9.3f} {n['wall_s']:9.3f} {ratio(n['wall_s'], o['wall_s']):>7} "
+              f"{o['peak_rss_mb']:8,.0f} {n['peak_rss_mb']:8,.0f}")
+    ot, nt = old["total"], new["total"]
+    print(f"{'total':<44} {ot['wall_s']:9.3f} {nt['wall_s']:9.3f} {ratio(nt['wall_s'], ot['wall_s']):>7} "
+          f"{ot['peak_rss_mb']:8,.0f} {nt['peak_rss_mb']:8,.0f}")
+    ok, nk = by_kind(old), by_kind(new)
+    for k in dict.fromkeys([*ok, *nk]):
+        if ok.get(k) or nk.get(k):
+            print(f"  {k:<42} {ok.get(k, 0):9.3f} {nk.get(k, 0):9.3f} {ratio(nk.get(k), ok.get(k)):>7}")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Show or diff trace files written by the src/ scripts.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    p_show = sub.add_parser("show", help="one trace (file or script name → latest)")
+    p_show.add_argument("trace")
+    p_diff = sub.add_parser("diff", help="two traces, or a script name → its two latest")
+    p_diff.add_argument("old")
+    p_diff.add_argument("new", nargs="?")
+    args = p.parse_args()
+
+    if args.cmd == "show":
+        show(resolve_traces(args.trace, 1)[0])
+    elif args.new is None:
+        diff(*resolve_traces(args.old, 2))
+    else:
+        diff(resolve_traces(args.old, 1)[0], resolve_traces(args.new, 1)[0])
+    return 0
+
+
+if __name__ == "__main__":
+    _ENABLED = False
+    raise SystemExit(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Pipeline runner: the stage scripts as a DAG with fingerprint-cached outputs.
+
+    ingest ── indexes ─┬─ tx_arrays ─┬─ features ─┬─ anomalies
+                       │             │            └─ hypothesis
+                       │             └─ band_scan
+                       └─ cube ──────┬─ heatmap_near
+                                     ├─ heatmap_weekhour
+                                     └─ histogram
+
+indexes (CREATE INDEX + ANALYZE) changes paysim.db's size and mtime, which the
+caches built from it (cube, graph, tx_arrays, ...) are keyed on, so every
+DB-reading stage runs after it. tx_arrays builds the shared column cache once,
+before the concurrent stages that read it.
+
+Each stage's fingerprint is a SHA-256 over
+- its script and every local module it imports (so constants such as
+  06_plot_improved.STRUCT_LO/STRUCT_HI are covered), plus the sql/ files they name,
+- its command-line arguments (e.g. anomalies --contamination),
+- the environment settings read by the modules it imports (AML_THRESHOLD /
+  AML_BAND_PCT for bands.py, SEED for resampling.py),
+- the fingerprints of its upstream stages, and for ingest the CSV size/mtime.
+
+anomalies reuses the saved model (04 fit-once) and is passed --refit only when
+the features fingerprint changed since its last successful run.
+
+A stage is skipped when its fingerprint matches data/pipeline_state.json and all
+of its outputs still exist. Ready stages run concurrently, one child process each.
+
+    python src/pipeline.py                      # bring everything up to date
+    python src/pipeline.py anomalies            # one target and what it needs
+    python src/pipeline.py --dry-run            # show what would run and why
+    python src/pipeline.py --force features     # rerun features and everything downstream
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import bands
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+SRC_DIR = HERE.parent
+SQL_DIR = ROOT / "sql"
+DATA_DIR = ROOT / "data"
+STATE_PATH = DATA_DIR / "pipeline_state.json"
+LOG_DIR = DATA_DIR / "pipeline_logs"
+DEFAULT_CSV = DATA_DIR / "PS_20174392719_1491204439457_log.csv"
+ENV_KEYS = {"bands.py": bands.ENV_KEYS, "resampling.py": ["SEED"]}     # module → settings it reads
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    deps: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)      # relative to ROOT
+    args: list[str] = field(default_factory=list)
+    sql: list[str] = field(default_factory=list)          # extra sql/ globs read at runtime
+    inputs: list[Path] = field(default_factory=list)      # external files (size/mtime signature)
+    refit_args: list[str] = field(default_factory=list)   # added only when an upstream fingerprint changed
+
+
+def build_stages(csv_paths: list[Path], contamination: float | None) -> dict[str, Stage]:
+    iforest_args = ["--contamination", str(contamination)] if contamination is not None else []
+    stages = [
+        Stage("ingest", "01_load_to_sqlite.py", outputs=["data/paysim.db", "data/transactions_parquet"],
+              args=[str(p) for p in csv_paths], inputs=csv_paths),
+        Stage("indexes", "01_apply_indexes.py", ["ingest"], ["reports/query_plans.txt"], sql=["*.sql"]),
+        Stage("tx_arrays", "tx_arrays.py", ["indexes"], ["data/tx_arrays/meta.json"]),
+        Stage("features", "03_features_accounts.py", ["tx_arrays"],
+              ["data/features_accounts.parquet", "data/features_accounts.csv"]),
+        Stage("anomalies", "04_anomaly_iforest.py", ["features"],
+              ["reports/anomalies_accounts.csv", "data/anomaly_scores.parquet"], args=iforest_args,
+              refit_args=["--refit"]),
+        Stage("hypothesis", "05_hypothesis_tests.py", ["features"], ["reports/hypothesis_tests.txt", "reports/hypothesis_resampling.csv"]),
+        Stage("cube", "agg_cube.py", ["indexes"], ["data/agg_cube.npz"]),
+        Stage("heatmap_near", "02_heatmap.py", ["cube"], ["reports/heatmap_near_threshold.png"]),
+        Stage("heatmap_weekhour", "07_heatmap_weekhour_FIU_improved.py", ["cube"],
+              ["reports/heatmap_weekday_hour.png", "reports/weekday_hour_counts.csv"]),
+        Stage("histogram", "06_plot_improved.py", ["cube"],
+              ["reports/hist_amounts_log.png", "reports/hist_amounts_bins.csv"]),
+        Stage("band_scan", "band_scan.py", ["tx_arrays"],
+              ["reports/band_scan_summary.csv", "reports/band_scan_dayhour.csv", "data/band_scan_accounts.parquet"]),
+    ]
+    return {s.name: s for s in stages}
+
+
+# ---------- Fingerprints ----------
+def local_code(script: Path) -> tuple[list[Path], set[str]]:
+    """The script plus the src/ modules it imports (transitively), and the .sql names they mention."""
+    seen: list[Path] = []
+    sql: set[str] = set()
+    todo = [script]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        for node in ast.walk(ast.parse(path.read_text(), filename=str(path))):
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                names = [node.module]
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value.endswith(".sql"):
+                sql.add(node.value)
+                continue
+            else:
+                continue
+            for name in names:
+                mod = SRC_DIR / f"{name.split('.')[0]}.py"
+                if mod.exists():
+                    todo.append(mod)
+    return sorted(seen), sql
+
+
+def file_signature(path: Path) -> str:
+    st = path.stat()
+    return f"{path.resolve()}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def fingerprint(stage: Stage, upstream: dict[str, str]) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps([stage.name, stage.script, stage.args]).encode())
+    code, sql_names = local_code(SRC_DIR / stage.script)
+    sql_files = {SQL_DIR / n for n in sql_names if (SQL_DIR / n).exists()}
+    for pattern in stage.sql:
+        sql_files.update(SQL_DIR.glob(pattern))
+    for path in [*code, *sorted(sql_files)]:
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    for path in code:
+        for key in ENV_KEYS.get(path.name, []):
+            h.update(f"{key}={bands.env(key, '')}".encode())
+    for dep in stage.deps:
+        h.update(f"{dep}={upstream[dep]}".encode())
+    for path in stage.inputs:
+        h.update(file_signature(path).encode() if path.exists() else f"missing:{path}".encode())
+    return h.hexdigest()
+
+
+def load_state() -> dict:
+    return json.loads(STATE_PATH.read_text()) if STATE_PATH.exists() else {}
+
+
+def save_state(state: dict) -> None:
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_PATH.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True))
+    tmp.replace(STATE_PATH)
+
+
+# ---------- Planning ----------
+def closure(stages: dict[str, Stage], targets: list[str]) -> list[str]:
+    """Targets plus everything upstream, in topological order."""
+    order: list[str] = []
+
+    def visit(name: str) -> None:
+        if name in order:
+            return
+        for dep in stages[name].deps:
+            visit(dep)
+        order.append(name)
+
+    for t in targets:
+        visit(t)
+    return order
+
+
+def plan(stages: dict[str, Stage], order: list[str], state: dict, force: set[str]) -> tuple[dict, dict]:
+    """(fingerprints, reason-to-run or None) for every stage in `order`."""
+    fps: dict[str, str] = {}
+    reasons: dict[str, str | None] = {}
+    for name in order:
+        st = stages[name]
+        fps[name] = fingerprint(st, fps)
+        prev = state.get(name, {})
+        missing = [o for o in st.outputs if not (ROOT / o).exists()]
+        if name in force:
+            reasons[name] = "forced"
+        elif any(reasons[d] for d in st.deps):
+            reasons[name] = "upstream reruns"
+        elif prev.get("fingerprint") != fps[name]:
+            reasons[name] = "inputs changed" if prev else "never run"
+        elif missing:
+            reasons[name] = f"missing {missing[0]}"
+        else:
+            reasons[name] = None
+    return fps, reasons
+
+
+# ---------- Execution ----------
+def stage_args(stage: Stage, fps: dict, state: dict) -> list[str]:
+    """stage.args, plus refit_args if any upstream fingerprint differs from the last successful run."""
+    seen = state.get(stage.name, {}).get("upstream", {})
+    changed = any(seen.get(d) != fps[d] for d in stage.deps)
+    return stage.args + (stage.refit_args if changed else [])
+
+
+def run_stage(stage: Stage, args: list[str]) -> tuple[int, float]:
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    t0 = time.time()
+    with open(LOG_DIR / f"{stage.name}.log", "w") as log:
+        rc = subprocess.run([sys.executable, str(SRC_DIR / stage.script), *args],
+                            cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+                            env={**os.environ, "MPLBACKEND": "Agg"}).returncode
+    return rc, time.time() - t0
+
+
+def execute(stages: dict[str, Stage], order: list[str], fps: dict, reasons: dict,
+            state: dict, workers: int) -> int:
+    todo = [n for n in order if reasons[n]]
+    done = {n for n in order if not reasons[n]}
+    failed: set[str] = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while todo or running:
+            for name in [n for n in todo if all(d in done for d in stages[n].deps)]:
+                if len(running) >= workers:
+                    break
+                todo.remove(name)
+                args = stage_args(stages[name], fps, state)
+                extra = " ".join(args[len(stages[name].args):])
+                print(f"[run ] {name:<17} ({reasons[name]}{'; ' + extra if extra else ''})", flush=True)
+                running[pool.submit(run_stage, stages[name], args)] = name
+            blocked = [n for n in todo if any(d in failed for d in stages[n].deps)]
+            for name in blocked:
+                todo.remove(name)
+                failed.add(name)
+                print(f"[skip] {name:<17} (upstream failed)")
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                rc, secs = fut.result()
+                if rc == 0:
+                    done.add(name)
+                    state[name] = {"fingerprint": fps[name], "seconds": round(secs, 2),
+                                   "upstream": {d: fps[d] for d in stages[name].deps},
+                                   "finished": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                    save_state(state)
+                    print(f"[ OK ] {name:<17} {secs:8.1f}s")
+                else:
+                    failed.add(name)
+                    state.pop(name, None)
+                    save_state(state)
+                    print(f"[FAIL] {name:<17} exit {rc}; see {LOG_DIR / (name + '.log')}")
+    return 1 if failed else 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Run the pipeline DAG, skipping stages whose outputs are current.")
+    p.add_argument("targets", nargs="*", help="stages to bring up to date (default: all)")
+    p.add_argument("--csv", nargs="+", type=Path, default=[DEFAULT_CSV], help="ingest input file(s)")
+    p.add_argument("--contamination", type=float, default=None, help="passed to 04_anomaly_iforest.py")
+    p.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="rerun these stages regardless")
+    p.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="concurrent stages")
+    p.add_argument("--dry-run", action="store_true", help="print the plan only")
+    args = p.parse_args()
+
+    stages = build_stages([c.resolve() for c in args.csv], args.contamination)
+    unknown = [t for t in [*args.targets, *args.force] if t not in stages]
+    if unknown:
+        raise SystemExit(f"[ERROR] unknown stage(s) {unknown}; choose from {list(stages)}")
+
+    order = closure(stages, args.targets or list(stages))
+    state = load_state()
+    fps, reasons = plan(stages, order, state, set(args.force))
+
+    for name in order:
+        print(f"    {name:<17} {'run: ' + reasons[name] if reasons[name] else 'cached'}")
+    if args.dry_run or not any(reasons.values()):
+        print("[OK] nothing to do" if not any(reasons.values()) else "[Info] dry run; nothing executed")
+        return 0
+
+    t0 = time.time()
+    rc = execute(stages, order, fps, reasons, state, max(1, args.workers))
+    print(f"[{'OK' if rc == 0 else 'ERROR'}] pipeline finished in {time.time() - t0:,.1f}s")
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Local HTTP/JSON query service over data/paysim.db for Tableau / dashboard refreshes.
+
+Serves parameterized versions of the report queries from a pool of read-only
+SQLite connections (mode=ro, query_only, shared mmap), behind an LRU result
+cache keyed on (query, parameters, DB watermark). The watermark is the size and
+mtime of paysim.db and its WAL, so a re-ingest invalidates every entry without
+a restart. Concurrent identical misses wait for the first one instead of each
+scanning the table.
+
+    python src/query_service.py --port 8765 --connections 4
+
+    GET /q/dayhour?types=CASH_IN,PAYMENT,TRANSFER&lo=9000&hi=10000   day_num, hour_of_day, n, amt_sum
+    GET /q/weekhour?lo=9000&hi=10000                                 weekday (0=Mon), hour_of_day, n
+    GET /q/amount_bins?width=1000                                    bin, lo, n
+    GET /q/near_band?threshold=10000&pct=10                          day_num, n, amt_sum, accounts
+    GET /q/features?account=C1231006815 | ?order=near_n&limit=50    rows of data/features_accounts.parquet
+    GET /q/history?account=C1231006815&hops=1&cp_limit=20            time-ordered history (drilldown.py)
+    GET /queries   GET /stats   GET /health
+
+Every /q/ query also accepts format=csv (for Tableau text connections).
+Responses are JSON: {"query", "params", "columns", "rows", "cached", "ms"}.
+Load test: python -m bench.bench_query_service
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import drilldown
+from bands import AML_BAND_PCT, AML_THRESHOLD
+from parquet_store import TX_TYPES
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+FEAT_PATH = ROOT / "data" / "features_accounts.parquet"
+
+NEAR_TYPES = ["CASH_IN", "PAYMENT", "TRANSFER"]
+MMAP_SIZE = 1 << 34
+MAX_LIMIT = 10_000
+
+
+class QueryError(ValueError):
+    """Bad request parameters (HTTP 400)."""
+
+
+# ---------- Connections ----------
+class ConnectionPool:
+    """Fixed set of read-only connections handed out one request at a time."""
+
+    def __init__(self, db_path: Path = DB_PATH, size: int = 4):
+        if not db_path.exists():
+            raise SystemExit(f"[ERROR] DB not found at {db_path}. Run 01_load_to_sqlite.py first.")
+        self._free: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = 1")
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")      # pages shared through the OS cache
+            self._free.put(conn)
+        self.size = size
+
+    @contextmanager
+    def connection(self):
+        conn = self._free.get()
+        try:
+            yield conn
+        finally:
+            self._free.put(conn)
+
+    def close(self) -> None:
+        while not self._free.empty():
+            self._free.get_nowait().close()
+
+
+def watermark(db_path: Path = DB_PATH) -> str:
+    """Changes whenever the DB (or its WAL) is written."""
+    parts = []
+    for p in (db_path, db_path.with_name(db_path.name + "-wal")):
+        if p.exists():
+            st = p.stat()
+            parts.append(f"{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(parts)
+
+
+# ---------- Cache ----------
+class ResultCache:
+    """Thread-safe LRU of query results; concurrent misses on one key compute once."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.waits = 0
+
+    def get_or_compute(self, key, compute) -> tuple[dict, bool]:
+        while True:
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key], True
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+                self.waits += 1
+            event.wait()                       # someone else is computing it; then re-check
+        try:
+            result = compute()
+            with self._lock:
+                self._data[key] = result
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses, "waits": self.waits}
+
+
+# ---------- Parameters ----------
+def _one(params: dict, name: str, default=None, cast=str):
+    vals = params.get(name)
+    if not vals:
+        return default
+    try:
+        return cast(vals[-1])
+    except ValueError:
+        raise QueryError(f"bad value for {name}: {vals[-1]!r}") from None
+
+
+def _types(params: dict, default=None) -> list[str] | None:
+    raw = _one(params, "types")
+    if raw is None:
+        return default
+    types = [t.strip().upper() for t in raw.split(",") if t.strip()]
+    bad = [t for t in types if t not in TX_TYPES]
+    if bad:
+        raise QueryError(f"unknown type(s) {bad}; choose from {TX_TYPES}")
+    return sorted(set(types))
+
+
+def _where(types: list[str] | None, lo: float | None, hi: float | None) -> tuple[str, list]:
+    """WHERE clause on the indexed (type, amount) columns; the amount range is right-open."""
+    conds, args = [], []
+    if types:
+        conds.append(f"type IN ({', '.join('?' * len(types))})")
+        args += types
+    if lo is not None:
+        conds.append("amount >= ?")
+        args.append(lo)
+    if hi is not None:
+        conds.append("amount < ?")
+        args.append(hi)
+    return (" WHERE " + " AND ".join(conds)) if conds else "", args
+
+
+# ---------- Queries ----------
+@dataclass
+class Result:
+    columns: list[str]
+    rows: list[list]
+
+
+def q_dayhour(conn, params) -> tuple[dict, Result]:
+    p = {"types": _types(params), "lo": _one(params, "lo", cast=float), "hi": _one(params, "hi", cast=float)}
+    where, args = _where(p["types"], p["lo"], p["hi"])
+    sql = (f"SELECT day_num, hour_of_day, COUNT(*) AS n, SUM(amount) AS amt_sum FROM transactions{where} "
+           "GROUP BY day_num, hour_of_day ORDER BY day_num, hour_of_day")
+    return p, _run(conn, sql, args)
+
+
+def q_weekhour(conn, params) -> tuple[dict, Result]:
+    p = {"types": _types(params), "lo": _one(params, "lo", cast=float), "hi": _one(params, "hi", cast=float)}
+    where, args = _where(p["types"], p["lo"], p["hi"])
+    # grouped on the indexed (day_num, hour_of_day) first, folded to weekdays (day_num % 7, 0=Mon) after
+    sql = (f"SELECT day_num % 7 AS weekday, hour_of_day, SUM(n) AS n FROM ("
+           f"SELECT day_num, hour_of_day, COUNT(*) AS n FROM transactions{where} GROUP BY day_num, hour_of_day) "
+           "GROUP BY weekday, hour_of_day ORDER BY weekday, hour_of_day")
+    return p, _run(conn, sql, args)
+
+
+def q_amount_bins(conn, params) -> tuple[dict, Result]:
+    p = {"width": _one(params, "width", 1000.0, float), "types": _types(params)}
+    if p["width"] <= 0:
+        raise QueryError("width must be > 0")
+    where, args = _where(p["types"], None, None)
+    where = (where + " AND" if where else " WHERE") + " amount > 0"
+    sql = (f"SELECT CAST(amount / ? AS INTEGER) AS bin, CAST(amount / ? AS INTEGER) * ? AS lo, COUNT(*) AS n "
+           f"FROM transactions{where} GROUP BY bin ORDER BY bin")
+    return p, _run(conn, sql, [p["width"], p["width"], p["width"], *args])
+
+
+def q_near_band(conn, params) -> tuple[dict, Result]:
+    p = {"threshold": _one(params, "threshold", AML_THRESHOLD, float),
+         "pct": _one(params, "pct", AML_BAND_PCT, float),
+         "types": _types(params, NEAR_TYPES)}
+    if not 0 < p["pct"] <= 100:
+        raise QueryError("pct must be in (0, 100]")
+    lo, hi = round(p["threshold"] * (1 - p["pct"] / 100), 2), p["threshold"]
+    p.update(lo=lo, hi=hi)
+    where, args = _where(p["types"], lo, hi)
+    sql = (f"SELECT day_num, COUNT(*) AS n, SUM(amount) AS amt_sum, COUNT(DISTINCT origId) AS accounts "
+           f"FROM transactions{where} GROUP BY day_num ORDER BY day_num")
+    return p, _run(conn, sql, args)
+
+
+_FEATURES: dict = {}
+_FEATURES_LOCK = threading.Lock()
+
+
+def _features() -> tuple[pd.DataFrame, pd.Index]:
+    """(features_accounts.parquet, its account-name index), reloaded together when the file changes."""
+    if not FEAT_PATH.exists():
+        raise QueryError(f"features not found: {FEAT_PATH} (run 03_features_accounts.py)")
+    st = FEAT_PATH.stat()
+    sig = (st.st_size, st.st_mtime_ns)
+    with _FEATURES_LOCK:
+        if _FEATURES.get("sig") != sig:
+            df = pd.read_parquet(FEAT_PATH)
+            _FEATURES.update(sig=sig, df=df, by_name=pd.Index(df["account"]))
+        return _FEATURES["df"], _FEATURES["by_name"]
+
+
+def q_features(conn, params) -> tuple[dict, Result]:
+    df, by_name = _features()
+    p = {"account": _one(params, "account"), "order": _one(params, "order", "n_tx"),
+         "limit": _one(params, "limit", 100, int)}
+    if p["account"] is not None:
+        out = df[by_name == p["account"]]
+        p.pop("order"), p.pop("limit")
+    else:
+        numeric = [c for c, t in df.dtypes.items()
+                   if pd.api.types.is_numeric_dtype(t) and not pd.api.types.is_bool_dtype(t)]
+        if p["order"] not in numeric:
+            raise QueryError(f"order must be a numeric column, one of {numeric}")
+        if not 0 < p["limit"] <= MAX_LIMIT:
+            raise QueryError(f"limit must be in 1..{MAX_LIMIT}")
+        out = df.nlargest(p["limit"], p["order"])
+    out = out.astype(object).where(out.notna(), None)
+    return p, Result(list(out.columns), [[_plain(v) for v in row] for row in out.itertuples(index=False)])
+
+
+def q_history(conn, params) -> tuple[dict, Result]:
+    p = {"account": _one(params, "account"), "hops": _one(params, "hops", 0, int),
+         "cp_limit": _one(params, "cp_limit", None, int)}
+    if p["account"] is None:
+        raise QueryError("account is required")
+    if p["hops"] not in (0, 1):
+        raise QueryError("hops must be 0 or 1")
+    try:
+        if p["hops"]:
+            out = drilldown.neighbourhood(p["account"], p["cp_limit"])
+        else:
+            out = drilldown.history(p["account"]).assign(hop=0)
+    except KeyError as e:
+        raise QueryError(e.args[0]) from None
+    out = out.drop(columns=["row"]).astype(object)
+    return p, Result(list(out.columns), [[_plain(v) for v in row] for row in out.itertuples(index=False)])
+
+
+def _plain(v):
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def _run(conn: sqlite3.Connection, sql: str, args: list) -> Result:
+    cur = conn.execute(sql, args)
+    return Result([d[0] for d in cur.description], [list(r) for r in cur.fetchall()])
+
+
+QUERIES = {
+    "dayhour": q_dayhour,
+    "weekhour": q_weekhour,
+    "amount_bins": q_amount_bins,
+    "near_band": q_near_band,
+    "features": q_features,
+    "history": q_history,
+}
+
+
+# ---------- Service ----------
+class QueryService:
+    def __init__(self, db_path: Path = DB_PATH, connections: int = 4, cache_entries: int = 256):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, connections)
+        self.cache = ResultCache(cache_entries)
+        self.started = time.time()
+
+    def run(self, name: str, params: dict, fmt: str = "json") -> str:
+        """Response body for one query; the cached entry keeps its JSON / CSV encodings too."""
+        t0 = time.perf_counter()
+        params = {k: v for k, v in params.items() if k != "format"}
+        mark = watermark(self.db_path)
+        if name == "features" and FEAT_PATH.exists():
+            st = FEAT_PATH.stat()
+            mark += f"|{st.st_size}:{st.st_mtime_ns}"
+        key = (name, tuple(sorted((k, tuple(v)) for k, v in params.items())), mark)
+
+        def compute() -> dict:
+            with self.pool.connection() as conn:
+                p, res = QUERIES[name](conn, params)
+            result = {"query": name, "params": p, "columns": res.columns, "rows": res.rows}
+            return {"result": result, "json": json.dumps(result)[1:-1]}
+
+        entry, hit = self.cache.get_or_compute(key, compute)
+        if fmt == "csv":
+            if "csv" not in entry:
+                entry["csv"] = to_csv(entry["result"])
+            return entry["csv"]
+        ms = round((time.perf_counter() - t0) * 1000, 3)
+        return f'{{{entry["json"]}, "cached": {json.dumps(hit)}, "ms": {ms}}}'
+
+    def stats(self) -> dict:
+        return {"uptime_s": round(time.time() - self.started, 1), "connections": self.pool.size,
+                "watermark": watermark(self.db_path), "cache": self.cache.stats()}
+
+
+def to_csv(result: dict) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(result["columns"])
+    w.writerows(result["rows"])
+    return buf.getvalue()
+
+
+def make_handler(service: QueryService, verbose: bool = False):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: str, ctype: str = "application/json") -> None:
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", f"{ctype}; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            try:
+                if url.path == "/health":
+                    return self._send(200, json.dumps({"ok": True}))
+                if url.path == "/stats":
+                    return self._send(200, json.dumps(service.stats()))
+                if url.path == "/queries":
+                    return self._send(200, json.dumps(sorted(QUERIES)))
+                if url.path.startswith("/q/") and url.path[3:] in QUERIES:
+                    if _one(params, "format") == "csv":
+                        return self._send(200, service.run(url.path[3:], params, "csv"), "text/csv")
+                    return self._send(200, service.run(url.path[3:], params))
+                return self._send(404, json.dumps({"error": f"no route {url.path}; see /queries"}))
+            except QueryError as e:
+                self._send(400, json.dumps({"error": str(e)}))
+            except sqlite3.Error as e:
+                self._send(500, json.dumps({"error": f"sqlite: {e}"}))
+            except Exception as e:                          # never drop the connection without a response
+                self._send(500, json.dumps({"error": f"{type(e).__name__}: {e}"}))
+
+        def log_message(self, fmt, *args) -> None:
+            if verbose:
+                super().log_message(fmt, *args)
+
+    return Handler
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128        # the default 5 drops bursts of dashboard connections (1s SYN retry)
+
+
+def serve(host: str, port: int, service: QueryService, verbose: bool = False) -> Server:
+    return Server((host, port), make_handler(service, verbose))
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Cached read-only query service over data/paysim.db.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--connections", type=int, default=4, help="read-only SQLite connections")
+    p.add_argument("--cache", type=int, default=256, help="LRU result entries")
+    p.add_argument("--verbose", action="store_true", help="log every request")
+    args = p.parse_args()
+
+    service = QueryService(DB_PATH, args.connections, args.cache)
+    server = serve(args.host, args.port, service, args.verbose)
+    print(f"[OK] serving {DB_PATH.name} on http://{args.host}:{server.server_port}/ "
+          f"({args.connections} connections, {args.cache} cached results); queries: {', '.join(QUERIES)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[Info] stopping")
+    finally:
+        server.server_close()
+        service.pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
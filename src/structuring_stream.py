@@ -0,0 +1,148 @@
+"""
+Streaming near-threshold (structuring) detector.
+
+Same band as the batch features ([NEAR_LO, NEAR_HI) from bands.py, 9,000–9,999.99 by default),
+but evaluated per event: transactions arrive in step order and each origin account
+keeps a sliding window over the last K steps of near-threshold count and sum.
+
+State is O(1) per event and compact:
+- near_n / near_sum / quiet_until   array.array slots indexed by integer account id
+- a FIFO of (step, account, amount) near-threshold events still inside the window;
+  expired ones are subtracted back out when the step advances
+
+An alert fires when an account reaches `min_count` near-threshold transactions
+inside the window; the account is then quiet for K steps so one burst gives one alert.
+
+Sources:
+- iter_db_events()   (step, origId, amount) from data/paysim.db in step order
+- tail_csv()         follow a PaySim-format CSV as it grows (names interned to ids)
+"""
+
+from __future__ import annotations
+
+import csv
+import sqlite3
+import time
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from bands import NEAR_HI, NEAR_LO
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+
+WINDOW_STEPS = 24
+MIN_COUNT = 3
+
+EVENTS_SQL = "SELECT step, origId, amount FROM transactions ORDER BY step"
+
+
+class Alert(NamedTuple):
+    step: int
+    account: int
+    near_n: int
+    near_sum: float
+
+
+class StructuringDetector:
+    """Per-account sliding-window near-threshold counter; feed events with push()."""
+
+    def __init__(self, window: int = WINDOW_STEPS, min_count: int = MIN_COUNT,
+                 lo: float = NEAR_LO, hi: float = NEAR_HI, capacity: int = 1 << 16):
+        if window < 1 or min_count < 1:
+            raise ValueError("window and min_count must be >= 1")
+        self.window = window
+        self.min_count = min_count
+        self.lo, self.hi = lo, hi
+        self.near_n = array("i", bytes(4 * capacity))
+        self.near_sum = array("d", bytes(8 * capacity))
+        self.quiet_until = array("i", bytes(4 * capacity))
+        self.pending: deque[tuple[int, int, float]] = deque()
+        self.step = 0
+        self.events = 0
+
+    def _grow(self, account: int) -> None:
+        extra = max(account + 1, 2 * len(self.near_n)) - len(self.near_n)
+        self.near_n.frombytes(bytes(4 * extra))
+        self.near_sum.frombytes(bytes(8 * extra))
+        self.quiet_until.frombytes(bytes(4 * extra))
+
+    def _advance(self, step: int) -> None:
+        """Move the window to end at `step`, dropping events from steps <= step - window."""
+        if step < self.step:
+            raise ValueError(f"events must arrive in step order (got {step} after {self.step})")
+        self.step = step
+        cutoff = step - self.window
+        pending, near_n, near_sum = self.pending, self.near_n, self.near_sum
+        while pending and pending[0][0] <= cutoff:
+            _, acc, amount = pending.popleft()
+            near_n[acc] -= 1
+            near_sum[acc] -= amount
+
+    def push(self, step: int, account: int, amount: float) -> Alert | None:
+        """Feed one transaction; returns an Alert when `account` crosses min_count."""
+        self.events += 1
+        if step != self.step:
+            self._advance(step)
+        if not (self.lo <= amount < self.hi):
+            return None
+        if account >= len(self.near_n):
+            self._grow(account)
+        self.pending.append((step, account, amount))
+        n = self.near_n[account] + 1
+        self.near_n[account] = n
+        s = self.near_sum[account] + amount
+        self.near_sum[account] = s
+        if n >= self.min_count and step >= self.quiet_until[account]:
+            self.quiet_until[account] = step + self.window
+            return Alert(step, account, n, s)
+        return None
+
+    def state_bytes(self) -> int:
+        """Approximate footprint of the per-account arrays (the FIFO is bounded by the window)."""
+        return sum(a.buffer_info()[1] * a.itemsize for a in (self.near_n, self.near_sum, self.quiet_until))
+
+
+# ---------- Sources ----------
+def iter_db_events(db_path: Path = DB_PATH, batch: int = 100_000) -> Iterator[tuple[int, int, float]]:
+    """(step, origId, amount) rows from SQLite in step order (idx_tx_step serves the ORDER BY)."""
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        cur = conn.execute(EVENTS_SQL)
+        while rows := cur.fetchmany(batch):
+            yield from rows
+
+
+def tail_csv(path: Path, follow: bool = True, poll: float = 0.5,
+             names: dict[str, int] | None = None) -> Iterator[tuple[int, int, float]]:
+    """
+    (step, account id, amount) from a PaySim-format CSV, following appended lines like
+    `tail -f` when `follow` is set. nameOrig strings are interned into `names`
+    (name -> id, ids from 1) so the detector's arrays stay dense.
+    """
+    names = {} if names is None else names
+    with open(path, newline="") as f:
+        header = next(csv.reader([f.readline()]))
+        i_step, i_amt, i_orig = header.index("step"), header.index("amount"), header.index("nameOrig")
+        partial = ""
+        while True:
+            line = f.readline()
+            if not line:
+                if follow:
+                    time.sleep(poll)
+                    continue
+                if not partial:
+                    return
+                line, partial = partial + "\n", ""   # last line without a trailing newline
+            line = partial + line
+            if not line.endswith("\n"):          # writer is mid-line; wait for the rest
+                partial = line
+                continue
+            partial = ""
+            row = line.rstrip("\r\n").split(",")
+            if len(row) < len(header):
+                continue
+            acc = names.setdefault(row[i_orig], len(names) + 1)
+            yield int(row[i_step]), acc, float(row[i_amt])
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Compact typed transactions as memory-mapped column arrays (struct of arrays).
+
+Built once from the Parquet copy (or SQLite) and cached under data/tx_arrays/ as
+one .npy per column, invalidated like the aggregate cube when data/paysim.db
+changes. Loads are np.load(mmap_mode="r"): near-instant, and pages are shared
+with the OS cache instead of copied into each process.
+
+    column          dtype                  vs. a plain pandas read
+    step            uint16                 int64
+    day_num         uint8 (uint16 > 255)   int64
+    hour_of_day     uint8                  int64
+    type            uint8 code (TX_TYPES)  object strings
+    origId/destId   int32                  int64
+    amount, balances  uint32 cents when every value fits and round-trips,
+                    else int64 cents, else float64
+    isFraud, isFlaggedFraud  bool          int64
+
+Rows are in ingest order (day partitions read in numeric order). Money columns
+are decoded back to float64 dollars on request; cents / 100 reproduces the
+parsed value exactly, so downstream sums match the float64 source.
+
+    arrays = get_arrays(["step", "origId", "amount"])      # dict of np.memmap
+    df = load_frame(["step", "amount", "origId", "destId"])  # compact DataFrame
+    python src/tx_arrays.py                                  # (re)build + sizes
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import parquet_store
+from agg_cube import source_signature
+from parquet_store import PARTITION_COL, TX_TYPES
+from perf import span
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+CACHE_DIR = ROOT / "data" / "tx_arrays"
+
+MONEY_COLS = ["amount", "oldbalanceOrg", "newbalanceOrig", "oldbalanceDest", "newbalanceDest"]
+COLUMNS = ["step", "day_num", "hour_of_day", "type", "amount", "origId", "oldbalanceOrg",
+           "newbalanceOrig", "destId", "oldbalanceDest", "newbalanceDest", "isFraud", "isFlaggedFraud"]
+FIXED_DTYPES = {
+    "step": np.uint16, "hour_of_day": np.uint8, "type": np.uint8,
+    "origId": np.int32, "destId": np.int32, "isFraud": np.bool_, "isFlaggedFraud": np.bool_,
+}
+U32_MAX = np.iinfo(np.uint32).max
+
+STATS_SQL = ("SELECT COUNT(*), MAX(step), MAX(day_num), "
+             + ", ".join(f"MIN({c}), MAX({c})" for c in MONEY_COLS) + " FROM transactions")
+
+
+# ---------- Build ----------
+def plan_dtypes(conn: sqlite3.Connection) -> tuple[int, dict]:
+    """Row count and per-column storage dtype, from one MIN/MAX pass in SQLite."""
+    n, max_step, max_day, *bounds = conn.execute(STATS_SQL).fetchone()
+    if (max_step or 0) > np.iinfo(np.uint16).max:
+        raise SystemExit(f"[ERROR] step {max_step} does not fit uint16")
+    dtypes = dict(FIXED_DTYPES)
+    dtypes["day_num"] = np.uint8 if (max_day or 0) <= 255 else np.uint16
+    for col, lo, hi in zip(MONEY_COLS, bounds[::2], bounds[1::2]):
+        lo, hi = lo or 0.0, hi or 0.0
+        dtypes[col] = np.uint32 if lo >= 0 and round(hi * 100) <= U32_MAX else np.int64
+    return n, dtypes
+
+
+def iter_source(columns: list[str], db_path: Path, chunksize: int = 1_000_000):
+    """Transactions in ingest order: day partitions in numeric order, else SQLite rowid order."""
+    if parquet_store.dataset_exists():
+        days = sorted(parquet_store.DATASET_DIR.glob(f"{PARTITION_COL}=*"), key=lambda d: int(d.name.split("=")[1]))
+        cols = [c for c in columns if c != PARTITION_COL]
+        for d in days:
+            day = int(d.name.split("=")[1])
+            for f in sorted(d.glob("*.parquet")):
+                df = pq.read_table(f, columns=cols).to_pandas()
+                if PARTITION_COL in columns:
+                    df[PARTITION_COL] = day
+                yield df
+        return
+    sql = f"SELECT {', '.join(columns)} FROM transactions ORDER BY rowid"
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        yield from pd.read_sql_query(sql, conn, chunksize=chunksize)
+
+
+def encode(col: str, values: pd.Series, dtype) -> np.ndarray:
+    if col == "type":
+        return pd.Categorical(values, categories=TX_TYPES).codes.astype(np.uint8)
+    if col in MONEY_COLS and dtype != np.float64:
+        x = values.to_numpy(dtype=np.float64)
+        cents = np.rint(x * 100)
+        if not np.array_equal(cents / 100, x):
+            raise ValueError(col)              # not a whole number of cents: keep float64
+        return cents.astype(dtype)
+    return values.to_numpy().astype(dtype, copy=False)
+
+
+def build_arrays(db_path: Path = DB_PATH, cache_dir: Path = CACHE_DIR) -> dict:
+    """Stream the source once into preallocated .npy memmaps; returns the dtype plan."""
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        n, dtypes = plan_dtypes(conn)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # per-process temp names: concurrent builders (pipeline stages, band_scan workers) never share a file
+    tmp = {c: cache_dir / f"{c}.npy.{os.getpid()}.tmp" for c in COLUMNS}
+    out = {c: np.lib.format.open_memmap(tmp[c], mode="w+", dtype=dtypes[c], shape=(n,)) for c in COLUMNS}
+    pos = 0
+    for df in iter_source(COLUMNS, db_path):
+        k = len(df)
+        for c in COLUMNS:
+            try:
+                out[c][pos:pos + k] = encode(c, df[c], dtypes[c])
+            except ValueError:                          # fall back to float64 dollars
+                head = out.pop(c)[:pos] / 100.0
+                out[c] = np.lib.format.open_memmap(tmp[c], mode="w+", dtype=np.float64, shape=(n,))
+                out[c][:pos] = head
+                dtypes[c] = np.float64
+                out[c][pos:pos + k] = df[c].to_numpy(dtype=np.float64)
+        pos += k
+    if pos != n:
+        raise SystemExit(f"[ERROR] read {pos:,} rows, expected {n:,}")
+    for c in COLUMNS:
+        out[c].flush()
+        del out[c]
+        tmp[c].replace(cache_dir / f"{c}.npy")
+    return {c: np.dtype(dtypes[c]).name for c in COLUMNS}
+
+
+def get_arrays(columns: list[str] | None = None, db_path: Path = DB_PATH,
+               cache_dir: Path = CACHE_DIR, rebuild: bool = False) -> dict[str, np.ndarray]:
+    """Memory-mapped stored columns (money columns still in cents where stored so)."""
+    if not db_path.exists():
+        raise SystemExit(f"[ERROR] DB not found at {db_path}. Run 01_load_to_sqlite.py first.")
+    source = source_signature(db_path)
+    meta_path = cache_dir / "meta.json"
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+    if rebuild or meta.get("source") != source:
+        t0 = time.time()
+        with span("tx_arrays_build", kind="io"):
+            meta = {"source": source, "dtypes": build_arrays(db_path, cache_dir)}
+        tmp = meta_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(meta, indent=1))
+        tmp.replace(meta_path)                          # only after every column is renamed into place
+        print(f"[Info] built compact transaction arrays in {time.time() - t0:,.1f}s → {cache_dir}")
+    with span("tx_arrays_load", kind="io"):
+        return {c: np.load(cache_dir / f"{c}.npy", mmap_mode="r") for c in (columns or COLUMNS)}
+
+
+def dollars(arr: np.ndarray) -> np.ndarray:
+    """Stored money column → float64 dollars (no-op for columns kept as float64)."""
+    return arr if arr.dtype == np.float64 else arr / 100.0
+
+
+def load_frame(columns: list[str] | None = None, money: str = "dollars", db_path: Path = DB_PATH,
+               cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """
+    Compact typed DataFrame over the cached arrays. Non-money columns are wrapped
+    without a copy; `type` becomes a Categorical over TX_TYPES. Money columns are
+    float64 dollars, or the stored integer cents with money="cents".
+    """
+    arrays = get_arrays(columns, db_path, cache_dir)
+    with span("tx_arrays_frame", kind="convert") as sp:
+        cols = {}
+        for c, a in arrays.items():
+            if c == "type":
+                cols[c] = pd.Categorical.from_codes(a, categories=TX_TYPES)
+            elif c in MONEY_COLS and money == "dollars":
+                cols[c] = dollars(a)
+            else:
+                cols[c] = a
+        df = pd.DataFrame(cols, copy=False)
+        sp.rows = len(df)
+    return df
+
+
+def main() -> int:
+    arrays = get_arrays(rebuild=True)
+    n = len(arrays["step"])
+    packed = sum(a.nbytes for a in arrays.values())
+    wide = n * 8 * len(arrays)
+    print(f"rows         {n:>12,}")
+    for c, a in arrays.items():
+        print(f"  {c:<16} {a.dtype.name:<8} {a.nbytes / 1e6:>9,.1f} MB")
+    print(f"total        {packed / 1e6:>12,.1f} MB  (vs {wide / 1e6:,.1f} MB as 8-byte columns, x{wide / max(packed, 1):.1f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Transaction graph (origId -> destId) as compressed sparse row arrays.
+
+Built once from (origId, destId, amount, step) and cached under data/graph/ as
+plain .npy files (memory-mapped on load), invalidated like the aggregate cube
+when data/paysim.db changes:
+
+- out_indptr [n_nodes+1]   out_dest / out_amount / out_step, edges of node v in
+                           out_*[out_indptr[v]:out_indptr[v+1]], sorted by (dest, step)
+- in_indptr  [n_nodes+1]   in_src / in_amount / in_step, sorted by (src, step)
+
+Node ids are accounts.account_id, so arrays index directly by id (slot 0 unused).
+node_features() derives the network feature columns (GRAPH_COLS) with array ops
+only; they are cached next to the CSR per cycle window (data/graph/node_features_<k>/).
+Both caches are npy_cache directories: atomic per-file writes, meta.json last.
+
+    python src/tx_graph.py            # (re)build and print summary stats
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import npy_cache
+import tx_arrays
+from agg_cube import source_signature
+from perf import span
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+GRAPH_DIR = ROOT / "data" / "graph"
+
+CSR_ARRAYS = ["out_indptr", "out_dest", "out_amount", "out_step",
+              "in_indptr", "in_src", "in_amount", "in_step"]
+CYCLE_STEPS = 24
+GRAPH_COLS = ["in_deg", "in_nbrs", "in_flow", "net_flow", "fan_out_2hop", "fan_in_2hop", "cycle_n"]
+
+
+# ---------- Build ----------
+def load_edges(db_path: Path = DB_PATH) -> tuple[dict, int]:
+    """Edge columns as numpy arrays plus n_nodes (max account_id + 1)."""
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        n_nodes = conn.execute("SELECT COALESCE(MAX(account_id), 0) + 1 FROM accounts").fetchone()[0]
+    a = tx_arrays.get_arrays(["origId", "destId", "amount", "step"], db_path)
+    edges = {
+        "orig": np.asarray(a["origId"]),
+        "dest": np.asarray(a["destId"]),
+        "amount": tx_arrays.dollars(a["amount"]),
+        "step": a["step"].astype(np.int32),
+    }
+    return edges, int(n_nodes)
+
+
+def _indptr(node: np.ndarray, n_nodes: int) -> np.ndarray:
+    return np.concatenate([[0], np.cumsum(np.bincount(node, minlength=n_nodes))]).astype(np.int64)
+
+
+def _order(major: np.ndarray, minor: np.ndarray, step: np.ndarray, n_nodes: int) -> np.ndarray:
+    """Permutation sorting by (major, minor, step): one argsort of a packed int64 key when it fits."""
+    n_steps = int(step.max()) + 1 if step.size else 1
+    if n_nodes * n_nodes * n_steps < 2**63:
+        key = (major.astype(np.int64) * n_nodes + minor) * n_steps + step
+        return np.argsort(key, kind="stable")
+    return np.lexsort((step, minor, major))
+
+
+def build_csr(orig: np.ndarray, dest: np.ndarray, amount: np.ndarray, step: np.ndarray,
+              n_nodes: int) -> dict:
+    """Out- and in-adjacency; one sort per direction."""
+    o = _order(orig, dest, step, n_nodes)
+    i = _order(dest, orig, step, n_nodes)
+    return {
+        "out_indptr": _indptr(orig, n_nodes),
+        "out_dest": dest[o], "out_amount": amount[o], "out_step": step[o],
+        "in_indptr": _indptr(dest, n_nodes),
+        "in_src": orig[i], "in_amount": amount[i], "in_step": step[i],
+    }
+
+
+def save_graph(g: dict, source: str, graph_dir: Path = GRAPH_DIR) -> None:
+    npy_cache.save_columns(graph_dir, {name: g[name] for name in CSR_ARRAYS}, source)
+
+
+def load_graph(graph_dir: Path = GRAPH_DIR, mmap: bool = True) -> dict:
+    mode = "r" if mmap else None
+    return {name: np.load(graph_dir / f"{name}.npy", mmap_mode=mode) for name in CSR_ARRAYS}
+
+
+def get_graph(db_path: Path = DB_PATH, graph_dir: Path = GRAPH_DIR, rebuild: bool = False) -> dict:
+    """Load the cached CSR if it was built from the current DB; otherwise build once and save."""
+    if not db_path.exists():
+        raise SystemExit(f"[ERROR] DB not found at {db_path}. Run 01_load_to_sqlite.py first.")
+    source = source_signature(db_path)
+    if not rebuild:
+        with span("graph_load", kind="io"):
+            g = npy_cache.load_columns(graph_dir, source, CSR_ARRAYS)
+        if g is not None:
+            return g
+    t0 = time.time()
+    with span("edges_read", kind="io") as sp:
+        edges, n_nodes = load_edges(db_path)
+        sp.rows = len(edges["orig"])
+    t1 = time.time()
+    with span("csr_build", rows=len(edges["orig"])):
+        g = build_csr(edges["orig"], edges["dest"], edges["amount"], edges["step"], n_nodes)
+    with span("graph_save", kind="io"):
+        save_graph(g, source, graph_dir)
+    print(f"[Info] built CSR graph ({len(edges['orig']):,} edges, {n_nodes - 1:,} nodes): "
+          f"read {t1 - t0:,.1f}s, build+save {time.time() - t1:,.1f}s → {graph_dir}")
+    return g
+
+
+# ---------- Queries ----------
+def out_edges(g: dict, node: int) -> pd.DataFrame:
+    lo, hi = g["out_indptr"][node], g["out_indptr"][node + 1]
+    return pd.DataFrame({"dest": g["out_dest"][lo:hi], "amount": g["out_amount"][lo:hi],
+                         "step": g["out_step"][lo:hi]})
+
+
+def in_edges(g: dict, node: int) -> pd.DataFrame:
+    lo, hi = g["in_indptr"][node], g["in_indptr"][node + 1]
+    return pd.DataFrame({"src": g["in_src"][lo:hi], "amount": g["in_amount"][lo:hi],
+                         "step": g["in_step"][lo:hi]})
+
+
+def edge_sources(g: dict) -> np.ndarray:
+    """Origin node of every out_* edge (expands out_indptr)."""
+    indptr = g["out_indptr"]
+    return np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+
+
+def cycle_counts(g: dict, k: int = CYCLE_STEPS) -> np.ndarray:
+    """
+    Per node A: outgoing transactions A->B (B != A) at step s answered by some
+    B->A at step t with s <= t <= s + k.
+
+    out_* is sorted by (orig, dest, step), so each (orig, dest) pair is a contiguous,
+    time-sorted run. Give every run a dense rank r and search the combined key
+    r * (max_step + 1) + step: the answer window of A->B at s is the range
+    [r(B,A) * S + s, r(B,A) * S + min(s + k, S - 1)] in that sorted array.
+    """
+    n_nodes = len(g["out_indptr"]) - 1
+    src = edge_sources(g).astype(np.int64)
+    dst = np.asarray(g["out_dest"], dtype=np.int64)
+    step = np.asarray(g["out_step"], dtype=np.int64)
+    if not src.size:
+        return np.zeros(n_nodes, dtype=np.int64)
+
+    pair = src * n_nodes + dst
+    new_run = np.r_[True, pair[1:] != pair[:-1]]
+    rank = np.cumsum(new_run) - 1
+    runs = pair[new_run]
+    S = int(step.max()) + 1
+    comp = rank * S + step                                  # sorted
+
+    # reverse pair of every distinct pair (one lookup per pair, not per edge)
+    rev = (runs % n_nodes) * n_nodes + runs // n_nodes
+    order = np.argsort(rev)                  # sorted needles keep the binary searches cache-local
+    pos = np.empty_like(rev)
+    pos[order] = np.searchsorted(runs, rev[order])
+    hit = (pos < runs.size) & (runs[np.minimum(pos, runs.size - 1)] == rev) & (rev != runs)
+    found = hit[rank]
+    r_rev = pos[rank[found]]
+    base = r_rev * S + step[found]
+    top = np.minimum(base + k, r_rev * S + S - 1)          # never spill into the next run
+    n_ans = np.searchsorted(comp, top, side="right") - np.searchsorted(comp, base, side="left")
+    return np.bincount(src[found][n_ans > 0], minlength=n_nodes).astype(np.int64)
+
+
+def node_features(g: dict, cycle_steps: int = CYCLE_STEPS) -> pd.DataFrame:
+    """GRAPH_COLS for every node id (index = account_id, row 0 unused)."""
+    n_nodes = len(g["out_indptr"]) - 1
+    src = edge_sources(g).astype(np.int64)
+    dst = np.asarray(g["out_dest"], dtype=np.int64)
+    amt = np.asarray(g["out_amount"])
+
+    in_deg = np.diff(g["in_indptr"])
+    in_flow = np.bincount(dst, weights=amt, minlength=n_nodes)
+    out_flow = np.bincount(src, weights=amt, minlength=n_nodes)
+
+    # distinct (src, dst) pairs: out_* is sorted by (orig, dest), so runs are distinct pairs
+    first = np.r_[True, (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])] if src.size else np.zeros(0, bool)
+    u_src, u_dst = src[first], dst[first]
+    out_nbrs = np.bincount(u_src, minlength=n_nodes)
+    in_nbrs = np.bincount(u_dst, minlength=n_nodes)
+
+    return pd.DataFrame({
+        "in_deg": in_deg.astype(np.int64),
+        "in_nbrs": in_nbrs.astype(np.int64),
+        "in_flow": in_flow,
+        "net_flow": in_flow - out_flow,
+        # 2-hop reach counted over distinct edges (paths A->B->C), not distinct C
+        "fan_out_2hop": np.bincount(u_src, weights=out_nbrs[u_dst], minlength=n_nodes).astype(np.int64),
+        "fan_in_2hop": np.bincount(u_dst, weights=in_nbrs[u_src], minlength=n_nodes).astype(np.int64),
+        "cycle_n": cycle_counts(g, cycle_steps),
+    }, index=pd.Index(np.arange(n_nodes), name="origId"))
+
+
+def node_feature_columns(db_path: Path = DB_PATH, graph_dir: Path = GRAPH_DIR,
+                         cycle_steps: int = CYCLE_STEPS) -> dict[str, np.ndarray]:
+    """node_features() of the current graph as memory-mapped columns, cached per source and cycle window."""
+    g = get_graph(db_path, graph_dir)
+    cache_dir = graph_dir / f"node_features_{cycle_steps}"
+    source = f"{source_signature(db_path)}|cycle={cycle_steps}"
+    with span("node_features_load", kind="io"):
+        cols = npy_cache.load_columns(cache_dir, source, GRAPH_COLS)
+    if cols is not None:
+        return cols
+    t0 = time.time()
+    with span("node_features", rows=len(g["out_dest"])):
+        f = node_features(g, cycle_steps)
+    with span("node_features_save", kind="io"):
+        npy_cache.save_columns(cache_dir, {c: f[c].to_numpy() for c in GRAPH_COLS}, source)
+    print(f"[Info] graph features ({len(f) - 1:,} nodes, cycle window {cycle_steps} steps) in {time.time() - t0:,.1f}s")
+    return npy_cache.load_columns(cache_dir, source, GRAPH_COLS)
+
+
+def get_node_features(db_path: Path = DB_PATH, graph_dir: Path = GRAPH_DIR,
+                      cycle_steps: int = CYCLE_STEPS) -> pd.DataFrame:
+    """node_features() of the current graph, indexed by account id."""
+    cols = node_feature_columns(db_path, graph_dir, cycle_steps)
+    return pd.DataFrame(cols, index=pd.Index(np.arange(len(cols["in_deg"])), name="origId"))
+
+
+def main() -> int:
+    g = get_graph(rebuild=True)
+    f = get_node_features()
+    print(f"nodes        {len(g['out_indptr']) - 2:>12,}")
+    print(f"edges        {len(g['out_dest']):>12,}")
+    print(f"max in_deg   {int(f['in_deg'].max()):>12,}")
+    print(f"cycle nodes  {int((f['cycle_n'] > 0).sum()):>12,}  (A->B->A within {CYCLE_STEPS} steps)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
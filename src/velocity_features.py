@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Rolling-window velocity features per origin account.
+
+Transactions are sorted once by (origId, step) into one int64 key,
+origId * STRIDE + step. For a window of w steps ending at a transaction, the
+first row inside it is searchsorted(key, key - (w - 1)) and the last is
+searchsorted(key, key, "right"), so same-step rows are always included. Counts,
+amount sums and near-threshold counts are then differences of prefix sums, and
+np.maximum.reduceat over each account's segment keeps its worst burst. Every
+window reuses the same sorted arrays:
+
+- vel_n_{w}     max transactions within any w-step window
+- vel_amt_{w}   max amount sent within any w-step window
+- vel_near_{w}  max near-threshold transactions ([NEAR_LO, NEAR_HI), bands.py) within w steps
+
+for w in WINDOWS = 1, 6, 24, 168 steps (hour, quarter day, day, week). The
+result is cached in data/velocity_features/ (npy_cache, memory-mapped on load)
+until data/paysim.db, the windows or the band change.
+
+    python src/velocity_features.py    # (re)build and print the largest bursts
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import npy_cache
+import tx_arrays
+from agg_cube import source_signature
+from bands import NEAR_HI, NEAR_LO
+from perf import span
+
+HERE = Path(__file__).resolve()
+ROOT = HERE.parents[1]
+DB_PATH = ROOT / "data" / "paysim.db"
+CACHE_DIR = ROOT / "data" / "velocity_features"
+
+WINDOWS = [1, 6, 24, 168]
+VELOCITY_COLS = [f"vel_{m}_{w}" for w in WINDOWS for m in ("n", "amt", "near")]
+
+
+def window_maxima(acc: np.ndarray, step: np.ndarray, amount: np.ndarray, near: np.ndarray,
+                  n_accounts: int, windows=WINDOWS) -> dict[str, np.ndarray]:
+    """VELOCITY_COLS as arrays indexed by account id (0 for accounts that never send)."""
+    stride = np.int64(step.max(initial=0)) + max(windows) + 1          # keys of different accounts never overlap
+    key = acc.astype(np.int64) * stride + step.astype(np.int64)
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    cs_amt = np.concatenate([[0], np.cumsum(amount[order])])
+    cs_near = np.concatenate([[0], np.cumsum(near[order], dtype=np.int64)])
+
+    ids, starts = np.unique(acc[order], return_index=True)
+    right = np.searchsorted(key, key, side="right")
+    out = {}
+    for w in windows:
+        left = np.searchsorted(key, key - (w - 1), side="left")
+        for m, vals in (("n", right - left), ("amt", cs_amt[right] - cs_amt[left]),
+                        ("near", cs_near[right] - cs_near[left])):
+            col = np.zeros(n_accounts, dtype=vals.dtype)
+            if ids.size:
+                col[ids] = np.maximum.reduceat(vals, starts)
+            out[f"vel_{m}_{w}"] = col
+    return out
+
+
+def velocity_features(a: dict, n_accounts: int, windows=WINDOWS) -> pd.DataFrame:
+    """VELOCITY_COLS for every account id (index = account_id, row 0 unused)."""
+    amount = a["amount"]
+    near = (tx_arrays.dollars(amount) >= NEAR_LO) & (tx_arrays.dollars(amount) < NEAR_HI)
+    # integer cents keep the prefix-sum differences exact
+    amt = amount.astype(np.int64) if amount.dtype != np.float64 else np.asarray(amount)
+    cols = window_maxima(np.asarray(a["origId"]), np.asarray(a["step"]), amt, near, n_accounts, windows)
+    for w in windows:
+        c = f"vel_amt_{w}"
+        cols[c] = cols[c] / 100.0 if amount.dtype != np.float64 else np.round(cols[c], 2)
+    return pd.DataFrame({c: cols[c] for c in VELOCITY_COLS},
+                        index=pd.Index(np.arange(n_accounts), name="origId"))
+
+
+def velocity_columns(db_path: Path = DB_PATH, cache_dir: Path = CACHE_DIR,
+                     rebuild: bool = False) -> dict[str, np.ndarray]:
+    """velocity_features() as memory-mapped columns, cached per source, windows and near-threshold band."""
+    if not db_path.exists():
+        raise SystemExit(f"[ERROR] DB not found at {db_path}. Run 01_load_to_sqlite.py first.")
+    source = f"{source_signature(db_path)}|{WINDOWS}|{NEAR_LO}-{NEAR_HI}"
+    if not rebuild:
+        with span("velocity_load", kind="io"):
+            cols = npy_cache.load_columns(cache_dir, source, VELOCITY_COLS)
+        if cols is not None:
+            return cols
+    t0 = time.time()
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        n_accounts = conn.execute("SELECT COALESCE(MAX(account_id), 0) + 1 FROM accounts").fetchone()[0]
+    a = tx_arrays.get_arrays(["origId", "step", "amount"], db_path)
+    with span("velocity_features", rows=len(a["origId"])):
+        f = velocity_features(a, int(n_accounts))
+    with span("velocity_save", kind="io"):
+        npy_cache.save_columns(cache_dir, {c: f[c].to_numpy() for c in VELOCITY_COLS}, source)
+    print(f"[Info] velocity features ({len(a['origId']):,} rows, windows {WINDOWS}) in {time.time() - t0:,.1f}s → {cache_dir}")
+    return npy_cache.load_columns(cache_dir, source, VELOCITY_COLS)
+
+
+def get_velocity_features(db_path: Path = DB_PATH, cache_dir: Path = CACHE_DIR, rebuild: bool = False) -> pd.DataFrame:
+    """velocity_features() of the current DB, indexed by account id."""
+    cols = velocity_columns(db_path, cache_dir, rebuild)
+    return pd.DataFrame(cols, index=pd.Index(np.arange(len(cols["vel_n_1"])), name="origId"))
+
+
+def main() -> int:
+    f = get_velocity_features(rebuild=True)
+    for w in WINDOWS:
+        print(f"window {w:>4}  max n {int(f[f'vel_n_{w}'].max()):>6,}  max near {int(f[f'vel_near_{w}'].max()):>4,}  "
+              f"max amount {f[f'vel_amt_{w}'].max():>16,.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())